@@ -3,7 +3,7 @@ from typing import Annotated, List
 from uuid import UUID
 
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy import Select, func
 from sqlalchemy.orm import defer, selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -40,28 +40,34 @@ async def new_chat(
 @router.post("/chat")
 async def send_message(
     request: ChatRequest,
+    http_request: Request,
     user: Annotated[User, Depends(get_current_active_user)],
     db: AsyncSession = Depends(get_db),
 ) -> ChatResponse:
+    timing = http_request.state.timing
 
     chat_id = None
     if not request.chat_id:
-        chat_id = await create_chat(db, request.content[:30], user)
+        with timing.stage("db-create-chat"):
+            chat_id = await create_chat(db, request.content[:30], user)
     else:
         chat_id = request.chat_id
 
-    await create_message(db, request.content, Role.USER, chat_id)
+    with timing.stage("db-user-message"):
+        await create_message(db, request.content, Role.USER, chat_id)
 
-    response_content = await request_llm_response(request.content)
+    with timing.stage("ml"):
+        response_content = await request_llm_response(request.content, timing)
 
     # response_content = (
     #     f"Это тестовый ответ от ассистента на ваш запрос: '{request.content}'."
     #     "ML-сервис находится в разработке и будет подключен позже."
     # )
 
-    assistant_message_id = await create_message(
-        db, response_content, Role.SYSTEM, chat_id
-    )
+    with timing.stage("db-assistant-message"):
+        assistant_message_id = await create_message(
+            db, response_content, Role.SYSTEM, chat_id
+        )
 
     return ChatResponse(
         message_id=assistant_message_id,
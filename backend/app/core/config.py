@@ -9,6 +9,7 @@ class Settings(BaseSettings):
     DB_NAME: str = "maindb"
     DB_HOST: str = "localhost"
     DB_PORT: str = "5432"
+    TRACE_SAMPLE_RATE: float = 0.01
 
     @property
     def DATABASE_URL(self) -> str:
@@ -0,0 +1,69 @@
+import json
+import logging
+import random
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+
+logger = logging.getLogger("app.trace")
+# В backend нет общей настройки логирования, а uvicorn настраивает только свои логгеры
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class ServerTiming:
+    """
+    Длительности стадий запроса для заголовка Server-Timing.
+
+    Стадии ML сервиса добавляются с префиксом "ml-", чтобы в DevTools
+    было видно, где ушло время: в БД, в поиске или в LLM.
+    """
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.entries: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def add(self, name: str, duration_ms: float) -> None:
+        self.entries.append((name, duration_ms))
+
+    def merge(self, prefix: str, timings: Dict[str, float]) -> None:
+        for name, duration_ms in timings.items():
+            self.add(f"{prefix}-{name}", float(duration_ms))
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def header(self) -> str:
+        parts = [f"{name};dur={duration:.1f}" for name, duration in self.entries]
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+    def log(self, sample_rate: float, **fields) -> None:
+        """Структурированная строка трассы для доли запросов; ошибки пишутся всегда."""
+        if fields.get("status", 0) < 500 and random.random() >= sample_rate:
+            return
+        logger.info(json.dumps(
+            {
+                "event": "trace",
+                "request_id": self.request_id,
+                "total_ms": round(self.total_ms(), 2),
+                "stages": {name: round(duration, 2) for name, duration in self.entries},
+                **fields,
+            },
+            ensure_ascii=False,
+        ))
@@ -1,9 +1,35 @@
-from fastapi import FastAPI
+import uuid
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import chat, auth
+from app.core.config import settings
+from app.core.tracing import ServerTiming
 
 app = FastAPI()
 
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Request ID (X-Request-ID) и Server-Timing по стадиям запроса."""
+    timing = ServerTiming(request.headers.get("X-Request-ID") or uuid.uuid4().hex)
+    request.state.timing = timing
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        timing.log(
+            settings.TRACE_SAMPLE_RATE,
+            method=request.method,
+            path=request.url.path,
+            status=status,
+        )
+    response.headers["X-Request-ID"] = timing.request_id
+    response.headers["Server-Timing"] = timing.header()
+    return response
+
+
 # ИЗМЕНЕНИЕ: Расширим CORS настройки
 app.add_middleware(
     CORSMiddleware,
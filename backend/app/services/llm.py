@@ -1,22 +1,39 @@
+import logging
 import os
+from typing import Optional
+
 import httpx
 from fastapi import HTTPException
 
+from app.core.tracing import ServerTiming
+
 
 ML_SERVICE_URL = os.getenv("ML_SERVICE_URL", "http://ml:8001")
+ML_REQUEST_TIMEOUT = 120.0
+
+logger = logging.getLogger(__name__)
 
 
-async def request_llm_response(message: str) -> str:
+async def request_llm_response(message: str, timing: Optional[ServerTiming] = None) -> str:
     """
     Send a message to the ML RAG service and get a response.
+
+    If timing is given, the request ID is forwarded to the ML service
+    and its per-stage timings are merged in with the "ml-" prefix.
     """
+    # ML сервис отклоняет запрос сразу, если не успеет до нашего таймаута
+    headers = {"X-Request-Timeout": str(ML_REQUEST_TIMEOUT - 5)}
+    if timing is not None:
+        headers["X-Request-ID"] = timing.request_id
+
     async with httpx.AsyncClient() as client:
         try:
             # Call the RAG query endpoint
             response = await client.post(
                 f"{ML_SERVICE_URL}/rag/query",
                 json={"question": message, "top_k": 5},
-                timeout=120.0,
+                headers=headers,
+                timeout=ML_REQUEST_TIMEOUT,
             )
         except httpx.RequestError as e:
             print(f"Network error: {e}")
@@ -25,6 +42,14 @@ async def request_llm_response(message: str) -> str:
                 detail="ML service is unavailable. Please try again later."
             )
 
+    if response.status_code == 503:
+        logger.warning("ML service overloaded: %s", response.text)
+        raise HTTPException(
+            status_code=503,
+            detail="ML service is overloaded. Please try again later.",
+            headers={"Retry-After": response.headers.get("Retry-After", "5")},
+        )
+
     if response.status_code != 200:
         print(f"ML service error: {response.status_code} - {response.text}")
         raise HTTPException(
@@ -40,6 +65,9 @@ async def request_llm_response(message: str) -> str:
             detail="Invalid response from ML service"
         )
 
+    if timing is not None:
+        timing.merge("ml", response_data.get("timings") or {})
+
     answer = response_data.get("answer", "")
     
     if not answer:
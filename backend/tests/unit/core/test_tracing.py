@@ -0,0 +1,32 @@
+import re
+
+from app.core.tracing import ServerTiming
+
+
+def test_server_timing_header_format():
+    """Стадии идут в порядке добавления, длительности с одним знаком, total в конце"""
+    timing = ServerTiming("req-1")
+    timing.add("db", 1.234)
+    timing.add("ml", 250)
+
+    header = timing.header()
+
+    assert re.fullmatch(r"db;dur=1\.2, ml;dur=250\.0, total;dur=\d+\.\d", header)
+
+
+def test_server_timing_merges_ml_stages_with_prefix():
+    """Тайминги ML сервиса добавляются с префиксом ml- и приводятся к float"""
+    timing = ServerTiming("req-2")
+    timing.add("auth", 0.5)
+
+    timing.merge("ml", {"embed": 12, "search": "3.25", "llm": 900.04})
+
+    assert timing.entries == [
+        ("auth", 0.5),
+        ("ml-embed", 12.0),
+        ("ml-search", 3.25),
+        ("ml-llm", 900.04),
+    ]
+    assert timing.header().startswith(
+        "auth;dur=0.5, ml-embed;dur=12.0, ml-search;dur=3.2, ml-llm;dur=900.0, total;dur="
+    )
@@ -1,23 +1,122 @@
 import os
 from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, TypeVar
 from dotenv import load_dotenv
 
 
 load_dotenv()
 
+T = TypeVar("T")
+
+QDRANT_PRESET_NAMES = ("default", "accuracy", "memory", "disk")
+QDRANT_QUANTIZATION_MODES = ("none", "scalar", "binary")
+
 
 @dataclass(frozen=True)
 class Settings:
     gigachat_auth_key: str
     qdrant_url: str
     collection_name: str
+    vector_store_backend: str
+    local_index_path: str
     embedding_model_name: str
+    embedding_backend: str
+    onnx_quantization_config: str
+    hf_home: str
     eval_golden_path: str
     eval_runs_dir: str
+    eval_workers: int
     # LLM provider settings
     llm_provider: str
     openrouter_api_key: str
     openrouter_model: str
+    # Fake provider settings (offline benchmarks)
+    fake_llm_ttft_ms: float
+    fake_llm_ttft_sigma: float
+    fake_llm_tokens_per_second: float
+    fake_llm_error_rate: float
+    fake_llm_seed: int
+    # Multi-provider routing settings
+    llm_providers: List[str]
+    llm_hedge_enabled: bool
+    llm_hedge_min_delay_ms: float
+    llm_first_token_timeout: float
+    llm_stats_window: int
+    llm_circuit_failure_rate: float
+    llm_circuit_min_requests: int
+    llm_circuit_open_seconds: float
+    # Admission control settings
+    llm_max_concurrency: int
+    llm_concurrency_limits: Dict[str, int]
+    llm_max_queue: int
+    request_deadline_seconds: float
+    batch_llm_concurrency: int
+    # Async pipeline settings
+    embedding_workers: int
+    query_embedding_cache_size: int
+    embedding_batch_max_size: int
+    embedding_batch_max_wait_ms: float
+    qdrant_timeout: int
+    # Context packing settings
+    tokenizer_name: str
+    context_max_tokens: int
+    context_max_chunks_per_source: int
+    # Semantic cache settings
+    semantic_cache_enabled: bool
+    semantic_cache_threshold: float
+    semantic_cache_max_size: int
+    semantic_cache_ttl_seconds: float
+    semantic_cache_path: str
+    index_version: str
+    index_version_ttl_seconds: float
+    # Tracing settings
+    trace_sample_rate: float
+    # Startup settings
+    warmup_queries: int
+    warmup_retry_seconds: float
+    warmup_retry_max_seconds: float
+    # Qdrant collection tuning: пресет и поправки к нему (None - значение пресета)
+    qdrant_preset: str
+    qdrant_hnsw_m: Optional[int]
+    qdrant_hnsw_ef_construct: Optional[int]
+    qdrant_hnsw_ef: Optional[int]
+    qdrant_quantization: Optional[str]
+    qdrant_quantization_always_ram: Optional[bool]
+    qdrant_rescore: Optional[bool]
+    qdrant_oversampling: Optional[float]
+    qdrant_on_disk_vectors: Optional[bool]
+    qdrant_on_disk_hnsw: Optional[bool]
+    qdrant_on_disk_payload: Optional[bool]
+
+    def __post_init__(self):
+        if self.qdrant_preset not in QDRANT_PRESET_NAMES:
+            raise ValueError(
+                f"Unknown Qdrant preset: {self.qdrant_preset}. "
+                f"Available: {', '.join(QDRANT_PRESET_NAMES)}"
+            )
+        if self.qdrant_quantization not in (None, *QDRANT_QUANTIZATION_MODES):
+            raise ValueError(
+                f"Unsupported quantization: {self.qdrant_quantization}. "
+                f"Supported: {', '.join(QDRANT_QUANTIZATION_MODES)}"
+            )
+
+
+def _env_list(name: str) -> List[str]:
+    value = os.getenv(name, "")
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _env_optional(
+    name: str, parse: Callable[[str], T], default: Optional[T] = None
+) -> Optional[T]:
+    """Значение переменной или default, если она не задана."""
+    value = os.getenv(name, "").strip()
+    return parse(value) if value else default
+
+
+def parse_flag(value: str) -> bool:
+    """Булев флаг из переменной окружения: 1/true/yes/on."""
+    return value.strip().lower() in ("1", "true", "yes", "on")
 
 
 def get_settings() -> Settings:
@@ -29,10 +128,22 @@ def get_settings() -> Settings:
         gigachat_auth_key=os.getenv("GIGACHAT_AUTH_KEY", ""),
         qdrant_url=os.getenv("QDRANT_URL", "http://localhost:6333"),
         collection_name=os.getenv("QDRANT_COLLECTION", "tj"),
+        # qdrant | local
+        vector_store_backend=os.getenv("VECTOR_STORE_BACKEND", "qdrant").lower(),
+        local_index_path=os.getenv(
+            "LOCAL_INDEX_PATH",
+            os.path.join(base_dir, "storage", "local_index"),
+        ),
         embedding_model_name=os.getenv(
             "EMBEDDING_MODEL_NAME",
             "sentence-transformers/all-MiniLM-L6-v2",
         ),
+        embedding_backend=os.getenv("EMBEDDING_BACKEND", "torch").lower(),
+        onnx_quantization_config=os.getenv("ONNX_QUANTIZATION_CONFIG", "avx2"),
+        hf_home=os.getenv(
+            "HF_HOME",
+            os.path.join(os.path.expanduser("~"), ".cache", "huggingface"),
+        ),
         eval_golden_path=os.getenv(
             "EVAL_GOLDEN_PATH",
             os.path.join(data_dir, "eval_golden.json"),
@@ -41,10 +152,66 @@ def get_settings() -> Settings:
             "EVAL_RUNS_DIR",
             storage_dir,
         ),
+        eval_workers=int(os.getenv("EVAL_WORKERS", "4")),
         llm_provider=os.getenv("LLM_PROVIDER", "openrouter"),
         openrouter_api_key=os.getenv("OPENAI_API_KEY", ""),
         openrouter_model=os.getenv(
             "OPENROUTER_MODEL",
             "google/gemma-3-27b-it:free",
         ),
+        fake_llm_ttft_ms=float(os.getenv("FAKE_LLM_TTFT_MS", "300")),
+        fake_llm_ttft_sigma=float(os.getenv("FAKE_LLM_TTFT_SIGMA", "0.3")),
+        fake_llm_tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50")),
+        fake_llm_error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+        fake_llm_seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+        llm_providers=_env_list("LLM_PROVIDERS"),
+        llm_hedge_enabled=_env_optional("LLM_HEDGE_ENABLED", parse_flag, False),
+        llm_hedge_min_delay_ms=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "1000")),
+        llm_first_token_timeout=float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "30")),
+        llm_stats_window=int(os.getenv("LLM_STATS_WINDOW", "50")),
+        llm_circuit_failure_rate=float(os.getenv("LLM_CIRCUIT_FAILURE_RATE", "0.5")),
+        llm_circuit_min_requests=int(os.getenv("LLM_CIRCUIT_MIN_REQUESTS", "5")),
+        llm_circuit_open_seconds=float(os.getenv("LLM_CIRCUIT_OPEN_SECONDS", "30")),
+        llm_max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+        llm_concurrency_limits={
+            name.strip().lower(): int(limit)
+            for name, _, limit in (
+                item.partition("=") for item in _env_list("LLM_CONCURRENCY_LIMITS")
+            )
+        },
+        llm_max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+        request_deadline_seconds=float(os.getenv("REQUEST_DEADLINE_SECONDS", "100")),
+        batch_llm_concurrency=int(os.getenv("BATCH_LLM_CONCURRENCY", "4")),
+        embedding_workers=int(os.getenv("EMBEDDING_WORKERS", "2")),
+        qdrant_timeout=int(os.getenv("QDRANT_TIMEOUT", "10")),
+        query_embedding_cache_size=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096")),
+        embedding_batch_max_size=int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "16")),
+        embedding_batch_max_wait_ms=float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "2")),
+        tokenizer_name=os.getenv("TOKENIZER_NAME", ""),
+        context_max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "3000")),
+        context_max_chunks_per_source=int(os.getenv("CONTEXT_MAX_CHUNKS_PER_SOURCE", "2")),
+        semantic_cache_enabled=_env_optional("SEMANTIC_CACHE_ENABLED", parse_flag, True),
+        semantic_cache_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+        semantic_cache_max_size=int(os.getenv("SEMANTIC_CACHE_MAX_SIZE", "1000")),
+        semantic_cache_ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400")),
+        semantic_cache_path=os.getenv("SEMANTIC_CACHE_PATH", ""),
+        index_version=os.getenv("INDEX_VERSION", ""),
+        index_version_ttl_seconds=float(os.getenv("INDEX_VERSION_TTL_SECONDS", "30")),
+        trace_sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+        warmup_queries=int(os.getenv("WARMUP_QUERIES", "8")),
+        warmup_retry_seconds=float(os.getenv("WARMUP_RETRY_SECONDS", "1")),
+        warmup_retry_max_seconds=float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "30")),
+        qdrant_preset=os.getenv("QDRANT_PRESET", "default").strip().lower(),
+        qdrant_hnsw_m=_env_optional("QDRANT_HNSW_M", int),
+        qdrant_hnsw_ef_construct=_env_optional("QDRANT_HNSW_EF_CONSTRUCT", int),
+        qdrant_hnsw_ef=_env_optional("QDRANT_HNSW_EF", int),
+        qdrant_quantization=_env_optional("QDRANT_QUANTIZATION", str.lower),
+        qdrant_quantization_always_ram=_env_optional(
+            "QDRANT_QUANTIZATION_ALWAYS_RAM", parse_flag
+        ),
+        qdrant_rescore=_env_optional("QDRANT_QUANTIZATION_RESCORE", parse_flag),
+        qdrant_oversampling=_env_optional("QDRANT_QUANTIZATION_OVERSAMPLING", float),
+        qdrant_on_disk_vectors=_env_optional("QDRANT_ON_DISK_VECTORS", parse_flag),
+        qdrant_on_disk_hnsw=_env_optional("QDRANT_ON_DISK_HNSW", parse_flag),
+        qdrant_on_disk_payload=_env_optional("QDRANT_ON_DISK_PAYLOAD", parse_flag),
     )
@@ -0,0 +1,165 @@
+"""Prometheus метрики ML сервиса: латентности стадий RAG и состояние кэшей/очередей."""
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from app.core.tracing import record_stage
+
+
+# Эмбеддинг и поиск - миллисекунды, LLM - секунды: бакеты покрывают оба диапазона
+_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0,
+)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Длительность стадий RAG пайплайна",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+LLM_TTFT_SECONDS = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Время до первого токена LLM (от получения слота провайдера)",
+    ["provider", "model"],
+    buckets=_BUCKETS,
+)
+LLM_TOTAL_SECONDS = Histogram(
+    "llm_generation_duration_seconds",
+    "Полное время генерации ответа LLM",
+    ["provider", "model"],
+    buckets=_BUCKETS,
+)
+LLM_REQUESTS = Counter(
+    "llm_requests_total",
+    "Запросы к LLM провайдерам по исходу",
+    ["provider", "model", "outcome"],
+)
+RAG_REQUESTS = Counter(
+    "rag_requests_total",
+    "RAG запросы по эндпоинту и попаданию в семантический кэш",
+    ["endpoint", "cache"],
+)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Замеряет блок кода в rag_stage_duration_seconds{stage=...} и в трассу запроса."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+        record_stage(stage, elapsed)
+
+
+class RuntimeStatsCollector(Collector):
+    """
+    Отдаёт счётчики из stats() сервисов в момент скрейпа.
+
+    Кэши и очереди уже считают себя сами, поэтому не дублируем их
+    в отдельных метриках, а читаем текущие значения при каждом /metrics.
+    """
+
+    def __init__(self, stats_provider: Callable[[], Dict[str, Any]]):
+        self.stats_provider = stats_provider
+
+    def collect(self) -> Iterator[Any]:
+        stats = self.stats_provider()
+
+        cache_gauge = GaugeMetricFamily(
+            "rag_cache_entries", "Число записей в кэше", labels=["cache"]
+        )
+        cache_hits = CounterMetricFamily(
+            "rag_cache_hits", "Попадания в кэш", labels=["cache"]
+        )
+        cache_misses = CounterMetricFamily(
+            "rag_cache_misses", "Промахи кэша", labels=["cache"]
+        )
+        for name in ("semantic_cache", "embedding_cache"):
+            cache = stats.get(name)
+            if not cache:
+                continue
+            cache_gauge.add_metric([name], cache.get("size", 0))
+            cache_hits.add_metric([name], cache.get("hits", 0))
+            cache_misses.add_metric([name], cache.get("misses", 0))
+        yield cache_gauge
+        yield cache_hits
+        yield cache_misses
+
+        batcher = stats.get("embedding_batcher") or {}
+        yield GaugeMetricFamily(
+            "embedding_batcher_queue_depth",
+            "Запросы, ожидающие батча эмбеддингов",
+            value=batcher.get("queued", 0),
+        )
+
+        router = stats.get("llm_router") or {}
+        active = GaugeMetricFamily(
+            "llm_admission_active", "Занятые слоты провайдера", labels=["provider"]
+        )
+        queued = GaugeMetricFamily(
+            "llm_admission_queue_depth", "Запросы в очереди к провайдеру", labels=["provider"]
+        )
+        rejected = CounterMetricFamily(
+            "llm_admission_rejected", "Отказы admission control", labels=["provider", "reason"]
+        )
+        for provider, admission in (router.get("admission") or {}).items():
+            active.add_metric([provider], admission["active"])
+            queued.add_metric([provider], admission["queue_depth"])
+            rejected.add_metric([provider, "queue_full"], admission["rejected_queue_full"])
+            rejected.add_metric([provider, "deadline"], admission["rejected_deadline"])
+        yield active
+        yield queued
+        yield rejected
+
+        circuit = GaugeMetricFamily(
+            "llm_circuit_open", "1 если circuit breaker провайдера не закрыт", labels=["target"]
+        )
+        for target, health in (router.get("providers") or {}).items():
+            circuit.add_metric([target], 0 if health["state"] == "closed" else 1)
+        yield circuit
+
+
+_runtime_collector: Optional[RuntimeStatsCollector] = None
+_runtime_registry: Optional[CollectorRegistry] = None
+
+
+def register_runtime_stats(
+    stats_provider: Callable[[], Dict[str, Any]],
+    registry: Optional[CollectorRegistry] = None,
+) -> None:
+    """
+    Регистрирует RuntimeStatsCollector; повторный вызов (второй startup
+    в том же процессе - тесты, reload) заменяет прежний коллектор.
+    """
+    global _runtime_collector, _runtime_registry
+    if _runtime_collector is not None and _runtime_registry is not None:
+        _runtime_registry.unregister(_runtime_collector)
+    _runtime_collector = RuntimeStatsCollector(stats_provider)
+    _runtime_registry = registry or REGISTRY
+    _runtime_registry.register(_runtime_collector)
+
+
+def render_metrics() -> bytes:
+    """
+    Текст /metrics.
+
+    Под gunicorn (PROMETHEUS_MULTIPROC_DIR) гистограммы и счётчики
+    собираются из файлов всех воркеров, а состояние кэшей и очередей -
+    только ответившего воркера.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    if _runtime_collector is not None:
+        registry.register(_runtime_collector)
+    return generate_latest(registry)
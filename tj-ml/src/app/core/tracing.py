@@ -0,0 +1,79 @@
+"""Трассировка запроса: request ID и длительности стадий для Server-Timing."""
+import contextvars
+import json
+import random
+import time
+import uuid
+from typing import Dict, Optional
+
+from app.core.logging import get_logger
+
+
+logger = get_logger("app.trace")
+
+
+class RequestTrace:
+    """Длительности стадий одного запроса (мс), накапливаются по ходу пайплайна."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        # Стадия может повторяться (например, несколько попыток) - суммируем
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def timings(self) -> Dict[str, float]:
+        return {stage: round(ms, 2) for stage, ms in self.stages.items()}
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing: стадии и общее время обработки."""
+        parts = [f"{stage};dur={ms:.1f}" for stage, ms in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar(
+    "request_trace", default=None
+)
+
+
+def start_trace(request_id: Optional[str] = None) -> RequestTrace:
+    trace = RequestTrace(request_id or uuid.uuid4().hex)
+    _current_trace.set(trace)
+    return trace
+
+
+def get_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Добавляет стадию в трассу текущего запроса (вне запроса - ничего не делает)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(stage, seconds)
+
+
+def log_trace(trace: RequestTrace, sample_rate: float, **fields) -> None:
+    """
+    Структурированная строка трассы для доли sample_rate запросов.
+
+    Ошибки (status >= 500) пишутся всегда.
+    """
+    if fields.get("status", 0) < 500 and random.random() >= sample_rate:
+        return
+    logger.info(json.dumps(
+        {
+            "event": "trace",
+            "request_id": trace.request_id,
+            "total_ms": round(trace.elapsed_ms(), 2),
+            "stages": trace.timings(),
+            **fields,
+        },
+        ensure_ascii=False,
+    ))
@@ -1,19 +1,49 @@
+import asyncio
+import json
+import math
+from typing import Any, AsyncIterator, Dict, Optional
+
 from app.core.config import get_settings
-from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from app.core.logging import configure_logging, get_logger
-from app.schemas.rag import RAGQueryRequest, RAGQueryResponse, SourceDocument
+from app.core.metrics import register_runtime_stats, render_metrics
+from app.core.tracing import RequestTrace, get_trace, log_trace, start_trace
+from app.schemas.rag import (
+    RAGBatchItem,
+    RAGBatchRequest,
+    RAGBatchResponse,
+    RAGQueryRequest,
+    RAGQueryResponse,
+    SourceDocument,
+)
 from app.schemas.eval import (
     EvalRunRequest,
     EvalRunResponse,
     EvalStatusResponse,
     EvalReport
 )
-from app.services.embeddings import get_embeddings
-from app.services.vector_store import get_vector_store
-from app.services.llm import get_llm
-from app.services.rag_chain import query_rag
-from app.services.eval_pipeline import create_run, read_run, run_evaluation
+from app.services.admission import AdmissionRejected, set_request_deadline
+from app.services.embeddings import (
+    CachedQueryEmbeddings,
+    get_embedding_batcher,
+    get_embedding_executor,
+    get_embeddings,
+)
+from app.services.vector_store import get_async_qdrant_client
+from app.services.warmup import get_warmup_state, run_warmup
+from app.services.llm_router import get_llm_router
+from app.services.rag_chain import query_rag, query_rag_batch, stream_rag
+from app.services.semantic_cache import get_semantic_cache
+from app.services.eval_pipeline import (
+    create_run,
+    read_items,
+    read_run,
+    resume_run,
+    run_evaluation,
+)
 
 
 logger = get_logger(__name__)
@@ -21,39 +51,219 @@ logger = get_logger(__name__)
 app = FastAPI(title="RAG Evaluation API", version="0.1.0")
 
 
+_warmup_task: Optional["asyncio.Task"] = None
+
+
 @app.on_event("startup")
-def _startup() -> None:
+async def _startup() -> None:
+    global _warmup_task
     configure_logging()
-    settings = get_settings()
-    logger.info("Initializing embeddings, vector store, and LLM...")
-    logger.info(f"LLM Provider: {settings.llm_provider}")
-    if settings.llm_provider == "openrouter":
-        logger.info(f"OpenRouter Model: {settings.openrouter_model}")
-    get_embeddings()
-    get_vector_store()
-    get_llm()
-    logger.info("Initialization complete.")
-    logger.info(f"Embedding Model: {settings.embedding_model_name}")
-
-
-@app.post("/rag/query", response_model=RAGQueryResponse)
-def rag_query(payload: RAGQueryRequest) -> RAGQueryResponse:
-    answer, context, docs, token_usage = query_rag(payload.question, top_k=payload.top_k)
+    register_runtime_stats(_runtime_stats)
+    # Модели грузятся в фоне: /health отвечает сразу, /ready - после прогрева
+    logger.info("Initializing embeddings, vector store, and LLM in background...")
+    _warmup_task = asyncio.create_task(run_warmup())
+
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+    # Прогрев мог не дойти до конца - освобождаем только то, что успело создаться,
+    # не создавая остальное ради закрытия
+    if _created(get_embedding_batcher):
+        await get_embedding_batcher().close()
+    if _created(get_async_qdrant_client):
+        await get_async_qdrant_client().close()
+    if _created(get_embedding_executor):
+        get_embedding_executor().shutdown(wait=False)
+    if _created(get_semantic_cache):
+        get_semantic_cache().save()
+
+
+def _created(factory) -> bool:
+    """Вызывалась ли уже фабрика с lru_cache."""
+    return factory.cache_info().currsize > 0
+
+
+@app.middleware("http")
+async def _trace_request(request: Request, call_next):
+    """
+    Request ID из X-Request-ID (или новый) и длительности стадий.
+
+    Стадии отдаются в Server-Timing; для SSE заголовки уходят до генерации,
+    поэтому там только request ID, а трасса пишется в лог, когда тело
+    ответа отдано целиком.
+    """
+    trace = start_trace(request.headers.get("X-Request-ID"))
+    fields = {"method": request.method, "path": request.url.path}
+    try:
+        response = await call_next(request)
+    except BaseException:
+        log_trace(trace, get_settings().trace_sample_rate, status=500, **fields)
+        raise
+    response.headers["X-Request-ID"] = trace.request_id
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        response.body_iterator = _log_trace_after_body(
+            response.body_iterator, trace, status=response.status_code, **fields
+        )
+    else:
+        response.headers["Server-Timing"] = trace.server_timing()
+        log_trace(trace, get_settings().trace_sample_rate, status=response.status_code, **fields)
+    return response
+
+
+async def _log_trace_after_body(
+    body: AsyncIterator[bytes], trace: RequestTrace, **fields: Any
+) -> AsyncIterator[bytes]:
+    """Отдаёт тело стрима и пишет трассу в конце - со стадиями генерации."""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        log_trace(trace, get_settings().trace_sample_rate, **fields)
+
+
+async def request_deadline(
+    x_request_timeout: Optional[float] = Header(None),
+) -> None:
+    """
+    Дедлайн запроса для admission control: из заголовка X-Request-Timeout
+    (секунды, обычно таймаут вызывающего клиента) или REQUEST_DEADLINE_SECONDS.
+    """
+    set_request_deadline(x_request_timeout or get_settings().request_deadline_seconds)
+
+
+async def require_ready() -> None:
+    """
+    Пока идёт прогрев, запросы к RAG получают 503, как /ready.
+
+    Иначе первый запрос сам начнёт грузить модель параллельно с прогревом.
+    """
+    state = get_warmup_state()
+    if not state.ready:
+        retry_after = max(1, math.ceil(get_settings().warmup_retry_seconds))
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service is warming up: {state.status}",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+@app.exception_handler(AdmissionRejected)
+async def _admission_rejected_handler(request: Request, exc: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": exc.retry_after_header},
+    )
+
+
+@app.post(
+    "/rag/query",
+    response_model=RAGQueryResponse,
+    dependencies=[Depends(require_ready), Depends(request_deadline)],
+)
+async def rag_query(payload: RAGQueryRequest) -> RAGQueryResponse:
+    answer, context, docs, token_usage = await query_rag(
+        payload.question, top_k=payload.top_k, use_cache=payload.use_cache
+    )
     sources = [
         SourceDocument(content=doc.page_content, metadata=doc.metadata or {})
         for doc in docs
     ]
+    trace = get_trace()
     return RAGQueryResponse(
         answer=answer,
         context=context,
         sources=sources,
-        token_usage=token_usage
+        token_usage=token_usage,
+        timings=trace.timings() if trace is not None else {},
+    )
+
+
+@app.post(
+    "/rag/batch",
+    response_model=RAGBatchResponse,
+    dependencies=[Depends(require_ready), Depends(request_deadline)],
+)
+async def rag_batch(payload: RAGBatchRequest) -> RAGBatchResponse:
+    results = await query_rag_batch(
+        payload.questions, top_k=payload.top_k, use_cache=payload.use_cache
+    )
+    items = []
+    total_usage: Dict[str, int] = {}
+    for question, result in zip(payload.questions, results):
+        if isinstance(result, Exception):
+            items.append(RAGBatchItem(question=question, error=str(result)))
+            continue
+        answer, context, docs, token_usage = result
+        for key, value in token_usage.items():
+            total_usage[key] = total_usage.get(key, 0) + value
+        items.append(RAGBatchItem(
+            question=question,
+            answer=answer,
+            context=context,
+            sources=[
+                SourceDocument(content=doc.page_content, metadata=doc.metadata or {})
+                for doc in docs
+            ],
+            token_usage=token_usage,
+        ))
+    return RAGBatchResponse(items=items, token_usage=total_usage)
+
+
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def _rag_event_stream(payload: RAGQueryRequest) -> AsyncIterator[str]:
+    try:
+        async for event, data in stream_rag(
+            payload.question, top_k=payload.top_k, use_cache=payload.use_cache
+        ):
+            if event == "sources":
+                data = {
+                    "context": data["context"],
+                    "sources": [
+                        SourceDocument(
+                            content=doc.page_content, metadata=doc.metadata or {}
+                        ).model_dump()
+                        for doc in data["docs"]
+                    ],
+                }
+            yield _format_sse(event, data)
+    except AdmissionRejected as exc:
+        yield _format_sse("error", {"detail": str(exc), "retry_after": exc.retry_after})
+    except Exception as exc:
+        # Заголовки уже отправлены, поэтому об ошибке сообщаем отдельным событием
+        logger.exception("RAG stream failed: %s", exc)
+        yield _format_sse("error", {"detail": str(exc)})
+
+
+@app.post("/rag/stream", dependencies=[Depends(require_ready), Depends(request_deadline)])
+async def rag_stream(payload: RAGQueryRequest) -> StreamingResponse:
+    """
+    Server-Sent Events: sources -> token* -> done (или error).
+    """
+    return StreamingResponse(
+        _rag_event_stream(payload),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
-@app.post("/eval/run", response_model=EvalRunResponse)
+@app.post("/eval/run", response_model=EvalRunResponse, dependencies=[Depends(require_ready)])
 def eval_run(payload: EvalRunRequest, background_tasks: BackgroundTasks) -> EvalRunResponse:
-    run_id = create_run(payload.run_name)
+    if payload.resume_run_id:
+        try:
+            run_id = resume_run(payload.resume_run_id)
+        except FileNotFoundError as exc:
+            raise HTTPException(status_code=404, detail=str(exc)) from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=409, detail=str(exc)) from exc
+    else:
+        run_id = create_run(payload.run_name, mode=payload.mode, top_k=payload.top_k)
     background_tasks.add_task(run_evaluation, run_id)
     return EvalRunResponse(run_id=run_id, status="running")
 
@@ -70,6 +280,7 @@ def eval_status(run_id: str) -> EvalStatusResponse:
         started_at=run_data.get("started_at"),
         finished_at=run_data.get("finished_at"),
         error=run_data.get("error"),
+        **run_data.get("progress", {}),
     )
 
 
@@ -82,11 +293,52 @@ def eval_report(run_id: str) -> EvalReport:
     return EvalReport(
         run_id=run_data["run_id"],
         status=run_data["status"],
+        mode=run_data.get("mode", "end_to_end"),
         metrics=run_data.get("metrics", {}),
-        items=run_data.get("items", []),
+        items=run_data.get("items") or [
+            item
+            for _index, item in sorted(
+                read_items(run_id, run_data.get("mode", "end_to_end")).items()
+            )
+        ],
     )
 
 
+@app.get("/stats")
+def runtime_stats() -> Dict[str, Any]:
+    """Счётчики кэшей для подбора порогов и размеров."""
+    return _runtime_stats()
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    """Prometheus метрики: латентности стадий, LLM по провайдерам, кэши и очереди."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+def _runtime_stats() -> Dict[str, Any]:
+    if not get_warmup_state().ready:
+        # Не трогаем синглтоны, пока их создаёт прогрев
+        return {}
+    embeddings = get_embeddings()
+    return {
+        "semantic_cache": get_semantic_cache().stats(),
+        "embedding_cache": (
+            embeddings.stats() if isinstance(embeddings, CachedQueryEmbeddings) else None
+        ),
+        "embedding_batcher": get_embedding_batcher().stats(),
+        "llm_router": get_llm_router().stats(),
+    }
+
+
 @app.get("/health")
 def health_check():
+    """Liveness: процесс жив и обслуживает запросы."""
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+def readiness_check() -> JSONResponse:
+    """Readiness: модели загружены и прогреты, можно пускать трафик."""
+    state = get_warmup_state()
+    return JSONResponse(status_code=200 if state.ready else 503, content=state.to_dict())
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 from pydantic import BaseModel, Field
 
 
@@ -10,6 +10,14 @@ class GoldenItem(BaseModel):
 
 class EvalRunRequest(BaseModel):
     run_name: Optional[str] = None
+    mode: Literal["end_to_end", "retrieval"] = Field(
+        "end_to_end",
+        description="retrieval - только эмбеддинг и поиск, без LLM: recall@k, MRR и латентности",
+    )
+    top_k: int = Field(3, ge=1, le=50)
+    resume_run_id: Optional[str] = Field(
+        None, description="Продолжить прерванный прогон с последнего завершённого вопроса"
+    )
 
 
 class EvalRunResponse(BaseModel):
@@ -23,6 +31,10 @@ class EvalStatusResponse(BaseModel):
     started_at: Optional[str] = None
     finished_at: Optional[str] = None
     error: Optional[str] = None
+    done: int = 0
+    total: int = 0
+    failed: int = 0
+    eta_seconds: Optional[float] = None
 
 
 class EvalItemResult(BaseModel):
@@ -33,8 +45,20 @@ class EvalItemResult(BaseModel):
     f1: float
 
 
+class RetrievalItemResult(BaseModel):
+    question: str
+    rank: Optional[int] = Field(
+        None, description="Позиция первого фрагмента, совпавшего с reference_context (с 1)"
+    )
+    reciprocal_rank: float
+    embed_ms: float
+    search_ms: float
+    retrieved_sources: List[str] = Field(default_factory=list)
+
+
 class EvalReport(BaseModel):
     run_id: str
     status: str
+    mode: str = "end_to_end"
     metrics: Dict[str, Any]
-    items: List[EvalItemResult]
+    items: List[Union[EvalItemResult, RetrievalItemResult]]
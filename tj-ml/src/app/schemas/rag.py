@@ -1,10 +1,11 @@
-from typing import Any, Dict, List, Optional
+from typing import Annotated, Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
 class RAGQueryRequest(BaseModel):
     question: str = Field(..., min_length=1)
     top_k: int = Field(3, ge=1, le=20)
+    use_cache: bool = Field(True, description="Искать ответ в семантическом кэше")
 
 
 class SourceDocument(BaseModel):
@@ -25,9 +26,42 @@ class RAGQueryResponse(BaseModel):
             "- prompt_tokens: общие входные токены (query + context + промпт)\n"
             "- completion_tokens: токены ответа модели\n"
             "- total_tokens: общее количество токенов\n"
-            "- successful_requests: количество успешных запросов"
+            "- successful_requests: количество успешных запросов\n"
+            "- context_chunks: сколько фрагментов попало в контекст\n"
+            "- context_chunks_dropped: фрагменты, не влезшие в бюджет CONTEXT_MAX_TOKENS\n"
+            "- context_chunks_truncated: фрагменты, обрезанные под бюджет\n"
+            "- context_chunks_duplicates: повторы текста уже взятых фрагментов\n"
+            "- context_chunks_source_capped: фрагменты статьи сверх CONTEXT_MAX_CHUNKS_PER_SOURCE\n"
+            "- cache_hit: 1, если ответ взят из семантического кэша"
         )
     )
+    timings: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Длительности стадий запроса в мс (embed, search, format, llm_ttft, llm_total)",
+    )
+
+
+class RAGBatchRequest(BaseModel):
+    questions: List[Annotated[str, Field(min_length=1)]] = Field(..., min_length=1, max_length=100)
+    top_k: int = Field(3, ge=1, le=20)
+    use_cache: bool = Field(True, description="Искать ответы в семантическом кэше")
+
+
+class RAGBatchItem(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    context: Optional[str] = None
+    sources: List[SourceDocument] = Field(default_factory=list)
+    token_usage: Dict[str, int] = Field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class RAGBatchResponse(BaseModel):
+    items: List[RAGBatchItem]
+    token_usage: Dict[str, int] = Field(
+        default_factory=dict,
+        description="Сумма token_usage по всем вопросам пакета",
+    )
 
 
 class RAGErrorResponse(BaseModel):
@@ -0,0 +1,155 @@
+"""Admission control: ограничение одновременных запросов к LLM провайдерам."""
+import asyncio
+import contextvars
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+_request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+def set_request_deadline(timeout_seconds: float) -> None:
+    """Дедлайн текущего запроса (time.monotonic), виден всему пайплайну через contextvar."""
+    _request_deadline.set(time.monotonic() + timeout_seconds)
+
+
+def get_request_deadline() -> Optional[float]:
+    return _request_deadline.get()
+
+
+class AdmissionRejected(Exception):
+    """Запрос не принят: очередь полна или не дождётся слота до дедлайна."""
+
+    def __init__(self, provider: str, reason: str, retry_after: float):
+        super().__init__(f"LLM provider {provider} is overloaded: {reason}")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionController:
+    """
+    Семафор с ограниченной FIFO очередью и отказом по дедлайну.
+
+    Запрос сразу получает отказ, если очередь полна или если оценка
+    ожидания в очереди (позиция / лимит * среднее время обслуживания)
+    больше оставшегося до дедлайна времени. Так мы не копим запросы,
+    которые всё равно не успеют.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, window: int = 100):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_times: Deque[float] = deque(maxlen=window)
+        self._wait_times: Deque[float] = deque(maxlen=window)
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _avg_service_time(self) -> float:
+        if not self._service_times:
+            return 0.0
+        return sum(self._service_times) / len(self._service_times)
+
+    def estimated_wait(self) -> float:
+        if self._active < self.max_concurrency and not self._waiters:
+            return 0.0
+        position = len(self._waiters) + 1
+        return position / self.max_concurrency * self._avg_service_time()
+
+    async def acquire(self, deadline: Optional[float] = None) -> None:
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            self._wait_times.append(0.0)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(self.name, "queue is full", self.estimated_wait())
+
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            estimate = self.estimated_wait()
+            if estimate > remaining:
+                self.rejected_deadline += 1
+                raise AdmissionRejected(
+                    self.name,
+                    f"expected queue wait {estimate:.1f}s "
+                    f"exceeds remaining {max(remaining, 0):.1f}s",
+                    estimate,
+                )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=remaining)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.rejected_deadline += 1
+            raise AdmissionRejected(self.name, "deadline expired in queue", self.estimated_wait())
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        self.admitted += 1
+        self._wait_times.append(time.monotonic() - started)
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        if waiter.done() and not waiter.cancelled():
+            # Слот уже передан этому ожидающему - возвращаем его
+            self.release()
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        if service_time is not None:
+            self._service_times.append(service_time)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Слот переходит следующему в очереди, _active не меняется
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._wait_times)
+
+        def _pct(q: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(q / 100 * len(waits)))] * 1000
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queue_depth": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_deadline": self.rejected_deadline,
+            "wait_p50_ms": _pct(50),
+            "wait_p95_ms": _pct(95),
+            "avg_service_ms": self._avg_service_time() * 1000,
+        }
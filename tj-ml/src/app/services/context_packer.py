@@ -0,0 +1,139 @@
+"""Упаковка найденных фрагментов в контекст промпта с бюджетом токенов."""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from app.utils.token_utils import chunk_token_count, count_tokens, truncate_to_tokens
+
+
+@dataclass
+class PackedContext:
+    """Результат упаковки: итоговый контекст и что в него не попало."""
+    context: str
+    docs: List[Document]
+    tokens: int = 0
+    dropped: int = 0
+    truncated: int = 0
+    duplicates: int = 0
+    source_capped: int = 0
+
+    def usage_stats(self) -> Dict[str, int]:
+        return {
+            "context_chunks": len(self.docs),
+            "context_chunks_dropped": self.dropped,
+            "context_chunks_truncated": self.truncated,
+            "context_chunks_duplicates": self.duplicates,
+            "context_chunks_source_capped": self.source_capped,
+        }
+
+
+def _source_key(doc: Document) -> str:
+    return doc.metadata.get("source_url") or f"id:{id(doc)}"
+
+
+def _fragment_header(doc: Document) -> Tuple[str, str]:
+    source_url = doc.metadata.get("source_url", "N/A")
+    article_title = doc.metadata.get("article_title", "Неизвестная статья")
+    return article_title, source_url
+
+
+SOURCE_SEPARATOR = "\n\n"
+CHUNK_SEPARATOR = "\n...\n"
+
+
+def format_context(docs: Sequence[Document]) -> str:
+    """
+    Формирует контекст: один фрагмент на статью, заголовок и URL один раз.
+
+    Фрагменты одной статьи идут подряд в порядке релевантности.
+    """
+    groups: "OrderedDict[str, List[Document]]" = OrderedDict()
+    for doc in docs:
+        groups.setdefault(_source_key(doc), []).append(doc)
+
+    formatted = []
+    for i, group in enumerate(groups.values(), 1):
+        article_title, source_url = _fragment_header(group[0])
+        content = CHUNK_SEPARATOR.join(doc.page_content for doc in group)
+        formatted.append(
+            f"Фрагмент {i}:\n{content}\n"
+            f"Источник: {article_title}\nURL: {source_url}"
+        )
+    return SOURCE_SEPARATOR.join(formatted)
+
+
+def pack_context(
+    scored_docs: Sequence[Tuple[Document, float]],
+    max_tokens: int,
+    max_chunks_per_source: int = 2,
+    min_chunk_tokens: int = 50,
+) -> PackedContext:
+    """
+    Собирает контекст из найденных фрагментов в пределах бюджета токенов.
+
+    Фрагменты берутся по убыванию score. Повторы текста и лишние фрагменты
+    одной статьи (больше max_chunks_per_source) отбрасываются. Фрагмент,
+    не влезающий в остаток бюджета, обрезается, если после обрезки остаётся
+    хотя бы min_chunk_tokens токенов, иначе пропускается. В бюджет входят
+    заголовки статей и разделители между фрагментами.
+
+    Args:
+        scored_docs: Пары (документ, score) из векторного поиска
+        max_tokens: Бюджет токенов контекста (0 - без ограничения)
+        max_chunks_per_source: Максимум фрагментов одной статьи
+        min_chunk_tokens: Минимальный размер обрезанного фрагмента
+    """
+    ordered = sorted(scored_docs, key=lambda pair: pair[1], reverse=True)
+    packed = PackedContext(context="", docs=[])
+
+    seen_texts = set()
+    per_source: Dict[str, int] = {}
+    remaining = max_tokens if max_tokens > 0 else None
+    source_separator_tokens = count_tokens(SOURCE_SEPARATOR)
+    chunk_separator_tokens = count_tokens(CHUNK_SEPARATOR)
+
+    for doc, _score in ordered:
+        text_key = " ".join(doc.page_content.split())
+        source = _source_key(doc)
+        if text_key in seen_texts:
+            packed.duplicates += 1
+            continue
+        if per_source.get(source, 0) >= max_chunks_per_source:
+            packed.source_capped += 1
+            continue
+
+        # Токены фрагмента суммируются из предрасчитанных при индексации
+        # значений, заново токенизируются только заголовки и обрезанный текст
+        chunk_tokens = chunk_token_count(doc.metadata, doc.page_content)
+        if source not in per_source:
+            overhead_tokens = count_tokens(
+                "Фрагмент 0:\n\nИсточник: {}\nURL: {}".format(*_fragment_header(doc))
+            )
+            if per_source:
+                overhead_tokens += source_separator_tokens
+        else:
+            overhead_tokens = chunk_separator_tokens
+
+        if remaining is not None and chunk_tokens + overhead_tokens > remaining:
+            allowed = remaining - overhead_tokens
+            if allowed < min_chunk_tokens:
+                packed.dropped += 1
+                continue
+            doc = Document(
+                page_content=truncate_to_tokens(doc.page_content, allowed),
+                metadata=doc.metadata,
+            )
+            chunk_tokens = count_tokens(doc.page_content)
+            packed.truncated += 1
+
+        if remaining is not None:
+            remaining = max(0, remaining - chunk_tokens - overhead_tokens)
+        packed.tokens += chunk_tokens + overhead_tokens
+        seen_texts.add(text_key)
+        per_source[source] = per_source.get(source, 0) + 1
+        packed.docs.append(doc)
+
+    packed.context = format_context(packed.docs)
+    return packed
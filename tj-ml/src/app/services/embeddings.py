@@ -1,9 +1,422 @@
+import asyncio
+import os
+import sys
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
 from langchain_huggingface import HuggingFaceEmbeddings
 from app.core.config import get_settings
+from app.core.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+
+def embed_query_batch(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Эмбеддинги пачки запросов одним прямым проходом модели.
+
+    Считает так же, как embed_query (для HuggingFaceEmbeddings - с
+    query_encode_kwargs, например префиксом "query: " у e5), но батчем.
+    У остальных моделей запрос и документ не различаются.
+    """
+    if isinstance(embeddings, HuggingFaceEmbeddings):
+        kwargs = embeddings.query_encode_kwargs or embeddings.encode_kwargs
+        return embeddings._embed(texts, kwargs)
+    return embeddings.embed_documents(texts)
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Обёртка над моделью эмбеддингов с LRU кэшем векторов запросов.
+
+    Ключ кэша - нормализованный текст запроса (NFKC, регистр, пробелы),
+    а модель считает исходный текст тем же путём, что и embed_query, так
+    что вектор не зависит от того, включён ли кэш. Векторы хранятся
+    компактно в float32 numpy массивах. Эмбеддинги документов не кэшируются
+    и считаются базовой моделью как есть.
+    """
+
+    def __init__(self, base: Embeddings, max_size: int):
+        self.base = base
+        self.max_size = max_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._vector_bytes = 0
+        self._key_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_query(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def get_cached(self, text: str) -> Optional[List[float]]:
+        """Вектор из кэша без расчёта; промах не учитывается в статистике."""
+        key = self.normalize_query(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is None:
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return vector.tolist()
+
+    def _put(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = vector
+            self._vector_bytes += vector.nbytes
+            self._key_bytes += sys.getsizeof(key)
+            while len(self._cache) > self.max_size:
+                old_key, old_vector = self._cache.popitem(last=False)
+                self._vector_bytes -= old_vector.nbytes
+                self._key_bytes -= sys.getsizeof(old_key)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Эмбеддинги пачки запросов: промахи считаются одним батчем модели."""
+        keys = [self.normalize_query(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = vector
+                    self.hits += 1
+                elif key not in found:
+                    self.misses += 1
+
+        # Модели отдаём текст как его ввёл пользователь: первый из запросов с этим ключом
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = embed_query_batch(self.base, list(missing.values()))
+            for key, vector in zip(missing, vectors):
+                found[key] = np.asarray(vector, dtype=np.float32)
+                self._put(key, found[key])
+
+        return [found[key].tolist() for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "vector_bytes": self._vector_bytes,
+                "memory_bytes": self._vector_bytes + self._key_bytes,
+            }
+
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def _onnx_file_name(quantize: bool, quantization_config: str) -> str:
+    if quantize:
+        return f"onnx/model_qint8_{quantization_config}.onnx"
+    return "onnx/model.onnx"
+
+
+def export_onnx_model(model_name: str, quantize: bool) -> Tuple[str, str]:
+    """
+    Экспортирует модель в ONNX (и при необходимости в int8) один раз.
+
+    Артефакт кладётся в $HF_HOME/onnx/<model>, поэтому переживает перезапуски
+    и общий для индексатора и ML сервиса (volume hf_cache). Параллельный
+    экспорт из нескольких процессов защищён файловой блокировкой.
+
+    Returns:
+        (путь к локальной модели, имя ONNX файла внутри неё)
+    """
+    from filelock import FileLock
+
+    settings = get_settings()
+    export_dir = os.path.join(settings.hf_home, "onnx", model_name.replace("/", "--"))
+    file_name = _onnx_file_name(quantize, settings.onnx_quantization_config)
+    os.makedirs(export_dir, exist_ok=True)
+
+    with FileLock(os.path.join(export_dir, ".export.lock")):
+        if os.path.exists(os.path.join(export_dir, file_name)):
+            return export_dir, file_name
+
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+        logger.info("Exporting %s to ONNX -> %s", model_name, export_dir)
+        if os.path.exists(os.path.join(export_dir, _onnx_file_name(False, ""))):
+            model = SentenceTransformer(export_dir, backend="onnx")
+        else:
+            model = SentenceTransformer(model_name, backend="onnx")
+            model.save_pretrained(export_dir)
+
+        if quantize:
+            logger.info(
+                "Quantizing %s to int8 (%s)", model_name, settings.onnx_quantization_config
+            )
+            export_dynamic_quantized_onnx_model(
+                model, settings.onnx_quantization_config, export_dir
+            )
+
+    return export_dir, file_name
+
+
+def create_base_embeddings(model_name: str, backend: str) -> HuggingFaceEmbeddings:
+    """
+    Создаёт модель эмбеддингов с выбранным бэкендом.
+
+    - torch: исходная fp32 модель sentence-transformers
+    - onnx: та же модель через onnxruntime
+    - onnx-int8: onnxruntime с динамической int8 квантизацией весов
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unsupported embedding backend: {backend}. "
+            f"Supported backends: {', '.join(EMBEDDING_BACKENDS)}"
+        )
+    if backend == "torch":
+        return HuggingFaceEmbeddings(model_name=model_name)
+
+    model_path, file_name = export_onnx_model(model_name, quantize=backend == "onnx-int8")
+    return HuggingFaceEmbeddings(
+        model_name=model_path,
+        model_kwargs={"backend": "onnx", "model_kwargs": {"file_name": file_name}},
+    )
 
 
 @lru_cache(maxsize=1)
-def get_embeddings() -> HuggingFaceEmbeddings:
+def get_embeddings() -> Embeddings:
     settings = get_settings()
-    return HuggingFaceEmbeddings(model_name=settings.embedding_model_name)
+    embeddings = create_base_embeddings(
+        settings.embedding_model_name, settings.embedding_backend
+    )
+    if settings.query_embedding_cache_size <= 0:
+        return embeddings
+    return CachedQueryEmbeddings(embeddings, max_size=settings.query_embedding_cache_size)
+
+
+@lru_cache(maxsize=1)
+def get_embedding_executor() -> ThreadPoolExecutor:
+    """
+    Отдельный ограниченный пул для CPU-bound расчёта эмбеддингов.
+
+    Не используем общий threadpool Starlette, чтобы прямой проход модели
+    не конкурировал с остальными sync-задачами и не выедал его потоки.
+    """
+    settings = get_settings()
+    return ThreadPoolExecutor(
+        max_workers=settings.embedding_workers,
+        thread_name_prefix="embeddings",
+    )
+
+
+def _embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    if isinstance(embeddings, CachedQueryEmbeddings):
+        return embeddings.embed_queries(texts)
+    return embed_query_batch(embeddings, texts)
+
+
+class EmbeddingBatcher:
+    """
+    Микро-батчинг одновременных запросов на эмбеддинг.
+
+    Запросы копятся в очереди до max_batch_size штук или max_wait_ms
+    миллисекунд, затем считаются одним прямым проходом модели в пуле
+    get_embedding_executor(). Одновременно выполняется не больше батчей,
+    чем потоков в пуле, поэтому под нагрузкой, пока модель занята,
+    очередь сама собирается в батчи покрупнее.
+
+    close() дожидается батчей, которые уже считаются, а запросам, ещё
+    ждущим в очереди, отвечает ошибкой.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        executor: ThreadPoolExecutor,
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_in_flight: int,
+    ):
+        self.embeddings = embeddings
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max_in_flight
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional["asyncio.Queue[Tuple[str, asyncio.Future]]"] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        # Ссылки на задачи батчей, иначе их может собрать GC посреди работы
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Очередь и семафор привязаны к циклу событий, в новом цикле нужны новые
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+            self._worker = None
+            self._tasks = set()
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+    @staticmethod
+    def _fail(batch: List[Tuple[str, asyncio.Future]], exc: BaseException) -> None:
+        for _text, future in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+    async def embed(self, text: str) -> List[float]:
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        try:
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Уже вынутые из очереди запросы иначе повиснут навсегда
+            self._fail(batch, RuntimeError("Embedding batcher is closed"))
+            raise
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            await self._in_flight.acquire()
+            try:
+                batch = await self._collect()
+            except asyncio.CancelledError:
+                self._in_flight.release()
+                raise
+            task = asyncio.get_running_loop().create_task(self._process(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _future in batch]
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _embed_queries, self.embeddings, texts
+            )
+        except Exception as exc:
+            logger.exception("Embedding batch of %d failed: %s", len(batch), exc)
+            self._fail(batch, exc)
+        else:
+            for (_text, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+        finally:
+            self._in_flight.release()
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        pending = []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._fail(pending, RuntimeError("Embedding batcher is closed"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_embedding_batcher() -> EmbeddingBatcher:
+    settings = get_settings()
+    return EmbeddingBatcher(
+        embeddings=get_embeddings(),
+        executor=get_embedding_executor(),
+        max_batch_size=settings.embedding_batch_max_size,
+        max_wait_ms=settings.embedding_batch_max_wait_ms,
+        max_in_flight=settings.embedding_workers,
+    )
+
+
+async def aembed_query(text: str, use_cache: bool = True) -> List[float]:
+    """
+    Асинхронно считает эмбеддинг запроса.
+
+    Попадания в кэш отдаются сразу, промахи идут через микро-батчер
+    (или напрямую в пул, если EMBEDDING_BATCH_MAX_SIZE=1). С use_cache=False
+    модель вызывается напрямую - для замеров латентности в eval.
+    """
+    embeddings = get_embeddings()
+    if not use_cache:
+        base = embeddings.base if isinstance(embeddings, CachedQueryEmbeddings) else embeddings
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_embedding_executor(), base.embed_query, text)
+
+    if isinstance(embeddings, CachedQueryEmbeddings):
+        cached = embeddings.get_cached(text)
+        if cached is not None:
+            return cached
+
+    if get_settings().embedding_batch_max_size > 1:
+        return await get_embedding_batcher().embed(text)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_embedding_executor(), embeddings.embed_query, text
+    )
+
+
+async def aembed_queries(texts: List[str]) -> List[List[float]]:
+    """Эмбеддинги пачки запросов одним прямым проходом модели (с учётом кэша)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_embedding_executor(), _embed_queries, get_embeddings(), texts
+    )
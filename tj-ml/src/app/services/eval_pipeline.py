@@ -1,13 +1,20 @@
+import asyncio
+import hashlib
 import json
 import os
+import time
 import uuid
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Type, Union
+
+from pydantic import BaseModel
 
 from app.core.config import get_settings
 from app.core.logging import get_logger
-from app.schemas.eval import GoldenItem, EvalItemResult
+from app.schemas.eval import GoldenItem, EvalItemResult, RetrievalItemResult
+from app.services.embeddings import aembed_query
 from app.services.rag_chain import query_rag
+from app.services.vector_store import asearch_by_vector
 
 
 logger = get_logger(__name__)
@@ -38,6 +45,30 @@ def _exact_match(prediction: str, ground_truth: str) -> float:
     return 1.0 if _normalize(prediction) == _normalize(ground_truth) else 0.0
 
 
+def _context_match(reference: str, chunk: str, min_overlap: float = 0.6) -> bool:
+    """
+    Совпадает ли найденный фрагмент с reference_context.
+
+    Чанки и эталонный контекст режутся по-разному, поэтому помимо
+    вхождения одного в другое считаем долю общих слов от меньшего из них.
+    """
+    reference_norm, chunk_norm = _normalize(reference), _normalize(chunk)
+    if not reference_norm or not chunk_norm:
+        return False
+    if reference_norm in chunk_norm or chunk_norm in reference_norm:
+        return True
+    reference_tokens, chunk_tokens = set(reference_norm.split()), set(chunk_norm.split())
+    common = reference_tokens & chunk_tokens
+    return len(common) / min(len(reference_tokens), len(chunk_tokens)) >= min_overlap
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
 def _ensure_runs_dir() -> str:
     settings = get_settings()
     os.makedirs(settings.eval_runs_dir, exist_ok=True)
@@ -49,6 +80,12 @@ def _run_path(run_id: str) -> str:
     return os.path.join(runs_dir, f"{run_id}.json")
 
 
+def _items_path(run_id: str) -> str:
+    """Построчный журнал результатов: по строке на завершённый вопрос."""
+    runs_dir = _ensure_runs_dir()
+    return os.path.join(runs_dir, f"{run_id}.items.jsonl")
+
+
 def _get_embedding_model_name() -> str:
     settings = get_settings()
     return settings.embedding_model_name
@@ -63,21 +100,49 @@ def load_golden_set() -> List[GoldenItem]:
     return [GoldenItem(**item) for item in data]
 
 
-def create_run(run_name: Optional[str] = None) -> str:
+def _golden_hash(golden_set: List[GoldenItem]) -> str:
+    raw = json.dumps([item.model_dump() for item in golden_set], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+# Прогоны, которые сейчас выполняются в этом процессе
+_active_runs: Set[str] = set()
+
+
+_RESULT_TYPES: Dict[str, Type[Union[EvalItemResult, RetrievalItemResult]]] = {
+    "end_to_end": EvalItemResult,
+    "retrieval": RetrievalItemResult,
+}
+
+
+def create_run(run_name: Optional[str] = None, mode: str = "end_to_end", top_k: int = 3) -> str:
     run_id = str(uuid.uuid4())
-    run_path = _run_path(run_id)
     payload = {
         "run_id": run_id,
         "run_name": run_name,
+        "mode": mode,
+        "top_k": top_k,
         "status": "running",
         "started_at": _now_iso(),
         "finished_at": None,
+        "progress": {"done": 0, "total": 0, "failed": 0, "eta_seconds": None},
         "metrics": {},
         "items": [],
         "error": None,
     }
-    with open(run_path, "w", encoding="utf-8") as handle:
-        json.dump(payload, handle, ensure_ascii=False, indent=2)
+    write_run(run_id, payload)
+    return run_id
+
+
+def resume_run(run_id: str) -> str:
+    """Помечает прерванный прогон как выполняемый; готовые вопросы не пересчитываются."""
+    run_data = read_run(run_id)
+    if run_data["status"] == "completed":
+        raise ValueError(f"Run already completed: {run_id}")
+    if run_id in _active_runs:
+        raise ValueError(f"Run is already in progress: {run_id}")
+    run_data.update({"status": "running", "finished_at": None, "error": None})
+    write_run(run_id, run_data)
     return run_id
 
 
@@ -90,54 +155,218 @@ def read_run(run_id: str) -> Dict:
 
 
 def write_run(run_id: str, payload: Dict) -> None:
+    # Пишем во временный файл и подменяем атомарно, чтобы /eval/status
+    # и падение процесса посреди записи не оставили битый JSON
     run_path = _run_path(run_id)
-    with open(run_path, "w", encoding="utf-8") as handle:
+    tmp_path = f"{run_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
         json.dump(payload, handle, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, run_path)
+
+
+def read_items(run_id: str, mode: str = "end_to_end") -> Dict[int, BaseModel]:
+    """Завершённые вопросы прогона по индексу в golden set."""
+    result_type = _RESULT_TYPES[mode]
+    items: Dict[int, BaseModel] = {}
+    items_path = _items_path(run_id)
+    if not os.path.exists(items_path):
+        return items
+    with open(items_path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Недописанная строка после падения процесса
+                continue
+            items[record["index"]] = result_type(**record["result"])
+    return items
 
 
-def run_evaluation(run_id: str) -> None:
+def _append_item(run_id: str, index: int, result: BaseModel) -> None:
+    record = {"index": index, "result": result.model_dump()}
+    with open(_items_path(run_id), "a", encoding="utf-8") as handle:
+        handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+def _answer_metrics(results: List[EvalItemResult]) -> Dict[str, float]:
+    return {
+        "count": len(results),
+        "exact_match_avg": sum(r.exact_match for r in results) / len(results)
+        if results
+        else 0.0,
+        "f1_avg": sum(r.f1 for r in results) / len(results) if results else 0.0,
+    }
+
+
+def _retrieval_metrics(results: List[RetrievalItemResult], top_k: int) -> Dict[str, float]:
+    count = len(results)
+    embed_ms = [r.embed_ms for r in results]
+    search_ms = [r.search_ms for r in results]
+    metrics = {
+        "count": count,
+        "top_k": top_k,
+        f"recall@{top_k}": sum(r.rank is not None for r in results) / count if count else 0.0,
+        "mrr": sum(r.reciprocal_rank for r in results) / count if count else 0.0,
+    }
+    for q in (50, 95, 99):
+        metrics[f"embed_ms_p{q}"] = _percentile(embed_ms, q)
+        metrics[f"search_ms_p{q}"] = _percentile(search_ms, q)
+    return metrics
+
+
+async def _evaluate_retrieval(item: GoldenItem, top_k: int) -> RetrievalItemResult:
+    # Мимо кэша эмбеддингов, иначе повторные прогоны меряют кэш, а не модель
+    started = time.perf_counter()
+    vector = await aembed_query(item.question, use_cache=False)
+    embedded = time.perf_counter()
+    results = await asearch_by_vector(vector, k=top_k)
+    searched = time.perf_counter()
+
+    rank = next(
+        (
+            position
+            for position, (doc, _score) in enumerate(results, start=1)
+            if _context_match(item.reference_context, doc.page_content)
+        ),
+        None,
+    )
+    return RetrievalItemResult(
+        question=item.question,
+        rank=rank,
+        reciprocal_rank=1 / rank if rank else 0.0,
+        embed_ms=(embedded - started) * 1000,
+        search_ms=(searched - embedded) * 1000,
+        retrieved_sources=[
+            (doc.metadata or {}).get("source_url", "") for doc, _score in results
+        ],
+    )
+
+
+async def _evaluate_answer(item: GoldenItem, top_k: int) -> EvalItemResult:
+    predicted, _context, _docs, _token_usage = await query_rag(
+        item.question, top_k=top_k, use_cache=False
+    )
+    return EvalItemResult(
+        question=item.question,
+        expected_answer=item.answer,
+        predicted_answer=predicted,
+        exact_match=_exact_match(predicted, item.answer),
+        f1=_f1_score(predicted, item.answer),
+    )
+
+
+async def run_evaluation(run_id: str) -> None:
+    """
+    Прогон golden set в EVAL_WORKERS параллельных воркеров.
+
+    В режиме end_to_end на каждый вопрос вызывается полный RAG и ответ
+    сравнивается с эталонным (exact match, F1). В режиме retrieval LLM
+    не вызывается: считаются recall@k и MRR по reference_context и
+    латентности эмбеддинга и поиска. Вопросы без reference_context
+    в retrieval режиме пропускаются.
+
+    Каждый завершённый вопрос сразу дописывается в <run_id>.items.jsonl,
+    а прогресс (done/total, ETA) - в <run_id>.json. Файлы пишутся в потоке
+    по одной записи за раз: fsync не блокирует цикл событий, на котором
+    в это же время обслуживается /rag. При повторном запуске
+    того же прогона уже посчитанные вопросы пропускаются. Упавшие вопросы
+    не записываются: прогон завершается со статусом failed и их можно
+    досчитать через resume.
+    """
+    _active_runs.add(run_id)
     try:
         run_data = read_run(run_id)
         golden_set = load_golden_set()
+        golden_hash = _golden_hash(golden_set)
+        if run_data.get("golden_hash", golden_hash) != golden_hash:
+            raise ValueError("Golden set changed since the run started, start a new run")
+        run_data["golden_hash"] = golden_hash
+        mode = run_data.get("mode", "end_to_end")
+        top_k = run_data.get("top_k", 3)
+        evaluate = _evaluate_retrieval if mode == "retrieval" else _evaluate_answer
 
-        results: List[EvalItemResult] = []
-        exact_matches = []
-        f1_scores = []
-
-        for item in golden_set:
-            predicted, _context, _docs = query_rag(item.question)
-            exact = _exact_match(predicted, item.answer)
-            f1 = _f1_score(predicted, item.answer)
-            exact_matches.append(exact)
-            f1_scores.append(f1)
-            results.append(
-                EvalItemResult(
-                    question=item.question,
-                    expected_answer=item.answer,
-                    predicted_answer=predicted,
-                    exact_match=exact,
-                    f1=f1,
-                )
-            )
-
-        metrics = {
-            "count": len(results),
-            "exact_match_avg": sum(exact_matches) / len(exact_matches)
-            if exact_matches
-            else 0.0,
-            "f1_avg": sum(f1_scores) / len(f1_scores) if f1_scores else 0.0,
-        }
+        indices = [
+            index
+            for index, item in enumerate(golden_set)
+            if mode != "retrieval" or item.reference_context
+        ]
+        completed = await asyncio.to_thread(read_items, run_id, mode)
+        todo = [index for index in indices if index not in completed]
+        total = len(indices)
+        failures: List[str] = []
+        started = time.monotonic()
+        done_now = 0
+        write_lock = asyncio.Lock()
 
+        async def _write_progress() -> None:
+            remaining = total - len(completed) - len(failures)
+            eta = None
+            if done_now:
+                eta = (time.monotonic() - started) / done_now * remaining
+            run_data["progress"] = {
+                "done": len(completed),
+                "total": total,
+                "failed": len(failures),
+                "eta_seconds": eta,
+            }
+            snapshot = dict(run_data)
+            async with write_lock:
+                await asyncio.to_thread(write_run, run_id, snapshot)
+
+        await _write_progress()
+        logger.info(
+            "Evaluation %s: %d of %d items left", run_id, len(todo), total
+        )
+
+        queue: "asyncio.Queue[int]" = asyncio.Queue()
+        for index in todo:
+            queue.put_nowait(index)
+
+        async def _worker() -> None:
+            nonlocal done_now
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    result = await evaluate(golden_set[index], top_k)
+                except Exception as exc:
+                    logger.warning("Evaluation item %d failed: %s", index, exc)
+                    failures.append(f"{index}: {exc}")
+                else:
+                    async with write_lock:
+                        await asyncio.to_thread(_append_item, run_id, index, result)
+                    completed[index] = result
+                    done_now += 1
+                await _write_progress()
+
+        workers = max(1, min(get_settings().eval_workers, len(todo)))
+        await asyncio.gather(*(_worker() for _ in range(workers)))
+
+        results = [completed[index] for index in sorted(completed)]
         run_data.update(
             {
-                "status": "completed",
+                "status": "failed" if failures else "completed",
                 "embedding_model": _get_embedding_model_name(),
                 "finished_at": _now_iso(),
-                "metrics": metrics,
+                "metrics": (
+                    _retrieval_metrics(results, top_k)
+                    if mode == "retrieval"
+                    else _answer_metrics(results)
+                ),
                 "items": [result.model_dump() for result in results],
+                "error": (
+                    f"{len(failures)} of {total} items failed, resume the run to retry: "
+                    f"{'; '.join(failures[:5])}"
+                    if failures
+                    else None
+                ),
             }
         )
-        write_run(run_id, run_data)
+        await _write_progress()
     except Exception as exc:
         logger.exception("Evaluation failed: %s", exc)
         run_data = read_run(run_id)
@@ -150,3 +379,5 @@ def run_evaluation(run_id: str) -> None:
             }
         )
         write_run(run_id, run_data)
+    finally:
+        _active_runs.discard(run_id)
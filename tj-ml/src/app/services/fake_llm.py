@@ -0,0 +1,216 @@
+"""Офлайн заглушка LLM для нагрузочных тестов и бенчмарков без сети и ключей."""
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from app.utils.token_utils import count_tokens
+
+
+NOT_FOUND_ANSWER = "К сожалению, я не нашёл информации по вашему вопросу в базе статей Т⁠-⁠Ж."
+
+_FRAGMENT_RE = re.compile(
+    r"Фрагмент \d+:\n(?P<content>.*?)\nИсточник: (?P<title>[^\n]*)\nURL: (?P<url>\S+)",
+    re.DOTALL,
+)
+_SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]?")
+_TOKEN_RE = re.compile(r"\s*\S+")
+
+
+class FakeLLMError(RuntimeError):
+    """Имитация ошибки провайдера (FAKE_LLM_ERROR_RATE)."""
+
+
+@dataclass
+class _Plan:
+    text: str
+    ttft: float
+    token_interval: float
+    fail: bool
+    prompt_tokens: int
+    completion_tokens: int
+
+    def usage(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+
+    def usage_metadata(self) -> Dict[str, int]:
+        return {
+            "input_tokens": self.prompt_tokens,
+            "output_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+
+
+def fake_answer(prompt: str, max_sentences: int = 3) -> str:
+    """
+    Детерминированный ответ по контексту промпта.
+
+    Первые предложения найденных фрагментов и раздел "Источники:",
+    как в ответе настоящей модели. Без фрагментов - стандартный отказ.
+    """
+    fragments = list(_FRAGMENT_RE.finditer(prompt))
+    if not fragments:
+        return NOT_FOUND_ANSWER
+
+    sentences: List[str] = []
+    for fragment in fragments:
+        for sentence in _SENTENCE_RE.findall(fragment.group("content")):
+            sentence = sentence.strip()
+            if len(sentence) > 20:
+                sentences.append(sentence)
+                break
+        if len(sentences) >= max_sentences:
+            break
+
+    sources = "\n".join(
+        f"- [{fragment.group('title')}]({fragment.group('url')})" for fragment in fragments
+    )
+    return " ".join(sentences) + "\n\nИсточники:\n" + sources
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Заглушка чат-модели с настраиваемым профилем задержек.
+
+    Время до первого токена берётся из логнормального распределения
+    с медианой ttft_ms, дальше токены идут со скоростью tokens_per_second.
+    С вероятностью error_rate запрос падает после ttft. Текст ответа
+    зависит только от промпта, а задержки и ошибки - от seed и порядка
+    вызовов, поэтому прогоны бенчмарков воспроизводимы.
+    """
+
+    model_name: str = "fake-rag"
+    ttft_ms: float = 300.0
+    ttft_sigma: float = 0.3
+    tokens_per_second: float = 50.0
+    error_rate: float = 0.0
+    seed: int = 0
+
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "ttft_ms": self.ttft_ms,
+            "tokens_per_second": self.tokens_per_second,
+            "error_rate": self.error_rate,
+        }
+
+    def _plan(self, messages: List[BaseMessage]) -> _Plan:
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = fake_answer(prompt)
+        with self._rng_lock:
+            ttft = self.ttft_ms / 1000 * math.exp(self._rng.gauss(0.0, self.ttft_sigma))
+            fail = self._rng.random() < self.error_rate
+        return _Plan(
+            text=text,
+            ttft=ttft,
+            token_interval=1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0,
+            fail=fail,
+            prompt_tokens=count_tokens(prompt),
+            completion_tokens=count_tokens(text),
+        )
+
+    def _result(self, plan: _Plan) -> ChatResult:
+        message = AIMessage(content=plan.text, usage_metadata=plan.usage_metadata())
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": plan.usage(), "model_name": self.model_name},
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        plan = self._plan(messages)
+        time.sleep(plan.ttft)
+        if plan.fail:
+            raise FakeLLMError("Fake LLM provider error")
+        time.sleep(len(_TOKEN_RE.findall(plan.text)) * plan.token_interval)
+        return self._result(plan)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        plan = self._plan(messages)
+        await asyncio.sleep(plan.ttft)
+        if plan.fail:
+            raise FakeLLMError("Fake LLM provider error")
+        await asyncio.sleep(len(_TOKEN_RE.findall(plan.text)) * plan.token_interval)
+        return self._result(plan)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        plan = self._plan(messages)
+        time.sleep(plan.ttft)
+        if plan.fail:
+            raise FakeLLMError("Fake LLM provider error")
+        for i, token in enumerate(_TOKEN_RE.findall(plan.text)):
+            if i:
+                time.sleep(plan.token_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        # Как провайдеры со stream_usage: статистика токенов последним чанком
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=plan.usage_metadata())
+        )
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        plan = self._plan(messages)
+        await asyncio.sleep(plan.ttft)
+        if plan.fail:
+            raise FakeLLMError("Fake LLM provider error")
+        for i, token in enumerate(_TOKEN_RE.findall(plan.text)):
+            if i:
+                await asyncio.sleep(plan.token_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=plan.usage_metadata())
+        )
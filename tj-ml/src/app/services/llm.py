@@ -1,16 +1,20 @@
 from functools import lru_cache
-from typing import Union
+from typing import Optional
 from langchain_core.language_models import BaseChatModel
 from langchain_gigachat.chat_models import GigaChat
 from langchain_openai import ChatOpenAI
 from app.core.config import get_settings
+from app.services.fake_llm import FakeChatModel
+
+
+SUPPORTED_PROVIDERS = ("gigachat", "openrouter", "fake")
 
 
 @lru_cache(maxsize=1)
 def get_llm() -> BaseChatModel:
     """
     Фабрика для создания инстанса ЛЛМ
-    Сейчас поддержвает GigaChat and OpenRouter providers.
+    Сейчас поддерживает GigaChat, OpenRouter и офлайн заглушку fake.
     
     Returns:
         BaseChatModel: Initialized LLM instance
@@ -19,36 +23,77 @@ def get_llm() -> BaseChatModel:
         ValueError: If unsupported LLM provider is specified
     """
     settings = get_settings()
-    provider = settings.llm_provider.lower()
-    
+    return create_llm(settings.llm_provider)
+
+
+def create_llm(provider: str, model: Optional[str] = None) -> BaseChatModel:
+    """
+    Создаёт LLM указанного провайдера.
+
+    Args:
+        provider: gigachat, openrouter или fake
+        model: Модель провайдера; по умолчанию берётся из настроек
+
+    Raises:
+        ValueError: If unsupported LLM provider is specified
+    """
+    provider = provider.lower()
+
     if provider == "gigachat":
-        return _get_gigachat_llm()
+        return _get_gigachat_llm(model)
     elif provider == "openrouter":
-        return _get_openrouter_llm()
+        return _get_openrouter_llm(model)
+    elif provider == "fake":
+        return _get_fake_llm(model)
     else:
         raise ValueError(
             f"Unsupported LLM provider: {provider}. "
-            f"Supported providers: gigachat, openrouter"
+            f"Supported providers: {', '.join(SUPPORTED_PROVIDERS)}"
         )
 
 
-def _get_gigachat_llm() -> GigaChat:
+def default_model(provider: str) -> str:
+    """Модель провайдера по умолчанию."""
+    settings = get_settings()
+    if provider.lower() == "openrouter":
+        return settings.openrouter_model
+    if provider.lower() == "fake":
+        return "fake-rag"
+    return "GigaChat"
+
+
+def _get_gigachat_llm(model: Optional[str] = None) -> GigaChat:
     """Initialize GigaChat LLM."""
     settings = get_settings()
     return GigaChat(
         credentials=settings.gigachat_auth_key,
-        model="GigaChat",
+        model=model or default_model("gigachat"),
         verify_ssl_certs=False,
     )
 
 
-def _get_openrouter_llm() -> ChatOpenAI:
+def _get_openrouter_llm(model: Optional[str] = None) -> ChatOpenAI:
     """Initialize OpenRouter LLM (OpenAI-compatible API)."""
     settings = get_settings()
     return ChatOpenAI(
-        model=settings.openrouter_model,
+        model=model or default_model("openrouter"),
         openai_api_key=settings.openrouter_api_key,
         openai_api_base="https://openrouter.ai/api/v1",
         temperature=0.7,
         max_tokens=2000,
+        # Нужно, чтобы при стриминге приходила статистика токенов
+        stream_usage=True,
+    )
+
+
+def _get_fake_llm(model: Optional[str] = None) -> FakeChatModel:
+    """Initialize offline fake LLM with the configured latency profile."""
+    settings = get_settings()
+    return FakeChatModel(
+        model_name=model or default_model("fake"),
+        ttft_ms=settings.fake_llm_ttft_ms,
+        ttft_sigma=settings.fake_llm_ttft_sigma,
+        tokens_per_second=settings.fake_llm_tokens_per_second,
+        error_rate=settings.fake_llm_error_rate,
+        seed=settings.fake_llm_seed,
     )
@@ -0,0 +1,458 @@
+"""Маршрутизация запросов между несколькими LLM провайдерами."""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompt_values import PromptValue
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.core.metrics import LLM_REQUESTS, LLM_TOTAL_SECONDS, LLM_TTFT_SECONDS
+from app.core.tracing import record_stage
+from app.services.admission import AdmissionController, AdmissionRejected, get_request_deadline
+from app.services.llm import create_llm, default_model
+
+
+logger = get_logger(__name__)
+
+
+class LLMUnavailableError(RuntimeError):
+    """Ни один провайдер не смог ответить."""
+
+
+@dataclass
+class ProviderHealth:
+    """
+    Скользящая статистика провайдера и circuit breaker.
+
+    Circuit открывается, когда доля ошибок в окне превышает порог,
+    и через open_seconds пропускает один пробный запрос (half-open).
+    """
+    window: int
+    failure_threshold: float
+    min_requests: int
+    open_seconds: float
+    results: Deque[bool] = field(default_factory=deque)
+    first_token_latencies: Deque[float] = field(default_factory=deque)
+    total_latencies: Deque[float] = field(default_factory=deque)
+    opened_at: Optional[float] = None
+    probing: bool = False
+    requests: int = 0
+    failures: int = 0
+
+    def _push(self, values: Deque, value: Any) -> None:
+        values.append(value)
+        while len(values) > self.window:
+            values.popleft()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.open_seconds:
+            return "half_open"
+        return "open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+    def on_attempt(self) -> None:
+        self.requests += 1
+        if self.state == "half_open":
+            self.probing = True
+
+    def record_first_token(self, latency: float) -> None:
+        self._push(self.first_token_latencies, latency)
+
+    def record_success(self, total_latency: float) -> None:
+        self._push(self.results, True)
+        self._push(self.total_latencies, total_latency)
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._push(self.results, False)
+        enough_requests = len(self.results) >= self.min_requests
+        if self.probing or (enough_requests and self.error_rate() >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def error_rate(self) -> float:
+        if not self.results:
+            return 0.0
+        return self.results.count(False) / len(self.results)
+
+    def first_token_percentile(self, q: float) -> Optional[float]:
+        if not self.first_token_latencies:
+            return None
+        ordered = sorted(self.first_token_latencies)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def stats(self) -> Dict[str, Any]:
+        p50 = self.first_token_percentile(50)
+        p95 = self.first_token_percentile(95)
+        return {
+            "state": self.state,
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": self.error_rate(),
+            "ttft_p50_ms": p50 * 1000 if p50 is not None else None,
+            "ttft_p95_ms": p95 * 1000 if p95 is not None else None,
+        }
+
+
+@dataclass
+class LLMTarget:
+    provider: str
+    model: str
+    llm: BaseChatModel
+    health: ProviderHealth
+    admission: AdmissionController
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+    def record_outcome(self, outcome: str) -> None:
+        LLM_REQUESTS.labels(provider=self.provider, model=self.model, outcome=outcome).inc()
+
+
+@dataclass
+class _Attempt:
+    target: LLMTarget
+    started: float
+    stream: Any = None
+    admitted_at: Optional[float] = None
+    task: Optional["asyncio.Task"] = None
+
+    @property
+    def clock_start(self) -> float:
+        """Отсчёт TTFT и таймаутов - с момента получения слота, а не постановки в очередь."""
+        return self.admitted_at if self.admitted_at is not None else self.started
+
+    def release(self) -> None:
+        if self.admitted_at is not None:
+            self.target.admission.release(time.monotonic() - self.admitted_at)
+            self.admitted_at = None
+
+
+class LLMRouter:
+    """
+    Роутер запросов по приоритетному списку провайдеров.
+
+    - Провайдеры с открытым circuit пропускаются.
+    - Если провайдер упал или не выдал первый токен за first_token_timeout,
+      запрос уходит следующему по приоритету (failover).
+    - С hedging, если первый токен не пришёл за наблюдаемый p95 TTFT
+      (но не раньше hedge_min_delay), параллельно запускается следующий
+      провайдер; выигрывает тот, кто первым выдал токен, второй отменяется.
+
+    Переключение возможно только до первого токена: после него ошибка
+    отдаётся вызывающему коду.
+    """
+
+    def __init__(
+        self,
+        targets: List[LLMTarget],
+        hedge_enabled: bool,
+        hedge_min_delay: float,
+        first_token_timeout: float,
+    ):
+        if not targets:
+            raise ValueError("LLMRouter requires at least one provider")
+        self.targets = targets
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.first_token_timeout = first_token_timeout
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    @property
+    def signature(self) -> str:
+        return ",".join(target.name for target in self.targets)
+
+    def _candidates(self) -> List[LLMTarget]:
+        available = [target for target in self.targets if target.health.available()]
+        # Если все circuit открыты, пробуем всё равно - лучше ошибка провайдера, чем отказ
+        return available or list(self.targets)
+
+    def _hedge_delay(self, target: LLMTarget) -> float:
+        p95 = target.health.first_token_percentile(95)
+        return max(self.hedge_min_delay, p95 or 0.0)
+
+    def _start(self, target: LLMTarget, prompt: PromptValue, config: Dict[str, Any]) -> _Attempt:
+        attempt = _Attempt(target=target, started=time.monotonic())
+        attempt.task = asyncio.ensure_future(self._open(attempt, prompt, config))
+        return attempt
+
+    @staticmethod
+    async def _open(attempt: _Attempt, prompt: PromptValue, config: Dict[str, Any]) -> Any:
+        """Ждёт слот провайдера и первый чанк ответа с текстом."""
+        await attempt.target.admission.acquire(get_request_deadline())
+        attempt.admitted_at = time.monotonic()
+        attempt.target.health.on_attempt()
+        attempt.stream = attempt.target.llm.astream(prompt, config=config).__aiter__()
+        chunk = await attempt.stream.__anext__()
+        # OpenAI-совместимые API сначала шлют пустой чанк с ролью - это ещё не первый токен
+        while not chunk.content and not getattr(chunk, "usage_metadata", None):
+            chunk = await attempt.stream.__anext__()
+        return chunk
+
+    @staticmethod
+    async def _close(attempt: _Attempt) -> None:
+        if attempt.task is not None and not attempt.task.done():
+            attempt.task.cancel()
+            try:
+                await attempt.task
+            except BaseException:
+                pass
+        if attempt.stream is not None:
+            try:
+                await attempt.stream.aclose()
+            except BaseException:
+                pass
+        attempt.release()
+
+    def _expired(self, attempt: _Attempt, now: float) -> bool:
+        if attempt.admitted_at is None:
+            return False
+        return now >= attempt.admitted_at + self.first_token_timeout
+
+    async def _first_chunk(
+        self, prompt: PromptValue, config: Dict[str, Any]
+    ) -> Tuple[_Attempt, Any]:
+        """Гонка за первым токеном с failover и hedging."""
+        queue = self._candidates()
+        pending: List[_Attempt] = [self._start(queue.pop(0), prompt, config)]
+        try:
+            return await self._race(queue, pending, prompt, config)
+        except BaseException:
+            # Вызывающего отменили (отключение SSE клиента, X-Request-Timeout,
+            # wait_for) - незавершённые попытки держат слоты admission
+            for attempt in pending:
+                await self._close(attempt)
+            raise
+
+    async def _race(
+        self,
+        queue: List[LLMTarget],
+        pending: List[_Attempt],
+        prompt: PromptValue,
+        config: Dict[str, Any],
+    ) -> Tuple[_Attempt, Any]:
+        errors: List[str] = []
+        rejections: List[AdmissionRejected] = []
+        hedged = False
+
+        while pending:
+            now = time.monotonic()
+            timeouts = [
+                attempt.admitted_at + self.first_token_timeout - now
+                for attempt in pending
+                if attempt.admitted_at is not None
+            ]
+            can_hedge = self.hedge_enabled and not hedged and queue
+            if can_hedge and pending[0].admitted_at is not None:
+                hedge_at = pending[0].admitted_at + self._hedge_delay(pending[0].target)
+                timeouts.append(hedge_at - now)
+            # Пока попытки стоят в очереди admission, просыпаемся периодически
+            timeout = max(0.0, min(timeouts)) if timeouts else self.hedge_min_delay
+
+            done, _ = await asyncio.wait(
+                [attempt.task for attempt in pending],
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            if not done:
+                now = time.monotonic()
+                expired = [attempt for attempt in pending if self._expired(attempt, now)]
+                for attempt in expired:
+                    pending.remove(attempt)
+                    await self._close(attempt)
+                    attempt.target.health.record_failure()
+                    attempt.target.record_outcome("timeout")
+                    errors.append(
+                        f"{attempt.target.name}: no first token in {self.first_token_timeout}s"
+                    )
+                hedge_due = False
+                if can_hedge and pending and pending[0].admitted_at is not None:
+                    hedge_at = pending[0].admitted_at + self._hedge_delay(pending[0].target)
+                    hedge_due = now >= hedge_at
+                if hedge_due:
+                    hedged = True
+                    self.hedges += 1
+                    logger.info("Hedging LLM request to %s", queue[0].name)
+                    pending.append(self._start(queue.pop(0), prompt, config))
+                elif expired and not pending and queue:
+                    self.failovers += 1
+                    pending.append(self._start(queue.pop(0), prompt, config))
+                continue
+
+            for attempt in [a for a in pending if a.task in done]:
+                pending.remove(attempt)
+                try:
+                    chunk = attempt.task.result()
+                except StopAsyncIteration:
+                    chunk = None
+                except AdmissionRejected as exc:
+                    # Перегрузка - не ошибка провайдера, health не трогаем
+                    rejections.append(exc)
+                    attempt.target.record_outcome("rejected")
+                    if not pending and queue:
+                        pending.append(self._start(queue.pop(0), prompt, config))
+                    continue
+                except Exception as exc:
+                    await self._close(attempt)
+                    attempt.target.health.record_failure()
+                    attempt.target.record_outcome("error")
+                    errors.append(f"{attempt.target.name}: {exc}")
+                    logger.warning("LLM provider %s failed: %s", attempt.target.name, exc)
+                    if not pending and queue:
+                        self.failovers += 1
+                        pending.append(self._start(queue.pop(0), prompt, config))
+                    continue
+
+                ttft = time.monotonic() - attempt.clock_start
+                attempt.target.health.record_first_token(ttft)
+                LLM_TTFT_SECONDS.labels(
+                    provider=attempt.target.provider, model=attempt.target.model
+                ).observe(ttft)
+                record_stage("llm_ttft", ttft)
+                try:
+                    while pending:
+                        loser = pending[0]
+                        await self._close(loser)
+                        pending.remove(loser)
+                        loser.target.record_outcome("cancelled")
+                except BaseException:
+                    await self._close(attempt)
+                    raise
+                if hedged and attempt.target is not self.targets[0]:
+                    self.hedge_wins += 1
+                return attempt, chunk
+
+        if rejections and not errors:
+            raise min(rejections, key=lambda exc: exc.retry_after)
+        raise LLMUnavailableError("All LLM providers failed: " + "; ".join(errors))
+
+    async def astream(
+        self,
+        prompt: PromptValue,
+        callbacks: Optional[List[BaseCallbackHandler]] = None,
+    ) -> AsyncIterator[str]:
+        """Стрим текста ответа от первого успевшего провайдера."""
+        config = {"callbacks": callbacks or []}
+        attempt, chunk = await self._first_chunk(prompt, config)
+        clock_start = attempt.clock_start
+        try:
+            while chunk is not None:
+                if chunk.content:
+                    yield chunk.content
+                try:
+                    chunk = await attempt.stream.__anext__()
+                except StopAsyncIteration:
+                    chunk = None
+        except (asyncio.CancelledError, GeneratorExit):
+            # Клиент ушёл или перестал читать стрим - провайдер не виноват
+            attempt.target.record_outcome("cancelled")
+            raise
+        except Exception:
+            attempt.target.health.record_failure()
+            attempt.target.record_outcome("error")
+            raise
+        finally:
+            await self._close(attempt)
+        total = time.monotonic() - clock_start
+        attempt.target.health.record_success(total)
+        attempt.target.record_outcome("success")
+        LLM_TOTAL_SECONDS.labels(
+            provider=attempt.target.provider, model=attempt.target.model
+        ).observe(total)
+        record_stage("llm_total", total)
+
+    async def ainvoke(
+        self,
+        prompt: PromptValue,
+        callbacks: Optional[List[BaseCallbackHandler]] = None,
+    ) -> str:
+        stream = self.astream(prompt, callbacks)
+        try:
+            parts = [part async for part in stream]
+        finally:
+            # При отмене генератор закрывается сразу, а не сборщиком мусора
+            await stream.aclose()
+        return "".join(parts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedge_enabled": self.hedge_enabled,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "providers": {target.name: target.health.stats() for target in self.targets},
+            "admission": {
+                target.provider: target.admission.stats() for target in self.targets
+            },
+        }
+
+
+def parse_provider_list(raw: List[str], fallback_provider: str) -> List[Tuple[str, str]]:
+    """
+    Разбирает LLM_PROVIDERS: "openrouter=google/gemma-3-27b-it:free,gigachat".
+
+    Модель после "=" необязательна. Пустой список - один LLM_PROVIDER.
+    """
+    entries = raw or [fallback_provider]
+    result = []
+    for entry in entries:
+        provider, _, model = entry.partition("=")
+        provider = provider.strip().lower()
+        result.append((provider, model.strip() or default_model(provider)))
+    return result
+
+
+@lru_cache(maxsize=1)
+def get_llm_router() -> LLMRouter:
+    settings = get_settings()
+    # Один контроллер на провайдера: модели одного провайдера делят ключ и его лимиты
+    admission: Dict[str, AdmissionController] = {}
+    for provider, _model in parse_provider_list(settings.llm_providers, settings.llm_provider):
+        if provider not in admission:
+            admission[provider] = AdmissionController(
+                name=provider,
+                max_concurrency=settings.llm_concurrency_limits.get(
+                    provider, settings.llm_max_concurrency
+                ),
+                max_queue=settings.llm_max_queue,
+            )
+
+    targets = [
+        LLMTarget(
+            provider=provider,
+            model=model,
+            llm=create_llm(provider, model),
+            health=ProviderHealth(
+                window=settings.llm_stats_window,
+                failure_threshold=settings.llm_circuit_failure_rate,
+                min_requests=settings.llm_circuit_min_requests,
+                open_seconds=settings.llm_circuit_open_seconds,
+            ),
+            admission=admission[provider],
+        )
+        for provider, model in parse_provider_list(settings.llm_providers, settings.llm_provider)
+    ]
+    return LLMRouter(
+        targets=targets,
+        hedge_enabled=settings.llm_hedge_enabled,
+        hedge_min_delay=settings.llm_hedge_min_delay_ms / 1000,
+        first_token_timeout=settings.llm_first_token_timeout,
+    )
@@ -0,0 +1,136 @@
+"""Встроенный векторный индекс: numpy поверх memory-mapped файла векторов."""
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+VECTORS_FILE = "vectors.npy"
+PAYLOADS_FILE = "payloads.jsonl"
+META_FILE = "meta.json"
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def write_local_index(
+    path: str,
+    documents: Sequence[Document],
+    vectors: Sequence[Sequence[float]],
+    model_name: str,
+    dim: int = 0,
+    corpus_hash: str = "",
+) -> Dict[str, Any]:
+    """
+    Записывает индекс в каталог path.
+
+    Векторы нормализуются и сохраняются в float32, чтобы поиск был
+    одним матричным умножением (косинусная близость, как в Qdrant).
+    Каталог собирается рядом и подменяется целиком, так что читатель
+    не увидит наполовину записанный индекс. dim нужен только для
+    пустого корпуса: тогда пишется матрица (0, dim). corpus_hash
+    сохраняется в meta.json, чтобы индексатор видел смену корпуса.
+    """
+    if len(vectors):
+        matrix = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+    else:
+        matrix = np.zeros((0, dim), dtype=np.float32)
+    if len(documents) != matrix.shape[0]:
+        raise ValueError(f"Got {len(documents)} documents and {matrix.shape[0]} vectors")
+
+    tmp_path = f"{path.rstrip(os.sep)}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, VECTORS_FILE), matrix)
+    with open(os.path.join(tmp_path, PAYLOADS_FILE), "w", encoding="utf-8") as handle:
+        for doc in documents:
+            record = {"page_content": doc.page_content, "metadata": doc.metadata}
+            handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+    meta = {
+        "model": model_name,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "corpus_hash": corpus_hash,
+        "built_at": time.time(),
+    }
+    with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as handle:
+        json.dump(meta, handle)
+
+    old_path = f"{path.rstrip(os.sep)}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return meta
+
+
+def read_local_meta(path: str) -> Dict[str, Any]:
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+class LocalVectorIndex:
+    """
+    Точный поиск ближайших соседей в памяти процесса.
+
+    Векторы открываются через np.load(mmap_mode="r"): страницы файла
+    делятся между воркерами через page cache, а не копируются в каждый.
+    Для десятков тысяч фрагментов полный перебор занимает миллисекунды
+    и избавляет от сетевого запроса в Qdrant.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta = read_local_meta(path)
+        if not self.meta:
+            raise FileNotFoundError(f"Local index not found: {path}")
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(path, PAYLOADS_FILE), "r", encoding="utf-8") as handle:
+            self.payloads: List[Dict[str, Any]] = [json.loads(line) for line in handle]
+        if len(self.payloads) != self.vectors.shape[0]:
+            raise ValueError(
+                f"Local index is corrupted: {len(self.payloads)} payloads "
+                f"for {self.vectors.shape[0]} vectors"
+            )
+
+    @property
+    def points_count(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def _document(self, position: int) -> Document:
+        payload = self.payloads[position]
+        return Document(
+            page_content=payload.get("page_content", ""),
+            metadata=payload.get("metadata") or {},
+        )
+
+    def search_batch(
+        self, queries: Sequence[Sequence[float]], k: int = 3
+    ) -> List[List[Tuple[Document, float]]]:
+        if not self.points_count:
+            return [[] for _ in queries]
+        matrix = _normalize_rows(np.asarray(queries, dtype=np.float32))
+        scores = matrix @ self.vectors.T
+        k = min(k, self.points_count)
+
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([(self._document(int(i)), float(row[i])) for i in top])
+        return results
+
+    def search(self, query: Sequence[float], k: int = 3) -> List[Tuple[Document, float]]:
+        return self.search_batch([query], k)[0]
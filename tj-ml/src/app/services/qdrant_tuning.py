@@ -0,0 +1,133 @@
+"""Настройки коллекции Qdrant: HNSW, квантизация, хранение на диске."""
+import dataclasses
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from qdrant_client.http import models
+
+from app.core.config import QDRANT_QUANTIZATION_MODES, Settings, get_settings
+
+
+@dataclass(frozen=True)
+class QdrantTuning:
+    """
+    Параметры коллекции (применяются в index.py) и поиска (в ML сервисе).
+
+    hnsw_ef - ef на запросе: больше - точнее и медленнее. С квантизацией
+    поиск идёт по сжатым векторам, а rescore пересчитывает oversampling * k
+    кандидатов по исходным векторам.
+    """
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    hnsw_ef: int = 128
+    quantization: str = "none"
+    quantization_always_ram: bool = True
+    rescore: bool = True
+    oversampling: float = 1.0
+    on_disk_vectors: bool = False
+    on_disk_hnsw: bool = False
+    on_disk_payload: bool = False
+
+    def __post_init__(self):
+        if self.quantization not in QDRANT_QUANTIZATION_MODES:
+            raise ValueError(
+                f"Unsupported quantization: {self.quantization}. "
+                f"Supported: {', '.join(QDRANT_QUANTIZATION_MODES)}"
+            )
+
+    def quantization_config(self) -> Optional[models.QuantizationConfig]:
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=self.quantization_always_ram,
+                )
+            )
+        if self.quantization == "binary":
+            return models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=self.quantization_always_ram)
+            )
+        return None
+
+    def collection_kwargs(self, vector_size: int) -> Dict[str, Any]:
+        """Аргументы QdrantClient.create_collection."""
+        return {
+            "vectors_config": models.VectorParams(
+                size=vector_size,
+                distance=models.Distance.COSINE,
+                on_disk=self.on_disk_vectors,
+            ),
+            "hnsw_config": models.HnswConfigDiff(
+                m=self.hnsw_m,
+                ef_construct=self.hnsw_ef_construct,
+                on_disk=self.on_disk_hnsw,
+            ),
+            "quantization_config": self.quantization_config(),
+            "on_disk_payload": self.on_disk_payload,
+        }
+
+    def search_params(self) -> models.SearchParams:
+        quantization = None
+        if self.quantization != "none":
+            quantization = models.QuantizationSearchParams(
+                rescore=self.rescore,
+                oversampling=self.oversampling,
+            )
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    def estimated_ram_bytes(self, points: int, vector_size: int) -> int:
+        """
+        Грубая оценка RAM коллекции: векторы, сжатые векторы и граф HNSW.
+
+        Payload и служебные структуры не учитываются.
+        """
+        total = 0
+        if not self.on_disk_vectors:
+            total += points * vector_size * 4
+        if self.quantization != "none" and self.quantization_always_ram:
+            per_vector = vector_size if self.quantization == "scalar" else vector_size // 8
+            total += points * per_vector
+        if not self.on_disk_hnsw:
+            # До 2*m связей на нулевом слое по 4 байта
+            total += points * self.hnsw_m * 2 * 4
+        return total
+
+
+QDRANT_PRESETS: Dict[str, QdrantTuning] = {
+    # fp32 векторы и граф в RAM - как коллекция по умолчанию
+    "default": QdrantTuning(),
+    # Точнее за счёт более плотного графа и большего ef
+    "accuracy": QdrantTuning(hnsw_m=32, hnsw_ef_construct=256, hnsw_ef=256),
+    # int8 в RAM, исходные векторы на диске для rescore: ~4x меньше памяти
+    "memory": QdrantTuning(
+        quantization="scalar",
+        oversampling=1.5,
+        on_disk_vectors=True,
+        on_disk_payload=True,
+    ),
+    # 1 бит на измерение в RAM, всё остальное на диске: ~30x меньше памяти
+    "disk": QdrantTuning(
+        quantization="binary",
+        oversampling=3.0,
+        on_disk_vectors=True,
+        on_disk_hnsw=True,
+        on_disk_payload=True,
+    ),
+}
+
+
+def tuning_from_settings(settings: Settings) -> QdrantTuning:
+    """Пресет QDRANT_PRESET с поправками из заданных QDRANT_* настроек."""
+    overrides = {}
+    for field in dataclasses.fields(QdrantTuning):
+        value = getattr(settings, f"qdrant_{field.name}")
+        if value is not None:
+            overrides[field.name] = value
+    return dataclasses.replace(QDRANT_PRESETS[settings.qdrant_preset], **overrides)
+
+
+@lru_cache(maxsize=1)
+def get_qdrant_tuning() -> QdrantTuning:
+    return tuning_from_settings(get_settings())
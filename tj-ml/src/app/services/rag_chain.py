@@ -1,11 +1,25 @@
-from typing import Dict, List, Tuple
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
-from app.services.vector_store import get_vector_store
-from app.services.llm import get_llm
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.core.metrics import RAG_REQUESTS, track_stage
+from app.services.context_packer import PackedContext, pack_context
+from app.services.embeddings import aembed_queries, aembed_query
+from app.services.semantic_cache import CachedAnswer, get_semantic_cache
+from app.services.vector_store import (
+    aget_index_version,
+    asearch_batch_by_vectors,
+    asearch_by_vector,
+)
+from app.services.llm_router import get_llm_router
 from app.services.token_tracker import TokenUsageCallback
-from app.utils.token_utils import estimate_tokens
+from app.utils.token_utils import count_tokens
+
+
+logger = get_logger(__name__)
 
 
 PROMPT_TEMPLATE = """Ты - ассистент по статьям Т⁠-⁠Ж (Тинькофф Журнал). Отвечай только на основе предоставленного контекста.
@@ -25,32 +39,120 @@ PROMPT_TEMPLATE = """Ты - ассистент по статьям Т⁠-⁠Ж (
 Ответ (не забудь про раздел "Источники:" в конце):"""
 
 
-def _format_docs(docs: List[Document]) -> str:
-    """Format documents with content and metadata including source URLs."""
-    formatted = []
-    for i, doc in enumerate(docs, 1):
-        content = doc.page_content
-        metadata = doc.metadata
-        
-        # Extract source URL and title from metadata
-        source_url = metadata.get('source_url', 'N/A')
-        article_title = metadata.get('article_title', 'Неизвестная статья')
-        
-        formatted.append(
-            f"Фрагмент {i}:\n{content}\n"
-            f"Источник: {article_title}\nURL: {source_url}"
+def _append_sources(answer: str, docs: List[Document]) -> str:
+    """Возвращает блок "Источники", если модель не добавила его сама."""
+    if "источник" in answer.lower() or "source" in answer.lower():
+        return ""
+
+    sources_text = "\n\n**Источники:**\n"
+    unique_sources = {}
+    for doc in docs:
+        url = doc.metadata.get('source_url', '')
+        title = doc.metadata.get('article_title', 'Статья Т⁠-⁠Ж')
+        if url and url not in unique_sources:
+            unique_sources[url] = title
+
+    for url, title in unique_sources.items():
+        sources_text += f"- [{title}]({url})\n"
+
+    return sources_text
+
+
+PROMPT = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+
+
+def _create_token_callback(question: str, packed: PackedContext) -> TokenUsageCallback:
+    # Токены контекста уже посчитаны при упаковке (сумма предрасчитанных значений)
+    return TokenUsageCallback(
+        query_tokens=count_tokens(question),
+        context_tokens=packed.tokens,
+    )
+
+
+def _pack(results: List[Tuple[Document, float]]) -> PackedContext:
+    settings = get_settings()
+    with track_stage("format"):
+        return pack_context(
+            results,
+            max_tokens=settings.context_max_tokens,
+            max_chunks_per_source=settings.context_max_chunks_per_source,
         )
-    
-    return "\n\n".join(formatted)
 
 
-def query_rag(question: str, top_k: int = 3) -> Tuple[str, str, List[Document], Dict[str, int]]:
+async def _embed(question: str) -> List[float]:
+    with track_stage("embed"):
+        return await aembed_query(question)
+
+
+async def _retrieve(query_vector: Sequence[float], top_k: int) -> PackedContext:
+    """Асинхронный поиск в Qdrant и упаковка найденного в бюджет контекста."""
+    with track_stage("search"):
+        results = await asearch_by_vector(query_vector, k=top_k)
+    return _pack(results)
+
+
+async def _cache_version() -> str:
+    """Версия индекса + провайдеры/модели + промпт: ответы из кэша валидны только для них."""
+    prompt_hash = hashlib.sha1(PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:8]
+    return "|".join([
+        await aget_index_version(),
+        get_llm_router().signature,
+        prompt_hash,
+    ])
+
+
+async def _cache_lookup(
+    query_vector: Sequence[float], top_k: int, use_cache: bool
+) -> Tuple[Optional[CachedAnswer], Optional[str]]:
+    if not use_cache or not get_settings().semantic_cache_enabled:
+        return None, None
+    version = await _cache_version()
+    return get_semantic_cache().lookup(query_vector, top_k, version), version
+
+
+def _cache_store(
+    query_vector: Sequence[float],
+    version: Optional[str],
+    question: str,
+    top_k: int,
+    answer: str,
+    context: str,
+    docs: List[Document],
+    token_usage: Dict[str, int],
+) -> None:
+    if version is None or not answer.strip():
+        return
+    get_semantic_cache().store(
+        query_vector,
+        version,
+        CachedAnswer(
+            question=question,
+            top_k=top_k,
+            answer=answer,
+            context=context,
+            docs=[{"page_content": d.page_content, "metadata": d.metadata} for d in docs],
+            token_usage=token_usage,
+        ),
+    )
+
+
+def _cached_usage(cached: CachedAnswer) -> Dict[str, int]:
+    return {**cached.token_usage, "cache_hit": 1}
+
+
+async def query_rag(
+    question: str, top_k: int = 3, use_cache: bool = True
+) -> Tuple[str, str, List[Document], Dict[str, int]]:
     """
     Выполняет RAG запрос с детальным отслеживанием использования токенов.
+
+    Перед поиском проверяет семантический кэш: если похожий вопрос уже
+    задавали (косинусная близость выше порога), ответ берётся из кэша.
     
     Args:
         question: Вопрос пользователя
         top_k: Количество документов для контекста
+        use_cache: Использовать семантический кэш ответов
         
     Returns:
         Tuple содержащий:
@@ -59,48 +161,143 @@ def query_rag(question: str, top_k: int = 3) -> Tuple[str, str, List[Document],
         - docs: Список документов-источников
         - token_usage: Детальная статистика токенов (query, context, prompt, completion, total)
     """
-    vector_store = get_vector_store()
-    llm = get_llm()
+    query_vector = await _embed(question)
+    cached, cache_version = await _cache_lookup(query_vector, top_k, use_cache)
+    RAG_REQUESTS.labels(endpoint="query", cache="hit" if cached else "miss").inc()
+    if cached is not None:
+        return cached.answer, cached.context, cached.documents(), _cached_usage(cached)
+
+    # Получаем документы из векторной БД и укладываем их в бюджет контекста
+    packed = await _retrieve(query_vector, top_k)
+    return await _generate(question, top_k, query_vector, packed, cache_version)
 
-    # Получаем документы из векторной БД
-    docs = vector_store.similarity_search(question, k=top_k)
-    context = _format_docs(docs)
-    
-    # Подсчитываем токены запроса и контекста
-    query_tokens = estimate_tokens(question)
-    context_tokens = estimate_tokens(context)
+
+async def _generate(
+    question: str,
+    top_k: int,
+    query_vector: Sequence[float],
+    packed: PackedContext,
+    cache_version: Optional[str],
+) -> Tuple[str, str, List[Document], Dict[str, int]]:
+    """Генерация ответа по готовому контексту и запись в семантический кэш."""
+    docs, context = packed.docs, packed.context
 
     # Создаём callback для отслеживания токенов с детализацией
-    token_callback = TokenUsageCallback(
-        query_tokens=query_tokens,
-        context_tokens=context_tokens
-    )
+    token_callback = _create_token_callback(question, packed)
+    prompt = PROMPT.format_prompt(context=context, question=question)
 
-    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    chain = prompt | llm | StrOutputParser()
+    # Вызываем LLM через роутер провайдеров с callback для отслеживания токенов
+    answer = await get_llm_router().ainvoke(prompt, callbacks=[token_callback])
 
-    # Вызываем chain с callback для отслеживания токенов
-    answer = chain.invoke(
-        {"context": context, "question": question},
-        config={"callbacks": [token_callback]}
-    )
-    
     # Add sources to answer if not already present
-    if "источник" not in answer.lower() and "source" not in answer.lower():
-        sources_text = "\n\n**Источники:**\n"
-        unique_sources = {}
-        for doc in docs:
-            url = doc.metadata.get('source_url', '')
-            title = doc.metadata.get('article_title', 'Статья Т⁠-⁠Ж')
-            if url and url not in unique_sources:
-                unique_sources[url] = title
-        
-        for url, title in unique_sources.items():
-            sources_text += f"- [{title}]({url})\n"
-        
-        answer = answer + sources_text
-    
+    answer = answer + _append_sources(answer, docs)
+
     # Получаем детальную статистику использования токенов
-    token_usage = token_callback.get_usage_stats()
-    
+    token_usage = {**token_callback.get_usage_stats(), **packed.usage_stats()}
+    _cache_store(query_vector, cache_version, question, top_k, answer, context, docs, token_usage)
+
     return answer, context, docs, token_usage
+
+
+async def query_rag_batch(
+    questions: List[str], top_k: int = 3, use_cache: bool = True
+) -> List[Union[Tuple[str, str, List[Document], Dict[str, int]], Exception]]:
+    """
+    Пакетный RAG для офлайн задач (eval, прогрев кэша, проверка промптов).
+
+    Все вопросы эмбеддятся одним батчем, ищутся одним batch-запросом
+    в Qdrant, а LLM вызывается параллельно, не более BATCH_LLM_CONCURRENCY
+    запросов одновременно.
+
+    Returns:
+        Для каждого вопроса - результат как у query_rag или исключение
+    """
+    with track_stage("embed_batch"):
+        query_vectors = await aembed_queries(questions)
+
+    results: List[Any] = [None] * len(questions)
+    pending: List[Tuple[int, Optional[str]]] = []
+    for i, query_vector in enumerate(query_vectors):
+        cached, cache_version = await _cache_lookup(query_vector, top_k, use_cache)
+        RAG_REQUESTS.labels(endpoint="batch", cache="hit" if cached else "miss").inc()
+        if cached is not None:
+            results[i] = (cached.answer, cached.context, cached.documents(), _cached_usage(cached))
+        else:
+            pending.append((i, cache_version))
+
+    if not pending:
+        return results
+
+    with track_stage("search_batch"):
+        search_results = await asearch_batch_by_vectors(
+            [query_vectors[i] for i, _version in pending], k=top_k
+        )
+    semaphore = asyncio.Semaphore(get_settings().batch_llm_concurrency)
+
+    async def _answer(i: int, cache_version: Optional[str], found) -> None:
+        async with semaphore:
+            try:
+                results[i] = await _generate(
+                    questions[i], top_k, query_vectors[i], _pack(found), cache_version
+                )
+            except Exception as exc:
+                logger.warning("Batch item %d failed: %s", i, exc)
+                results[i] = exc
+
+    await asyncio.gather(*(
+        _answer(i, cache_version, found)
+        for (i, cache_version), found in zip(pending, search_results)
+    ))
+    return results
+
+
+async def stream_rag(
+    question: str, top_k: int = 3, use_cache: bool = True
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Потоковый вариант query_rag.
+
+    Сначала отдаёт найденные источники, затем токены ответа по мере
+    генерации и в конце статистику токенов вместе с блоком "Источники".
+    Ответ из семантического кэша отдаётся одним событием token.
+
+    Yields:
+        Пары (event, data):
+        - ("sources", {"context": ..., "docs": [...]})
+        - ("token", {"text": ...})
+        - ("done", {"sources_block": ..., "token_usage": {...}})
+    """
+    query_vector = await _embed(question)
+    cached, cache_version = await _cache_lookup(query_vector, top_k, use_cache)
+    RAG_REQUESTS.labels(endpoint="stream", cache="hit" if cached else "miss").inc()
+    if cached is not None:
+        yield "sources", {"context": cached.context, "docs": cached.documents()}
+        yield "token", {"text": cached.answer}
+        yield "done", {"sources_block": "", "token_usage": _cached_usage(cached)}
+        return
+
+    packed = await _retrieve(query_vector, top_k)
+    docs, context = packed.docs, packed.context
+    yield "sources", {"context": context, "docs": docs}
+
+    token_callback = _create_token_callback(question, packed)
+    prompt = PROMPT.format_prompt(context=context, question=question)
+
+    parts: List[str] = []
+    async for chunk in get_llm_router().astream(prompt, callbacks=[token_callback]):
+        if chunk:
+            parts.append(chunk)
+            yield "token", {"text": chunk}
+
+    answer = "".join(parts)
+    sources_block = _append_sources(answer, docs)
+    token_usage = {**token_callback.get_usage_stats(), **packed.usage_stats()}
+    _cache_store(
+        query_vector, cache_version, question, top_k,
+        answer + sources_block, context, docs, token_usage,
+    )
+
+    yield "done", {
+        "sources_block": sources_block,
+        "token_usage": token_usage,
+    }
@@ -0,0 +1,249 @@
+"""Семантический кэш ответов RAG."""
+import fcntl
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    """Сохранённый ответ на ранее заданный вопрос."""
+    question: str
+    top_k: int
+    answer: str
+    context: str
+    docs: List[Dict[str, Any]]
+    token_usage: Dict[str, int]
+    created_at: float = field(default_factory=time.time)
+
+    def documents(self) -> List[Document]:
+        return [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in self.docs]
+
+
+class SemanticCache:
+    """
+    Кэш ответов с поиском по косинусной близости эмбеддингов вопросов.
+
+    Векторы хранятся нормированными в заранее выделенной float32 матрице,
+    поэтому поиск ближайшего вопроса - одно матричное умножение.
+    Устаревшие по TTL записи освобождаются перед каждым поиском и вставкой,
+    при переполнении вытесняется LRU. Весь кэш сбрасывается, когда меняется
+    версия индекса (коллекция, модель, промпт).
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        max_size: int,
+        ttl_seconds: float,
+        persist_path: Optional[str] = None,
+    ):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path or None
+
+        self._version: Optional[str] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._top_k = np.zeros(max_size, dtype=np.int32)
+        self._created_at = np.zeros(max_size, dtype=np.float64)
+        self._valid = np.zeros(max_size, dtype=bool)
+        # slot -> entry, порядок = порядок использования (LRU в начале)
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._free_slots = list(range(max_size - 1, -1, -1))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _check_version(self, version: str) -> None:
+        if self._version is None:
+            self._version = version
+        elif self._version != version:
+            logger.info("Semantic cache invalidated: %s -> %s", self._version, version)
+            self.clear()
+            self._version = version
+            self.invalidations += 1
+
+    def _release(self, slot: int) -> None:
+        del self._entries[slot]
+        self._valid[slot] = False
+        self._free_slots.append(slot)
+
+    def _expire(self) -> None:
+        """Освобождает слоты записей старше TTL."""
+        expired = self._valid & (self._created_at < time.time() - self.ttl_seconds)
+        for slot in np.flatnonzero(expired):
+            self._release(int(slot))
+            self.expirations += 1
+
+    def lookup(self, vector: Sequence[float], top_k: int, version: str) -> Optional[CachedAnswer]:
+        """Возвращает ответ на самый близкий вопрос, если он ближе порога и не устарел."""
+        self._check_version(version)
+        self._expire()
+        if not self._entries or self._vectors is None:
+            self.misses += 1
+            return None
+
+        query = self._normalize(vector)
+        scores = self._vectors @ query
+        scores[~(self._valid & (self._top_k == top_k))] = -np.inf
+        slot = int(np.argmax(scores))
+
+        if scores[slot] < self.threshold:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(slot)
+        self.hits += 1
+        return self._entries[slot]
+
+    def store(
+        self,
+        vector: Sequence[float],
+        version: str,
+        entry: CachedAnswer,
+    ) -> None:
+        self._check_version(version)
+        normalized = self._normalize(vector)
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_size, normalized.shape[0]), dtype=np.float32)
+
+        self._expire()
+        if not self._free_slots:
+            lru_slot = next(iter(self._entries))
+            self._release(lru_slot)
+            self.evictions += 1
+
+        slot = self._free_slots.pop()
+        self._vectors[slot] = normalized
+        self._top_k[slot] = entry.top_k
+        self._created_at[slot] = entry.created_at
+        self._valid[slot] = True
+        self._entries[slot] = entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._valid[:] = False
+        self._free_slots = list(range(self.max_size - 1, -1, -1))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def save(self) -> None:
+        """
+        Сохраняет кэш на диск, сливая его с уже сохранённым.
+
+        Под gunicorn у каждого воркера свой кэш, а файл один: воркер под
+        файловой блокировкой читает то, что записали другие, добавляет свои
+        записи (они считаются более свежими по LRU) и атомарно заменяет файл.
+        """
+        if not self.persist_path or self._vectors is None:
+            return
+        self._expire()
+        os.makedirs(os.path.dirname(os.path.abspath(self.persist_path)), exist_ok=True)
+        with open(f"{self.persist_path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            own = [(self._vectors[slot], entry) for slot, entry in self._entries.items()]
+            own_keys = {(entry.question, entry.top_k) for _vector, entry in own}
+            merged = [
+                item for item in self._read()
+                if (item[1].question, item[1].top_k) not in own_keys
+            ] + own
+            merged = merged[-self.max_size:]
+            tmp_path = f"{self.persist_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as handle:
+                np.savez(
+                    handle,
+                    vectors=np.asarray([vector for vector, _entry in merged], dtype=np.float32),
+                    meta=np.array(json.dumps(
+                        {
+                            "version": self._version,
+                            "entries": [entry.__dict__ for _vector, entry in merged],
+                        },
+                        ensure_ascii=False,
+                    )),
+                )
+            os.replace(tmp_path, self.persist_path)
+        logger.info("Semantic cache saved: %d entries -> %s", len(merged), self.persist_path)
+
+    def _read(self) -> List[Tuple[np.ndarray, CachedAnswer]]:
+        """Непросроченные записи текущей версии из файла, в порядке LRU."""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return []
+        try:
+            with np.load(self.persist_path) as data:
+                vectors = data["vectors"]
+                meta = json.loads(str(data["meta"]))
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Failed to load semantic cache %s: %s", self.persist_path, exc)
+            return []
+        if self._version is not None and meta["version"] != self._version:
+            return []
+        if self._version is None:
+            self._version = meta["version"]
+        deadline = time.time() - self.ttl_seconds
+        return [
+            (vector, CachedAnswer(**raw))
+            for vector, raw in zip(vectors, meta["entries"])
+            if raw["created_at"] >= deadline
+        ]
+
+    def load(self) -> None:
+        """Загружает кэш с диска, если файл есть. Порядок LRU сохраняется."""
+        self.clear()
+        self._version = None
+        for vector, entry in self._read()[-self.max_size:]:
+            self.store(vector, self._version, entry)
+        if self._entries:
+            logger.info("Semantic cache loaded: %d entries from %s", len(self), self.persist_path)
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> SemanticCache:
+    settings = get_settings()
+    cache = SemanticCache(
+        threshold=settings.semantic_cache_threshold,
+        max_size=settings.semantic_cache_max_size,
+        ttl_seconds=settings.semantic_cache_ttl_seconds,
+        persist_path=settings.semantic_cache_path,
+    )
+    cache.load()
+    return cache
@@ -1,4 +1,5 @@
 """Token usage tracking for LLM API calls."""
+import asyncio
 from typing import Any, Dict, List
 from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.outputs import LLMResult
@@ -41,10 +42,10 @@ class TokenUsageCallback(BaseCallbackHandler):
     
     def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
         """Вызывается в конце LLM запроса для подсчёта токенов."""
-        if response.llm_output is None:
-            return
-            
-        token_usage = response.llm_output.get("token_usage", {})
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        if not token_usage:
+            # При стриминге провайдеры отдают usage в чанках, а не в llm_output
+            token_usage = self._usage_from_generations(response)
         
         if token_usage:
             prompt_tokens = token_usage.get("prompt_tokens", 0)
@@ -69,8 +70,32 @@ class TokenUsageCallback(BaseCallbackHandler):
                 f"Total: {total_tokens}"
             )
     
+    @staticmethod
+    def _usage_from_generations(response: LLMResult) -> Dict[str, int]:
+        """Собирает usage_metadata из сообщений генераций (режим стриминга)."""
+        usage: Dict[str, int] = {}
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                metadata = getattr(message, "usage_metadata", None)
+                if not metadata:
+                    continue
+                usage["prompt_tokens"] = (
+                    usage.get("prompt_tokens", 0) + metadata.get("input_tokens", 0)
+                )
+                usage["completion_tokens"] = (
+                    usage.get("completion_tokens", 0) + metadata.get("output_tokens", 0)
+                )
+                usage["total_tokens"] = (
+                    usage.get("total_tokens", 0) + metadata.get("total_tokens", 0)
+                )
+        return usage
+    
     def on_llm_error(self, error: Exception, **kwargs: Any) -> None:
         """Вызывается при ошибке LLM."""
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            # Отменённый hedge-запрос роутера - это не ошибка
+            return
         logger.error(f"❌ LLM Error: {error}")
     
     def get_usage_stats(self) -> Dict[str, int]:
@@ -1,7 +1,22 @@
+import asyncio
+import os
+import threading
+import time
 from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+from langchain_core.documents import Document
 from langchain_qdrant import QdrantVectorStore
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
 from app.core.config import get_settings
 from app.services.embeddings import get_embeddings
+from app.services.local_index import META_FILE, LocalVectorIndex
+from app.services.qdrant_tuning import get_qdrant_tuning
+
+
+VECTOR_STORE_BACKENDS = ("qdrant", "local")
+# Метка в metadata коллекции: индексатор обновляет её после каждого изменения
+INDEX_REVISION_KEY = "indexed_at"
 
 
 @lru_cache(maxsize=1)
@@ -13,3 +28,183 @@ def get_vector_store() -> QdrantVectorStore:
         url=settings.qdrant_url,
         collection_name=settings.collection_name,
     )
+
+
+_local_index: Optional[LocalVectorIndex] = None
+_local_index_stamp: Optional[Tuple[int, int]] = None
+_local_index_lock = threading.Lock()
+
+
+def _meta_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(os.path.join(path, META_FILE))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def get_local_index() -> LocalVectorIndex:
+    """
+    Встроенный индекс из LOCAL_INDEX_PATH.
+
+    Индексатор подменяет каталог целиком, поэтому новый meta.json значит
+    пересобранный индекс: он открывается заново без перезапуска сервиса.
+    Пока каталог подменяется (meta.json нет), отвечает прежний индекс.
+    """
+    global _local_index, _local_index_stamp
+
+    settings = get_settings()
+    stamp = _meta_stamp(settings.local_index_path)
+    with _local_index_lock:
+        if _local_index is not None and stamp in (None, _local_index_stamp):
+            return _local_index
+        index = LocalVectorIndex(settings.local_index_path)
+        if index.meta.get("model") != settings.embedding_model_name:
+            raise ValueError(
+                f"Local index at {settings.local_index_path} was built with "
+                f"{index.meta.get('model')}, "
+                f"but EMBEDDING_MODEL_NAME is {settings.embedding_model_name}"
+            )
+        _local_index, _local_index_stamp = index, stamp
+        return index
+
+
+def init_vector_store() -> None:
+    """Открывает выбранный VECTOR_STORE_BACKEND при старте сервиса."""
+    backend = get_settings().vector_store_backend
+    if backend == "local":
+        get_local_index()
+    elif backend == "qdrant":
+        get_vector_store()
+    else:
+        raise ValueError(
+            f"Unsupported vector store backend: {backend}. "
+            f"Supported backends: {', '.join(VECTOR_STORE_BACKENDS)}"
+        )
+
+
+def _use_local() -> bool:
+    return get_settings().vector_store_backend == "local"
+
+
+@lru_cache(maxsize=1)
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    settings = get_settings()
+    return AsyncQdrantClient(url=settings.qdrant_url, timeout=settings.qdrant_timeout)
+
+
+def _point_to_document(point: models.ScoredPoint) -> Document:
+    payload = point.payload or {}
+    return Document(
+        page_content=payload.get(QdrantVectorStore.CONTENT_KEY, ""),
+        metadata=payload.get(QdrantVectorStore.METADATA_KEY) or {},
+    )
+
+
+async def asearch_by_vector(
+    vector: Sequence[float], k: int = 3
+) -> List[Tuple[Document, float]]:
+    """
+    Асинхронный поиск ближайших фрагментов по готовому эмбеддингу запроса.
+
+    Returns:
+        Список пар (документ, score) в порядке убывания близости
+    """
+    if _use_local():
+        return await asyncio.to_thread(get_local_index().search, vector, k)
+
+    settings = get_settings()
+    client = get_async_qdrant_client()
+    response = await client.query_points(
+        collection_name=settings.collection_name,
+        query=list(vector),
+        limit=k,
+        with_payload=True,
+        search_params=get_qdrant_tuning().search_params(),
+    )
+    return [(_point_to_document(point), point.score) for point in response.points]
+
+
+async def asearch_batch_by_vectors(
+    vectors: Sequence[Sequence[float]], k: int = 3
+) -> List[List[Tuple[Document, float]]]:
+    """Поиск для нескольких запросов одним batch-запросом к Qdrant."""
+    if _use_local():
+        return await asyncio.to_thread(get_local_index().search_batch, vectors, k)
+
+    settings = get_settings()
+    client = get_async_qdrant_client()
+    search_params = get_qdrant_tuning().search_params()
+    responses = await client.query_batch_points(
+        collection_name=settings.collection_name,
+        requests=[
+            models.QueryRequest(
+                query=list(vector), limit=k, with_payload=True, params=search_params
+            )
+            for vector in vectors
+        ],
+    )
+    return [
+        [(_point_to_document(point), point.score) for point in response.points]
+        for response in responses
+    ]
+
+
+_index_version: Optional[str] = None
+_index_version_checked_at = 0.0
+
+
+async def aresolve_collection() -> str:
+    """
+    Коллекция, на которую сейчас указывает QDRANT_COLLECTION.
+
+    При blue/green переиндексации (INDEX_MODE=bluegreen) QDRANT_COLLECTION -
+    алиас на версию вида tj_v20250101120000. Поиск идёт по алиасу и сразу
+    попадает в новую версию, а имя версии нужно для инвалидации кэшей.
+    """
+    name = get_settings().collection_name
+    response = await get_async_qdrant_client().get_aliases()
+    for alias in response.aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name
+
+
+async def aget_index_version() -> str:
+    """
+    Версия индекса для инвалидации кэшей.
+
+    Складывается из имени коллекции (версии за алиасом), модели
+    эмбеддингов, числа точек, метки последнего изменения от индексатора
+    (INDEX_REVISION_KEY, для локального индекса - время сборки) и ручной
+    метки INDEX_VERSION. Запрашивается у Qdrant не чаще, чем раз
+    в INDEX_VERSION_TTL_SECONDS.
+    """
+    global _index_version, _index_version_checked_at
+
+    settings = get_settings()
+    now = time.monotonic()
+    fresh = now - _index_version_checked_at < settings.index_version_ttl_seconds
+    if _index_version is not None and fresh:
+        return _index_version
+
+    if _use_local():
+        index = get_local_index()
+        collection = "local"
+        points_count = index.points_count
+        # built_at меняется при каждой пересборке индекса
+        revision = index.meta.get("built_at")
+    else:
+        collection = await aresolve_collection()
+        info = await get_async_qdrant_client().get_collection(collection)
+        points_count = info.points_count
+        revision = (info.config.metadata or {}).get(INDEX_REVISION_KEY)
+    _index_version = ":".join([
+        collection,
+        settings.embedding_model_name,
+        str(points_count),
+        str(revision or 0),
+        settings.index_version,
+    ])
+    _index_version_checked_at = now
+    return _index_version
@@ -0,0 +1,150 @@
+"""Фоновая загрузка моделей и прогрев сервиса перед приёмом трафика."""
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.services.embeddings import aembed_query, get_embeddings
+from app.services.llm_router import get_llm_router
+from app.services.semantic_cache import get_semantic_cache
+from app.services.vector_store import aget_index_version, asearch_by_vector, init_vector_store
+from app.utils.token_utils import get_tokenizer
+
+
+logger = get_logger(__name__)
+
+_FALLBACK_QUERIES = [
+    "Как оформить налоговый вычет?",
+    "Куда поехать отдыхать летом?",
+    "Как начать инвестировать?",
+    "Что такое тревожное расстройство?",
+]
+
+
+class WarmupState:
+    """Статус прогрева для /ready: фазы и их длительности."""
+
+    def __init__(self):
+        self.status = "starting"
+        self.phases: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.failures = 0
+        self.started = time.monotonic()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            "error": self.error,
+            "failures": self.failures,
+        }
+
+
+_state = WarmupState()
+
+
+def get_warmup_state() -> WarmupState:
+    return _state
+
+
+def _warmup_queries(count: int) -> List[str]:
+    """Вопросы для прогрева: из golden set, если он есть, иначе встроенные."""
+    queries: List[str] = []
+    golden_path = get_settings().eval_golden_path
+    if os.path.exists(golden_path):
+        try:
+            with open(golden_path, "r", encoding="utf-8") as handle:
+                queries = [item["question"] for item in json.load(handle)]
+        except (ValueError, KeyError) as exc:
+            logger.warning("Can't read warm-up questions from %s: %s", golden_path, exc)
+    queries += _FALLBACK_QUERIES
+    return queries[:count]
+
+
+async def _phase(name: str, func: Callable[[], Any]) -> None:
+    started = time.perf_counter()
+    result = func()
+    if asyncio.iscoroutine(result):
+        await result
+    _state.phases[name] = time.perf_counter() - started
+    logger.info("Startup phase %s took %.2fs", name, _state.phases[name])
+
+
+async def _warm_queries() -> None:
+    # Первые прогоны модели компилируют ядра и аллоцируют буферы,
+    # первые поиски поднимают в page cache граф HNSW / файл векторов
+    for query in _warmup_queries(get_settings().warmup_queries):
+        vector = await aembed_query(query, use_cache=False)
+        await asearch_by_vector(vector, k=10)
+
+
+async def run_warmup() -> None:
+    """
+    Загружает модели и прогревает пайплайн, не блокируя event loop.
+
+    Тяжёлые синхронные инициализации идут в отдельном потоке, поэтому
+    /health отвечает сразу, а /ready - только после прогрева. Упавшая фаза
+    (например, индекс ещё строится) повторяется с экспоненциальной паузой
+    от WARMUP_RETRY_SECONDS до WARMUP_RETRY_MAX_SECONDS, пройденные фазы
+    не повторяются.
+    """
+    settings = get_settings()
+    phases: List[Tuple[str, Callable[[], Any]]] = [
+        ("embeddings", lambda: asyncio.to_thread(get_embeddings)),
+        ("vector_store", lambda: asyncio.to_thread(init_vector_store)),
+        ("llm", lambda: asyncio.to_thread(get_llm_router)),
+        # Первый count_tokens иначе грузит токенайзер (сеть HF) прямо в event loop
+        # на первом /rag; недоступный токенайзер здесь же заменяется оценкой
+        ("tokenizer", lambda: asyncio.to_thread(get_tokenizer)),
+    ]
+    if settings.semantic_cache_enabled:
+        phases.append(("semantic_cache", lambda: asyncio.to_thread(get_semantic_cache)))
+    phases += [
+        ("index_version", aget_index_version),
+        ("warmup_queries", _warm_queries),
+    ]
+
+    _state.status = "warming"
+    delay = settings.warmup_retry_seconds
+    while True:
+        name = ""
+        try:
+            for name, func in phases:
+                if name not in _state.phases:
+                    await _phase(name, func)
+            break
+        except asyncio.CancelledError:
+            _state.status = "cancelled"
+            raise
+        except Exception as exc:
+            _state.failures += 1
+            _state.status = "retrying"
+            _state.error = f"{name}: {exc}"
+            logger.exception(
+                "Warm-up phase %s failed (attempt %d), retrying in %.0fs: %s",
+                name, _state.failures, delay, exc,
+            )
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                _state.status = "cancelled"
+                raise
+            delay = min(delay * 2, settings.warmup_retry_max_seconds)
+
+    _state.error = None
+    _state.status = "ready"
+    logger.info(
+        "Service is ready in %.2fs (LLM providers: %s, embedding model: %s (%s), vector store: %s)",
+        time.monotonic() - _state.started,
+        get_llm_router().signature,
+        settings.embedding_model_name,
+        settings.embedding_backend,
+        settings.vector_store_backend,
+    )
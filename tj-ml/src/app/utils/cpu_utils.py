@@ -0,0 +1,23 @@
+"""Раскладка ядер CPU между процессами с копией модели."""
+import os
+
+
+def available_cores() -> int:
+    """Ядра, доступные процессу (с учётом cpuset контейнера, где он поддерживается)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def torch_threads_per_worker(worker_count: int) -> int:
+    """
+    Потоков torch на процесс: cores // worker_count, но не меньше одного.
+
+    TORCH_THREADS задаёт число явно. Общий расчёт для воркеров gunicorn
+    и процессов indexer.encode_pool.
+    """
+    override = os.getenv("TORCH_THREADS")
+    if override:
+        return int(override)
+    return max(1, available_cores() // max(1, worker_count))
@@ -1,5 +1,12 @@
 """Утилиты для подсчёта токенов в тексте."""
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import Settings, get_settings
+from app.core.logging import get_logger
+
+
+logger = get_logger(__name__)
 
 
 def estimate_tokens(text: str, method: str = "approximate") -> int:
@@ -41,3 +48,114 @@ def estimate_tokens_safe(text: Optional[str]) -> int:
     if text is None:
         return 0
     return estimate_tokens(text)
+
+
+def resolve_tokenizer_name(settings: Settings) -> str:
+    """
+    HF токенайзер для подсчёта токенов.
+
+    TOKENIZER_NAME задаёт его явно ("none" - только приблизительная оценка).
+    Иначе токенайзер берётся по основной цели роутера - первой записи
+    LLM_PROVIDERS или LLM_PROVIDER: для OpenRouter это репозиторий модели
+    без суффикса (":free" и т.п.). У GigaChat публичного токенайзера нет,
+    fake считает токены той же оценкой.
+    """
+    if settings.tokenizer_name:
+        return "" if settings.tokenizer_name.lower() == "none" else settings.tokenizer_name
+    provider, model = _primary_target(settings)
+    if provider == "openrouter":
+        return model.split(":", 1)[0]
+    return ""
+
+
+def _primary_target(settings: Settings) -> Tuple[str, str]:
+    # Импорт здесь: llm_router через fake_llm сам зависит от этого модуля
+    from app.services.llm_router import parse_provider_list
+
+    return parse_provider_list(settings.llm_providers, settings.llm_provider)[0]
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer() -> Optional[Any]:
+    """Токенайзер, загружается один раз на процесс. None - если недоступен."""
+    settings = get_settings()
+    name = resolve_tokenizer_name(settings)
+    if not name:
+        provider, _model = _primary_target(settings)
+        if not settings.tokenizer_name and provider != "fake":
+            logger.warning(
+                "No public tokenizer for LLM provider %s, token counts are estimated", provider
+            )
+        return None
+    try:
+        from transformers import AutoTokenizer
+
+        return AutoTokenizer.from_pretrained(name)
+    except Exception as exc:
+        # Например, закрытый репозиторий (gemma) без HF_TOKEN
+        logger.warning(
+            "Tokenizer %s unavailable, token counts are estimated "
+            "(set HF_TOKEN for gated repos or TOKENIZER_NAME): %s",
+            name,
+            exc,
+        )
+        return None
+
+
+def get_tokenizer_name() -> str:
+    """Имя активного токенайзера или "approximate" для эвристики."""
+    if get_tokenizer() is None:
+        return "approximate"
+    return resolve_tokenizer_name(get_settings())
+
+
+def count_tokens(text: str) -> int:
+    """Точный подсчёт токенайзером модели, если он доступен, иначе estimate_tokens."""
+    if not text:
+        return 0
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def chunk_token_count(metadata: Dict[str, Any], text: str) -> int:
+    """
+    Число токенов фрагмента: предрасчитанное при индексации, если оно
+    посчитано тем же токенайзером, иначе считается заново.
+    """
+    token_count = metadata.get("token_count")
+    if token_count is not None and metadata.get("tokenizer") == get_tokenizer_name():
+        return int(token_count)
+    return count_tokens(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Обрезает текст так, чтобы в нём было не больше max_tokens токенов.
+
+    Обрезанный текст заканчивается многоточием.
+    """
+    if max_tokens <= 0:
+        return ""
+
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        token_ids = tokenizer.encode(text, add_special_tokens=False)
+        if len(token_ids) <= max_tokens:
+            return text
+        return tokenizer.decode(token_ids[:max_tokens]).rstrip() + "…"
+
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    words = text.split()
+    low, high = 0, len(words)
+    # Бинарный поиск максимального числа слов, влезающих в бюджет
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(" ".join(words[:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + "…"
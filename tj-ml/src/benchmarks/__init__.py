@@ -0,0 +1 @@
+"""Нагрузочные бенчмарки ML сервиса (запуск: python -m benchmarks.<name>)."""
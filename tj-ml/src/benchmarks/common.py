@@ -0,0 +1,40 @@
+"""Общие утилиты бенчмарков."""
+import math
+from typing import Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Перцентиль методом nearest-rank (q в диапазоне 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(latencies: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99/max в миллисекундах."""
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def print_table(rows: List[Dict[str, object]]) -> None:
+    """Печатает список словарей как выровненную таблицу."""
+    if not rows:
+        return
+    headers = list(rows[0].keys())
+
+    def _fmt(value: object) -> str:
+        return f"{value:.1f}" if isinstance(value, float) else str(value)
+
+    widths = {
+        header: max(len(header), *(len(_fmt(row[header])) for row in rows))
+        for header in headers
+    }
+    print("  ".join(header.rjust(widths[header]) for header in headers))
+    for row in rows:
+        print("  ".join(_fmt(row[header]).rjust(widths[header]) for header in headers))
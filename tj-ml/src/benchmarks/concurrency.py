@@ -0,0 +1,180 @@
+"""
+Бенчмарк конкурентности ML сервиса.
+
+По умолчанию поднимает настоящий app.main:app (uvicorn, один процесс)
+с fake LLM (LLM_PROVIDER=fake, задержки FAKE_LLM_*) и встроенным индексом
+(VECTOR_STORE_BACKEND=local, индекс строится заранее через index.py)
+и бьёт в /rag/query вопросами из golden set: видно, сколько одновременных
+ожиданий LLM держит сервис вместе с эмбеддингом, поиском и кэшами.
+
+С --url бьёт в уже запущенный сервис.
+
+С --simulated сравнивает два игрушечных эндпоинта в одном процессе:
+`def` с time.sleep (как был `rag_query`) и `async def` с asyncio.sleep
+(как сейчас). Sync-вариант упирается в лимит потоков Starlette (~40),
+async держит сотни ожиданий одновременно.
+
+    python -m benchmarks.concurrency --requests 400 --concurrency 200
+    python -m benchmarks.concurrency --url http://localhost:8001 --concurrency 50
+    python -m benchmarks.concurrency --simulated --llm-latency 1.0
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import AsyncIterator, Dict, List
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.common import print_table, summarize_latencies
+
+
+def _build_simulated_app(llm_latency: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/sync")
+    def sync_query() -> Dict[str, str]:
+        time.sleep(llm_latency)
+        return {"answer": "ok"}
+
+    @app.post("/async")
+    async def async_query() -> Dict[str, str]:
+        await asyncio.sleep(llm_latency)
+        return {"answer": "ok"}
+
+    return app
+
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_questions() -> List[str]:
+    path = os.path.join(SRC_DIR, "app", "data", "eval_golden.json")
+    with open(path, "r", encoding="utf-8") as handle:
+        return [item["question"] for item in json.load(handle)]
+
+
+@contextlib.asynccontextmanager
+async def _serve_app(port: int, startup_timeout: float) -> AsyncIterator[str]:
+    """Запускает app.main:app с fake LLM и локальным индексом, отдаёт его адрес."""
+    env = {
+        **os.environ,
+        "LLM_PROVIDER": "fake",
+        "LLM_PROVIDERS": "",
+        "VECTOR_STORE_BACKEND": "local",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=SRC_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout
+        async with httpx.AsyncClient(base_url=base_url, timeout=5) as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"ML service exited with code {process.returncode}")
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Service is not ready in {startup_timeout}s")
+                try:
+                    if (await client.get("/ready")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.5)
+        yield base_url
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+
+async def _run(
+    client: httpx.AsyncClient,
+    path: str,
+    total: int,
+    concurrency: int,
+    questions: List[str],
+) -> Dict[str, object]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def _one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                path, json={"question": questions[i % len(questions)], "top_k": 3}
+            )
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "endpoint": path,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "wall_s": elapsed,
+        "rps": total / elapsed,
+        **summarize_latencies(latencies),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--url", help="Адрес уже запущенного ML сервиса")
+    parser.add_argument(
+        "--simulated", action="store_true", help="Игрушечные sync/async эндпоинты вместо сервиса"
+    )
+    parser.add_argument(
+        "--llm-latency", type=float, default=1.0, help="Имитация ожидания LLM для --simulated, сек"
+    )
+    parser.add_argument("--port", type=int, default=18002)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    rows = []
+    if args.simulated:
+        transport = httpx.ASGITransport(app=_build_simulated_app(args.llm_latency))
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=300
+        ) as client:
+            for path in ("/sync", "/async"):
+                rows.append(
+                    await _run(client, path, args.requests, args.concurrency, ["?"])
+                )
+    else:
+        async with contextlib.AsyncExitStack() as stack:
+            base_url = args.url or await stack.enter_async_context(
+                _serve_app(args.port, args.startup_timeout)
+            )
+            async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+                rows.append(
+                    await _run(
+                        client, "/rag/query", args.requests, args.concurrency, _load_questions()
+                    )
+                )
+
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
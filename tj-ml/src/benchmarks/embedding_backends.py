@@ -0,0 +1,154 @@
+"""
+Сравнение бэкендов эмбеддингов: torch fp32, onnx, onnx-int8.
+
+Каждый бэкенд запускается в отдельном процессе, чтобы честно измерить RSS.
+Процесс кодирует фрагменты из data/articles.json и серию коротких запросов,
+а родитель сравнивает векторы с fp32 эталоном:
+- cosine: средняя/минимальная косинусная близость к fp32 векторам
+- overlap@5: доля совпадающих top-5 соседей запроса по корпусу
+
+    python -m benchmarks.embedding_backends
+    python -m benchmarks.embedding_backends --backends torch,onnx-int8 --limit 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.core.config import get_settings
+from benchmarks.common import percentile, print_table
+
+
+ARTICLES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "articles.json")
+
+
+def _rss_mb() -> Dict[str, float]:
+    """Текущий и пиковый RSS процесса из /proc (Linux)."""
+    values = {}
+    with open("/proc/self/status", "r", encoding="utf-8") as handle:
+        for line in handle:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                key, value = line.split(":", 1)
+                values[key] = int(value.split()[0]) / 1024
+    return {"rss_mb": values.get("VmRSS", 0.0), "peak_rss_mb": values.get("VmHWM", 0.0)}
+
+
+def _load_corpus(limit: int) -> List[str]:
+    with open(ARTICLES_PATH, "r", encoding="utf-8") as handle:
+        data = json.load(handle)
+    return [item["document"] for item in data[:limit]]
+
+
+def _queries(corpus: List[str]) -> List[str]:
+    return [" ".join(text.split()[:10]) for text in corpus[::max(1, len(corpus) // 50)]]
+
+
+def _worker(backend: str, model_name: str, limit: int, out_dir: str) -> None:
+    """Выполняется в дочернем процессе: замеры одного бэкенда."""
+    from app.services.embeddings import create_base_embeddings
+
+    corpus = _load_corpus(limit)
+    queries = _queries(corpus)
+
+    started = time.perf_counter()
+    embeddings = create_base_embeddings(model_name, backend)
+    embeddings.embed_query("прогрев")
+    load_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    doc_vectors = np.asarray(embeddings.embed_documents(corpus), dtype=np.float32)
+    docs_s = time.perf_counter() - started
+
+    query_vectors = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        query_vectors.append(embeddings.embed_query(query))
+        latencies.append(time.perf_counter() - started)
+
+    np.save(os.path.join(out_dir, f"{backend}_docs.npy"), doc_vectors)
+    np.save(
+        os.path.join(out_dir, f"{backend}_queries.npy"),
+        np.asarray(query_vectors, dtype=np.float32),
+    )
+    with open(os.path.join(out_dir, f"{backend}.json"), "w", encoding="utf-8") as handle:
+        json.dump({
+            "load_s": load_s,
+            "docs_per_s": len(corpus) / docs_s,
+            "query_p50_ms": percentile(latencies, 50) * 1000,
+            "query_p95_ms": percentile(latencies, 95) * 1000,
+            **_rss_mb(),
+        }, handle)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _parity(reference_dir: str, backend: str, k: int = 5) -> Dict[str, float]:
+    ref_docs = _normalize(np.load(os.path.join(reference_dir, "torch_docs.npy")))
+    ref_queries = _normalize(np.load(os.path.join(reference_dir, "torch_queries.npy")))
+    docs = _normalize(np.load(os.path.join(reference_dir, f"{backend}_docs.npy")))
+    queries = _normalize(np.load(os.path.join(reference_dir, f"{backend}_queries.npy")))
+
+    cosines = np.sum(ref_docs * docs, axis=1)
+    ref_top = np.argsort(-(ref_queries @ ref_docs.T), axis=1)[:, :k]
+    top = np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, top)])
+    return {
+        "cos_mean": float(np.mean(cosines)),
+        "cos_min": float(np.min(cosines)),
+        f"overlap@{k}": float(overlap),
+    }
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--model", default=settings.embedding_model_name)
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument(
+        "--limit", type=int, default=359, help="Сколько фрагментов корпуса кодировать"
+    )
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--out-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker, args.model, args.limit, args.out_dir)
+        return
+
+    backends = args.backends.split(",")
+    if "torch" not in backends:
+        backends.insert(0, "torch")  # эталон для parity
+
+    rows = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for backend in backends:
+            print(f"== {backend}", flush=True)
+            subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.embedding_backends",
+                    "--worker", backend, "--model", args.model,
+                    "--limit", str(args.limit), "--out-dir", out_dir,
+                ],
+                check=True,
+            )
+        for backend in backends:
+            with open(os.path.join(out_dir, f"{backend}.json"), "r", encoding="utf-8") as handle:
+                metrics = json.load(handle)
+            rows.append({"backend": backend, **metrics, **_parity(out_dir, backend)})
+
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
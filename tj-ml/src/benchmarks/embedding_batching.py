@@ -0,0 +1,99 @@
+"""
+Бенчмарк микро-батчинга эмбеддингов запросов.
+
+Для каждой пары (max_batch_size, max_wait_ms) и каждого уровня
+конкурентности отправляет уникальные запросы (кэш не участвует)
+и печатает пропускную способность и задержки. Строка batch=1 -
+это поведение без батчинга, по одному прямому проходу на запрос.
+
+    python -m benchmarks.embedding_batching
+    python -m benchmarks.embedding_batching --windows 1:0,8:2,16:2,32:5 --concurrency 1,8,32
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from app.core.config import get_settings
+from app.services.embeddings import EmbeddingBatcher
+from benchmarks.common import print_table, summarize_latencies
+
+
+def _load_texts() -> List[str]:
+    path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "articles.json")
+    with open(path, "r", encoding="utf-8") as handle:
+        data = json.load(handle)
+    # Вопросы пользователей короткие: берём начало фрагментов
+    return [" ".join(item["document"].split()[:12]) for item in data]
+
+
+def _parse_windows(raw: str) -> List[Tuple[int, float]]:
+    windows = []
+    for pair in raw.split(","):
+        size, wait = pair.split(":")
+        windows.append((int(size), float(wait)))
+    return windows
+
+
+async def _measure(
+    batcher: EmbeddingBatcher, texts: List[str], concurrency: int, total: int
+) -> Tuple[float, List[float]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def _one(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await batcher.embed(f"{texts[i % len(texts)]} #{i}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(total)))
+    return time.perf_counter() - started, latencies
+
+
+async def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--model", default=settings.embedding_model_name)
+    parser.add_argument(
+        "--windows", default="1:0,4:2,16:2,16:10,32:5", help="max_batch:max_wait_ms,..."
+    )
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--workers", type=int, default=settings.embedding_workers)
+    args = parser.parse_args()
+
+    embeddings = HuggingFaceEmbeddings(model_name=args.model)
+    executor = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="embeddings")
+    texts = _load_texts()
+    embeddings.embed_documents(texts[:4])  # прогрев
+
+    rows = []
+    for max_batch, max_wait in _parse_windows(args.windows):
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            batcher = EmbeddingBatcher(embeddings, executor, max_batch, max_wait, args.workers)
+            elapsed, latencies = await _measure(batcher, texts, concurrency, args.requests)
+            await batcher.close()
+            rows.append({
+                "batch": max_batch,
+                "wait_ms": max_wait,
+                "concurrency": concurrency,
+                "qps": args.requests / elapsed,
+                "avg_batch": batcher.stats()["avg_batch_size"],
+                **summarize_latencies(latencies),
+            })
+
+    print_table(rows)
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Скорость эмбеддинга фрагментов индексатором при 1, 2, 4, 8 процессах пула.
+
+Для каждого числа процессов поднимает indexer.encode_pool.EncodePool
+(копия модели в каждом процессе, cores // workers потоков torch), ждёт
+загрузки моделей и кодирует фрагменты data/articles.json батчами
+INDEX_BATCH_SIZE, как это делает конвейер index.py:
+- load_s: загрузка моделей во всех процессах
+- chunks_per_s: пропускная способность эмбеддинга
+- speedup: ускорение относительно первой строки
+
+    python -m benchmarks.index_workers
+    python -m benchmarks.index_workers --workers 1,2,4,8 --limit 1024 --batch-size 64
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from app.core.config import get_settings
+from app.utils.cpu_utils import available_cores
+from benchmarks.common import print_table
+from benchmarks.embedding_backends import ARTICLES_PATH
+from indexer.encode_pool import EncodePool
+from indexer.reader import iter_records
+
+
+def _load_chunks(limit: int) -> List[str]:
+    chunks = []
+    for record, _consumed in iter_records(ARTICLES_PATH):
+        chunks.append(record.get("document", ""))
+        if len(chunks) >= limit:
+            break
+    return chunks
+
+
+def _bench(workers: int, chunks: List[str], batch_size: int, backend: str) -> Dict[str, object]:
+    settings = get_settings()
+    started = time.perf_counter()
+    pool = EncodePool(settings.embedding_model_name, backend, workers)
+    try:
+        pool.warmup()
+        load_s = time.perf_counter() - started
+
+        batches = [chunks[start:start + batch_size] for start in range(0, len(chunks), batch_size)]
+        started = time.perf_counter()
+        # Как embed_workers потоков конвейера: каждый ждёт свой процесс
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            encoded = sum(len(vectors) for vectors in executor.map(pool.embed_documents, batches))
+        elapsed = time.perf_counter() - started
+    finally:
+        pool.close()
+
+    return {
+        "workers": workers,
+        "torch_threads": pool.threads,
+        "load_s": load_s,
+        "chunks_per_s": encoded / elapsed,
+    }
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--limit", type=int, default=1024, help="Сколько фрагментов кодировать")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--backend", default=settings.embedding_backend)
+    args = parser.parse_args()
+
+    chunks = _load_chunks(args.limit)
+    print(
+        f"Фрагментов: {len(chunks)}, ядер: {available_cores()}, "
+        f"модель: {settings.embedding_model_name}"
+    )
+
+    rows = []
+    for workers in (int(value) for value in args.workers.split(",")):
+        row = _bench(workers, chunks, args.batch_size, args.backend)
+        row["speedup"] = row["chunks_per_s"] / rows[0]["chunks_per_s"] if rows else 1.0
+        rows.append(row)
+        print_table(rows[-1:])
+    print()
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
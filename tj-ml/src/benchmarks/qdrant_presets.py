@@ -0,0 +1,157 @@
+"""
+Recall / задержка / память пресетов коллекции Qdrant (QDRANT_PRESET).
+
+Берёт векторы из существующей коллекции (по умолчанию tj), для каждого
+пресета создаёт временную коллекцию bench_<пресет>, заливает их туда и
+ждёт построения HNSW. Запросы - зашумлённые векторы корпуса, эталон -
+точный перебор в numpy по fp32:
+- recall@k: доля эталонных top-k, найденных пресетом
+- p50/p95: задержка query_points с search_params пресета
+- est_ram_mb: оценка RAM (векторы + сжатые векторы + граф HNSW),
+  см. QdrantTuning.estimated_ram_bytes
+
+    python -m benchmarks.qdrant_presets
+    python -m benchmarks.qdrant_presets --presets default,memory,disk --queries 200 --k 10
+"""
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from app.core.config import get_settings
+from app.services.qdrant_tuning import QDRANT_PRESETS
+from benchmarks.common import print_table, summarize_latencies
+
+
+def _load_vectors(client: QdrantClient, collection: str, limit: int) -> np.ndarray:
+    vectors: List[List[float]] = []
+    offset = None
+    while len(vectors) < limit:
+        points, offset = client.scroll(
+            collection,
+            limit=min(256, limit - len(vectors)),
+            offset=offset,
+            with_payload=False,
+            with_vectors=True,
+        )
+        vectors.extend(point.vector for point in points)
+        if offset is None:
+            break
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _make_queries(corpus: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    base = corpus[rng.choice(len(corpus), size=count, replace=len(corpus) < count)]
+    queries = base + rng.normal(scale=noise, size=base.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def _wait_indexed(client: QdrantClient, collection: str, timeout: float = 600) -> None:
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection).status != models.CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Collection {collection} is not indexed in {timeout}s")
+        time.sleep(0.5)
+
+
+def _bench_preset(
+    client: QdrantClient,
+    preset: str,
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    k: int,
+    keep: bool,
+) -> Dict[str, object]:
+    tuning = QDRANT_PRESETS[preset]
+    collection = f"bench_{preset}"
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+    client.create_collection(
+        collection,
+        # Строим HNSW даже на маленьком корпусе, иначе Qdrant ищет перебором
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1),
+        **tuning.collection_kwargs(corpus.shape[1]),
+    )
+
+    started = time.perf_counter()
+    for start in range(0, len(corpus), 256):
+        batch = corpus[start:start + 256]
+        client.upsert(
+            collection,
+            points=models.Batch(
+                ids=list(range(start, start + len(batch))),
+                vectors=batch.tolist(),
+            ),
+        )
+    _wait_indexed(client, collection)
+    build_s = time.perf_counter() - started
+
+    params = tuning.search_params()
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        response = client.query_points(
+            collection, query=query.tolist(), limit=k, search_params=params
+        )
+        latencies.append(time.perf_counter() - started)
+        hits += len({point.id for point in response.points} & set(expected.tolist()))
+
+    if not keep:
+        client.delete_collection(collection)
+
+    latency = summarize_latencies(latencies)
+    return {
+        "preset": preset,
+        "quantization": tuning.quantization,
+        f"recall@{k}": hits / (len(queries) * k),
+        "p50_ms": latency["p50_ms"],
+        "p95_ms": latency["p95_ms"],
+        "build_s": build_s,
+        "est_ram_mb": tuning.estimated_ram_bytes(len(corpus), corpus.shape[1]) / 2**20,
+    }
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", default=settings.qdrant_url)
+    parser.add_argument("--source-collection", default=settings.collection_name)
+    parser.add_argument("--presets", default=",".join(QDRANT_PRESETS))
+    parser.add_argument(
+        "--limit", type=int, default=20000, help="Сколько векторов взять из коллекции"
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Не удалять bench_* коллекции")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.url, timeout=120)
+    corpus = _load_vectors(client, args.source_collection, args.limit)
+    print(f"Векторов: {len(corpus)} x {corpus.shape[1]}")
+    queries = _make_queries(corpus, args.queries, args.noise, args.seed)
+    scores = queries @ corpus.T
+    truth = np.argsort(-scores, axis=1)[:, :args.k]
+
+    rows = []
+    for preset in args.presets.split(","):
+        rows.append(
+            _bench_preset(client, preset.strip(), corpus, queries, truth, args.k, args.keep)
+        )
+        print_table(rows[-1:])
+    print()
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
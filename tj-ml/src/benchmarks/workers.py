@@ -0,0 +1,159 @@
+"""
+Пропускная способность и память ML сервиса под gunicorn при 1, 2, 4 воркерах.
+
+Для каждого числа воркеров поднимает `gunicorn -c gunicorn.conf.py`
+с fake LLM без задержек (LLM_PROVIDER=fake), ждёт готовности всех
+воркеров и гоняет /rag/query уникальными вопросами мимо кэшей, так что
+упор идёт в эмбеддинг запроса. Память считается по всем процессам
+(мастер + воркеры):
+- rss_mb: сумма RSS, общие COW страницы посчитаны в каждом процессе
+- pss_mb: сумма PSS, общие страницы поделены между процессами -
+  показывает реальную цену ещё одного воркера
+
+    python -m benchmarks.workers
+    python -m benchmarks.workers --workers 1,2,4 --requests 400 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import print_table
+from benchmarks.concurrency import _load_questions
+
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _children(pid: int) -> List[int]:
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r", encoding="utf-8") as handle:
+            for child in handle.read().split():
+                pids.extend(_children(int(child)))
+    except FileNotFoundError:
+        pass
+    return pids
+
+
+def _memory_mb(pids: List[int]) -> Dict[str, float]:
+    """Суммарные RSS и PSS процессов из /proc/<pid>/smaps_rollup (Linux)."""
+    totals = {"Rss": 0, "Pss": 0}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup", "r", encoding="utf-8") as handle:
+                for line in handle:
+                    key = line.split(":", 1)[0]
+                    if key in totals:
+                        totals[key] += int(line.split()[1])
+        except FileNotFoundError:
+            continue
+    return {"rss_mb": totals["Rss"] / 1024, "pss_mb": totals["Pss"] / 1024}
+
+
+async def _wait_ready(client: httpx.AsyncClient, workers: int, timeout: float) -> None:
+    """Ждёт, пока /ready подряд ответит 200 достаточно раз, чтобы попасть во все воркеры."""
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while streak < workers * 4:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Service is not ready in {timeout}s")
+        try:
+            response = await client.get("/ready")
+            streak = streak + 1 if response.status_code == 200 else 0
+        except httpx.HTTPError:
+            streak = 0
+        if not streak:
+            await asyncio.sleep(0.5)
+
+
+async def _load(client: httpx.AsyncClient, total: int, concurrency: int) -> Dict[str, float]:
+    questions = _load_questions()
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def _one(i: int) -> None:
+        nonlocal errors
+        # Номер в вопросе делает его уникальным - мимо кэша эмбеддингов
+        question = f"{questions[i % len(questions)]} #{i}"
+        async with semaphore:
+            response = await client.post(
+                "/rag/query", json={"question": question, "top_k": 3, "use_cache": False}
+            )
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    return {"qps": total / elapsed, "errors": errors}
+
+
+async def _bench(workers: int, args: argparse.Namespace) -> Dict[str, object]:
+    env = {
+        **os.environ,
+        "ML_WORKERS": str(workers),
+        "ML_BIND": f"127.0.0.1:{args.port}",
+        "LLM_PROVIDER": "fake",
+        "LLM_PROVIDERS": "",
+        "FAKE_LLM_TTFT_MS": "0",
+        "FAKE_LLM_TTFT_SIGMA": "0",
+        "FAKE_LLM_TOKENS_PER_SECOND": "0",
+        "SEMANTIC_CACHE_ENABLED": "false",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"],
+        cwd=SRC_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+            await _wait_ready(client, workers, args.startup_timeout)
+            idle = _memory_mb(_children(process.pid))
+            result = await _load(client, args.requests, args.concurrency)
+            loaded = _memory_mb(_children(process.pid))
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+    return {
+        "workers": workers,
+        "qps": result["qps"],
+        "errors": result["errors"],
+        "idle_rss_mb": idle["rss_mb"],
+        "idle_pss_mb": idle["pss_mb"],
+        "rss_mb": loaded["rss_mb"],
+        "pss_mb": loaded["pss_mb"],
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=18001)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    rows = []
+    for workers in (int(value) for value in args.workers.split(",")):
+        rows.append(await _bench(workers, args))
+        print_table(rows[-1:])
+    print()
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Gunicorn для ML сервиса: несколько uvicorn воркеров с общей моделью.
+
+Модель эмбеддингов грузится в мастере до fork (preload_app + when_ready),
+поэтому её веса делятся воркерами copy-on-write, а не копируются в каждый.
+Воркеру достаётся cores // workers потоков torch, чтобы воркеры
+не дрались за ядра.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+    ML_WORKERS=4 gunicorn -c gunicorn.conf.py app.main:app
+"""
+import gc
+import os
+import shutil
+
+bind = os.getenv("ML_BIND", "0.0.0.0:8001")
+workers = int(os.getenv("ML_WORKERS", "1"))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+# Прогрев воркера (см. app.services.warmup) не держит обработку запросов,
+# но на медленных дисках загрузка мастера может быть долгой
+timeout = int(os.getenv("ML_WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+
+# Метрики prometheus_client в multiprocess режиме пишутся в файлы
+# этого каталога, /metrics любого воркера агрегирует их все.
+# Переменная должна быть выставлена до импорта приложения.
+_metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join("/tmp", "tj_ml_metrics")
+)
+shutil.rmtree(_metrics_dir, ignore_errors=True)
+os.makedirs(_metrics_dir, exist_ok=True)
+
+# Копия объектов приложения в мастере не должна трогаться сборщиком
+# мусора до fork: иначе он пишет в заголовки объектов и рвёт COW
+gc.disable()
+
+
+def when_ready(server):
+    """Мастер: загружаем веса до запуска воркеров и замораживаем кучу."""
+    from app.core.config import get_settings
+    from app.services.embeddings import get_embeddings
+    from app.utils.cpu_utils import torch_threads_per_worker
+
+    # Сессия onnxruntime создаёт пул потоков сразу, а потоки не переживают
+    # fork - такие бэкенды каждый воркер грузит сам при прогреве
+    if get_settings().embedding_backend == "torch":
+        get_embeddings()
+        server.log.info("Embedding model preloaded in master")
+    gc.freeze()
+    server.log.info(
+        "%d workers x %d torch threads",
+        server.cfg.workers,
+        torch_threads_per_worker(server.cfg.workers),
+    )
+
+
+def post_fork(server, worker):
+    from app.utils.cpu_utils import torch_threads_per_worker
+
+    gc.enable()
+    threads = torch_threads_per_worker(server.cfg.workers)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    # Для onnxruntime/BLAS, если они создадут пулы уже в воркере
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
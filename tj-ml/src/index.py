@@ -1,12 +1,38 @@
+import argparse
+import hashlib
 import json
 import os
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set
+
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.documents import Document
 from qdrant_client import QdrantClient
-from qdrant_client.http.exceptions import UnexpectedResponse
+from qdrant_client.http import models
+from app.core.config import parse_flag
+from app.services.local_index import read_local_meta, write_local_index
+from app.services.qdrant_tuning import get_qdrant_tuning
+from app.services.vector_store import INDEX_REVISION_KEY
+from app.utils.token_utils import count_tokens, get_tokenizer_name
+from indexer.bluegreen import (
+    is_plain_collection,
+    migrate_plain_collection,
+    PlainCollectionError,
+    prune_versions,
+    previous_version,
+    resolve_alias,
+    switch_alias,
+    validate_collection,
+    version_name,
+)
+from indexer.checkpoint import IndexCheckpoint, source_key
+from indexer.embedding_store import CachedEmbeddings, EmbeddingStore
+from indexer.encode_pool import EncodePool, create_encoder
+from indexer.pipeline import IndexBatch, run_pipeline
+from indexer.reader import iter_records
 
 
 # Загружаем переменные окружения из .env файла
@@ -16,27 +42,86 @@ load_dotenv()
 QDRANT_URL = os.getenv('QDRANT_URL', 'http://localhost:6333')
 COLLECTION_NAME = os.getenv('QDRANT_COLLECTION', 'tj')
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL_NAME', 'intfloat/multilingual-e5-large')
+# torch | onnx | onnx-int8
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch').lower()
+# qdrant | local (встроенный numpy индекс в LOCAL_INDEX_PATH)
+VECTOR_STORE_BACKEND = os.getenv('VECTOR_STORE_BACKEND', 'qdrant').lower()
+LOCAL_INDEX_PATH = os.getenv(
+    'LOCAL_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'storage', 'local_index'),
+)
+LOCAL_INDEX_BATCH_SIZE = 64
+# incremental - эмбеддит и досылает только новые/изменённые фрагменты
+# и удаляет пропавшие; full - пересоздаёт коллекцию (нужно после смены
+# QDRANT_PRESET, иначе параметры коллекции не поменяются; коллекцию за
+# алиасом не пересоздаёт - для неё есть bluegreen); bluegreen -
+# собирает новую версию рядом с живой и переключает на неё алиас
+# QDRANT_COLLECTION; rollback - возвращает алиас на предыдущую версию
+INDEX_MODES = ('incremental', 'full', 'bluegreen', 'rollback')
+INDEX_MODE = os.getenv('INDEX_MODE', 'incremental').lower()
+# Проверка версии перед переключением алиаса (bluegreen)
+INDEX_MIN_RECALL = float(os.getenv('INDEX_MIN_RECALL', '0.95'))
+INDEX_MAX_SHRINK = float(os.getenv('INDEX_MAX_SHRINK', '0.1'))
+INDEX_VALIDATE_SAMPLES = int(os.getenv('INDEX_VALIDATE_SAMPLES', '50'))
+INDEX_VALIDATE_TIMEOUT = float(os.getenv('INDEX_VALIDATE_TIMEOUT', '1800'))
+INDEX_KEEP_VERSIONS = int(os.getenv('INDEX_KEEP_VERSIONS', '2'))
+# Разрешает bluegreen заменить алиасом старую обычную коллекцию QDRANT_COLLECTION
+# (её данные сначала копируются в версию для отката)
+INDEX_MIGRATE_PLAIN_COLLECTION = parse_flag(os.getenv('INDEX_MIGRATE_PLAIN_COLLECTION', 'false'))
+# Порог построения HNSW после загрузки версии (КБ векторов на сегмент)
+QDRANT_INDEXING_THRESHOLD_KB = int(os.getenv('QDRANT_INDEXING_THRESHOLD_KB', '20000'))
+INDEX_BATCH_SIZE = int(os.getenv('INDEX_BATCH_SIZE', '64'))
+# Параллельных upsert в Qdrant, пока модель считает следующий батч
+INDEX_UPLOAD_WORKERS = int(os.getenv('INDEX_UPLOAD_WORKERS', '2'))
+# Процессов с копией модели (indexer.encode_pool), 1 - модель в этом процессе
+INDEX_ENCODE_WORKERS = int(os.getenv('INDEX_ENCODE_WORKERS', '1'))
+INDEX_CHECKPOINT_PATH = os.getenv(
+    'INDEX_CHECKPOINT_PATH',
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'app', 'storage', 'index_checkpoint.json'
+    ),
+)
+# Векторы уже посчитанных фрагментов: пересборка коллекции (новый пресет,
+# очищенный том Qdrant) упирается в загрузку, а не в модель
+EMBEDDING_STORE_ENABLED = parse_flag(os.getenv('EMBEDDING_STORE_ENABLED', 'true'))
+EMBEDDING_STORE_PATH = os.getenv(
+    'EMBEDDING_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'storage', 'embedding_store'),
+)
+# .json (массив) или .jsonl
+ARTICLES_PATH = os.getenv(
+    'ARTICLES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'articles.json'),
+)
+CONTENT_HASH_KEY = 'content_hash'
+# Не входят в content_hash: статья из нескольких категорий - это один и тот
+# же source_url#chunk_id, и загружается он с категорией первого вхождения
+CONTENT_HASH_IGNORED_METADATA = ('category',)
+
+
+def _record_to_document(item: Dict) -> Document:
+    return Document(
+        page_content=item.get('document', ''),
+        metadata=dict(item.get('metadata', {})),
+    )
+
+
+def _add_token_count(doc: Document, tokenizer_name: str) -> Document:
+    # Число токенов считаем один раз здесь, чтобы на запросе только суммировать
+    doc.metadata['token_count'] = count_tokens(doc.page_content)
+    doc.metadata['tokenizer'] = tokenizer_name
+    return doc
 
 
 def load_articles_from_json(file_path):
     """
-    Загружает статьи из JSON файла и преобразует их в список объектов Document.
+    Загружает статьи из JSON/JSONL файла и преобразует их в список объектов Document.
     """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"Файл {file_path} не найден")
-
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    documents = []
-    for item in data:
-        # Извлекаем текст и метаданные
-        doc = Document(
-            page_content=item.get('document', ''),
-            metadata=item.get('metadata', {})
-        )
-        documents.append(doc)
-    return documents
+    tokenizer_name = get_tokenizer_name()
+    return [
+        _add_token_count(_record_to_document(item), tokenizer_name)
+        for item, _consumed in iter_records(file_path)
+    ]
 
 
 def wait_for_qdrant(url: str, max_retries: int = 30, delay: int = 2) -> bool:
@@ -53,53 +138,420 @@ def wait_for_qdrant(url: str, max_retries: int = 30, delay: int = 2) -> bool:
     return False
 
 
-def check_collection_exists(url: str, collection_name: str) -> bool:
-    """Check if collection already exists and has data."""
-    try:
-        client = QdrantClient(url=url)
-        collection_info = client.get_collection(collection_name)
-        if collection_info.points_count > 0:
-            print(f"Коллекция '{collection_name}' уже существует с {collection_info.points_count} документами")
-            return True
-    except UnexpectedResponse:
-        pass
-    except Exception as e:
-        print(f"Ошибка при проверке коллекции: {e}")
-    return False
+def corpus_hash(path: str) -> str:
+    """sha256 файла корпуса: по нему видно, что локальный индекс устарел."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_local_index(embeddings, articles_path: str) -> None:
+    """
+    Собирает встроенный индекс: vectors.npy + payloads.jsonl + meta.json.
+
+    Индекс пересобирается целиком, если поменялись модель или корпус
+    (corpus_hash в meta.json) либо INDEX_MODE=full.
+    """
+    source_hash = corpus_hash(articles_path)
+    meta = read_local_meta(LOCAL_INDEX_PATH)
+    same_source = meta.get('model') == EMBEDDING_MODEL and meta.get('corpus_hash') == source_hash
+    if 'count' in meta and same_source and INDEX_MODE != 'full':
+        print(
+            f"Локальный индекс '{LOCAL_INDEX_PATH}' уже собран из этого корпуса "
+            f"({meta['count']} документов)"
+        )
+        print("Индексация пропущена - данные уже загружены")
+        return
+
+    documents = load_articles_from_json(articles_path)
+    print(f"Загружено фрагментов: {len(documents)}")
+
+    batches = [
+        [doc.page_content for doc in documents[start:start + LOCAL_INDEX_BATCH_SIZE]]
+        for start in range(0, len(documents), LOCAL_INDEX_BATCH_SIZE)
+    ]
+    vectors = []
+    # map сохраняет порядок батчей; потоков столько же, сколько процессов пула
+    with ThreadPoolExecutor(max_workers=INDEX_ENCODE_WORKERS) as executor:
+        for batch_vectors in executor.map(embeddings.embed_documents, batches):
+            vectors.extend(batch_vectors)
+            print(f"Посчитано эмбеддингов: {len(vectors)}/{len(documents)}")
+
+    # Для пустого корпуса размерность берём у модели: индекс будет (0, dim)
+    dim = len(vectors[0]) if vectors else len(embeddings.embed_query("dimension probe"))
+    meta = write_local_index(
+        LOCAL_INDEX_PATH, documents, vectors, EMBEDDING_MODEL, dim, corpus_hash=source_hash
+    )
+    print(
+        f"Успех! Локальный индекс ({meta['count']} x {meta['dim']}) "
+        f"записан в '{LOCAL_INDEX_PATH}'."
+    )
+
+
+def create_collection(
+    client: QdrantClient, collection_name: str, vector_size: int, **extra: Any
+) -> None:
+    """Пересоздаёт коллекцию с HNSW/квантизацией/on-disk из QDRANT_PRESET и QDRANT_*."""
+    tuning = get_qdrant_tuning()
+    print(f"Параметры коллекции: {tuning}")
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    client.create_collection(collection_name, **tuning.collection_kwargs(vector_size), **extra)
+
+
+def point_id(doc: Document) -> str:
+    """Детерминированный ID точки: uuid5 от source_url#chunk_id."""
+    source_url = doc.metadata.get('source_url')
+    if source_url is None:
+        key = 'text:' + hashlib.sha1(doc.page_content.encode('utf-8')).hexdigest()
+    else:
+        key = f"{source_url}#{doc.metadata.get('chunk_id', 0)}"
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def content_hash(doc: Document) -> str:
+    """
+    Хэш текста, метаданных, модели и токенайзера: меняется - фрагмент
+    надо переэмбеддить. Считается до token_count, чтобы неизменённые
+    фрагменты не прогонять через токенайзер. Поля, которые различаются
+    у повторов одного фрагмента (CONTENT_HASH_IGNORED_METADATA), не
+    учитываются, иначе такие фрагменты перезагружались бы каждый запуск.
+    """
+    metadata = {
+        key: value
+        for key, value in doc.metadata.items()
+        if key not in CONTENT_HASH_IGNORED_METADATA
+    }
+    raw = json.dumps(
+        {
+            'model': EMBEDDING_MODEL,
+            'tokenizer': get_tokenizer_name(),
+            'text': doc.page_content,
+            'metadata': metadata,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def collection_matches(client: QdrantClient, collection_name: str, vector_size: int) -> bool:
+    """Коллекция есть и рассчитана на векторы нужной размерности."""
+    if not client.collection_exists(collection_name):
+        return False
+    vectors = client.get_collection(collection_name).config.params.vectors
+    return getattr(vectors, 'size', None) == vector_size
+
+
+def fetch_index_state(client: QdrantClient, collection_name: str) -> Dict[str, str]:
+    """ID точек коллекции и их content_hash (без векторов)."""
+    state = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name,
+            limit=1024,
+            offset=offset,
+            with_payload=[CONTENT_HASH_KEY],
+            with_vectors=False,
+        )
+        for point in points:
+            state[str(point.id)] = (point.payload or {}).get(CONTENT_HASH_KEY)
+        if offset is None:
+            return state
+
+
+def iter_changed_batches(
+    articles_path: str, existing: Dict[str, str], seen: Set[str], resume_from: int = 0
+) -> Iterator[IndexBatch]:
+    """
+    Потоково читает корпус и отдаёт батчи новых и изменённых фрагментов.
+
+    existing - content_hash точек коллекции по ID, дополняется загружаемыми:
+    повтор того же source_url#chunk_id (статья в нескольких категориях)
+    грузится один раз. В seen попадают ID всех фрагментов корпуса. Первые
+    resume_from записей уже загружены прошлым запуском (чекпоинт) и не
+    сравниваются.
+    """
+    tokenizer_name = get_tokenizer_name()
+    ids: List[str] = []
+    hashes: List[str] = []
+    documents: List[Document] = []
+    seq = 0
+    for record_no, (item, consumed) in enumerate(iter_records(articles_path), 1):
+        doc = _record_to_document(item)
+        pid = point_id(doc)
+        seen.add(pid)
+        if record_no <= resume_from:
+            continue
+        doc_hash = content_hash(doc)
+        if existing.get(pid) == doc_hash:
+            continue
+        existing[pid] = doc_hash
+        ids.append(pid)
+        hashes.append(doc_hash)
+        documents.append(_add_token_count(doc, tokenizer_name))
+        if len(documents) >= INDEX_BATCH_SIZE:
+            yield IndexBatch(seq, ids, hashes, documents, record_no, consumed)
+            seq += 1
+            ids, hashes, documents = [], [], []
+    if documents:
+        yield IndexBatch(seq, ids, hashes, documents, record_no, consumed)
+
+
+def sync_collection(
+    client: QdrantClient,
+    embeddings,
+    collection_name: str,
+    articles_path: str,
+    checkpoint: Optional[IndexCheckpoint] = None,
+    resume_from: int = 0,
+) -> Dict[str, int]:
+    """
+    Досылает в коллекцию новые/изменённые фрагменты и удаляет пропавшие.
+
+    Чтение, эмбеддинг и загрузка идут конвейером (indexer.pipeline),
+    после каждого подтверждённого батча обновляется чекпоинт.
+    Возвращает число фрагментов корпуса (points), загруженных и удалённых.
+    """
+    existing = fetch_index_state(client, collection_name)
+    print(f"В коллекции: {len(existing)}")
+    seen: Set[str] = set()
+
+    def _upload(batch: IndexBatch) -> None:
+        client.upsert(
+            collection_name,
+            points=[
+                models.PointStruct(
+                    id=pid,
+                    vector=list(vector),
+                    payload={
+                        QdrantVectorStore.CONTENT_KEY: doc.page_content,
+                        QdrantVectorStore.METADATA_KEY: doc.metadata,
+                        CONTENT_HASH_KEY: doc_hash,
+                    },
+                )
+                for pid, doc_hash, doc, vector in zip(
+                    batch.ids, batch.hashes, batch.documents, batch.vectors
+                )
+            ],
+            wait=True,
+        )
+
+    def _commit(batch: IndexBatch) -> None:
+        if checkpoint is not None:
+            checkpoint.save(batch.end_record)
+
+    progress = run_pipeline(
+        iter_changed_batches(articles_path, existing, seen, resume_from),
+        embed=embeddings.embed_documents,
+        upload=_upload,
+        on_commit=_commit,
+        total_bytes=os.path.getsize(articles_path),
+        upload_workers=INDEX_UPLOAD_WORKERS,
+        embed_workers=INDEX_ENCODE_WORKERS,
+    )
+
+    # Удаляем после загрузки: пока идёт синхронизация, поиск не теряет статьи
+    removed = [pid for pid in existing if pid not in seen]
+    print(f"Удаляем пропавшие фрагменты: {len(removed)}")
+    for start in range(0, len(removed), 1024):
+        client.delete(
+            collection_name,
+            points_selector=models.PointIdsList(points=removed[start:start + 1024]),
+        )
+    if progress.uploaded or removed:
+        # Число точек могло не измениться - по метке ML сервис сбрасывает кэши
+        client.update_collection(collection_name, metadata={INDEX_REVISION_KEY: time.time()})
+    return {'points': len(seen), 'uploaded': progress.uploaded, 'removed': len(removed)}
+
+
+def reindex_bluegreen(
+    client: QdrantClient,
+    embeddings,
+    articles_path: str,
+    vector_size: int,
+    migrate_plain: bool = False,
+) -> None:
+    """
+    Собирает новую версию коллекции, проверяет её и переключает алиас.
+
+    Живая версия обслуживает поиск всё это время. Упавшая или не прошедшая
+    проверку сборка остаётся в Qdrant для разбора и удаляется следующей
+    успешной сборкой. Если QDRANT_COLLECTION - ещё обычная коллекция,
+    без migrate_plain сборка не начинается, а с ним коллекция сначала
+    копируется в версию - цель отката.
+    """
+    plain = is_plain_collection(client, COLLECTION_NAME)
+    if plain and not migrate_plain:
+        raise PlainCollectionError(
+            f"'{COLLECTION_NAME}' is a plain collection. Run with "
+            f"INDEX_MIGRATE_PLAIN_COLLECTION=true or --migrate-plain-collection to copy it "
+            f"into a version and replace it with an alias"
+        )
+    live = migrate_plain_collection(client, COLLECTION_NAME) if plain else resolve_alias(
+        client, COLLECTION_NAME
+    )
+    live_points = client.count(live, exact=True).count if live else None
+    collection = version_name(COLLECTION_NAME, after=live)
+    print(f"Живая версия: '{live}' ({live_points} точек), собираем '{collection}'")
+
+    # HNSW строим одним проходом после загрузки: меньше нагрузки на узел,
+    # который в это время обслуживает поиск по живой версии
+    create_collection(
+        client, collection, vector_size,
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0),
+    )
+    stats = sync_collection(client, embeddings, collection, articles_path)
+    client.update_collection(
+        collection,
+        optimizers_config=models.OptimizersConfigDiff(
+            indexing_threshold=QDRANT_INDEXING_THRESHOLD_KB
+        ),
+    )
+    validate_collection(
+        client,
+        collection,
+        expected_points=stats['points'],
+        live_points=live_points,
+        min_recall=INDEX_MIN_RECALL,
+        max_shrink=INDEX_MAX_SHRINK,
+        samples=INDEX_VALIDATE_SAMPLES,
+        search_params=get_qdrant_tuning().search_params(),
+        timeout=INDEX_VALIDATE_TIMEOUT,
+    )
+    switch_alias(client, COLLECTION_NAME, collection, replace_collection=plain)
+    print(f"Алиас '{COLLECTION_NAME}' переключён: '{live}' -> '{collection}'")
+    for name in prune_versions(client, COLLECTION_NAME, INDEX_KEEP_VERSIONS):
+        print(f"Удалена старая версия '{name}'")
+
+
+def reindex_in_place(
+    client: QdrantClient, embeddings, articles_path: str, vector_size: int
+) -> None:
+    """
+    incremental и full: меняет живую коллекцию на месте (за алиасом - его версию).
+
+    Пересоздать версию за алиасом нельзя: delete_collection удаляет её вместе
+    с алиасом, и ML сервис остался бы без коллекции. Такой индекс
+    пересобирается только через INDEX_MODE=bluegreen.
+    """
+    live = resolve_alias(client, COLLECTION_NAME)
+    collection = live or COLLECTION_NAME
+    checkpoint = IndexCheckpoint(
+        INDEX_CHECKPOINT_PATH,
+        source_key(articles_path, collection=collection, model=EMBEDDING_MODEL),
+    )
+    resume_from = checkpoint.load()
+    matches = collection_matches(client, collection, vector_size)
+    if resume_from and matches:
+        # Прошлый запуск упал: коллекцию не пересоздаём даже в режиме full
+        print(f"Продолжаем с чекпоинта: {resume_from} записей корпуса уже загружено")
+    else:
+        resume_from = 0
+        if INDEX_MODE == 'full' or not matches:
+            if live is not None:
+                reason = "INDEX_MODE=full" if matches else "vector size changed"
+                raise ValueError(
+                    f"'{COLLECTION_NAME}' is an alias for '{live}' ({reason}); "
+                    f"rebuild it with INDEX_MODE=bluegreen"
+                )
+            create_collection(client, collection, vector_size)
+    sync_collection(client, embeddings, collection, articles_path, checkpoint, resume_from)
+    checkpoint.clear()
+
+
+def rollback(client: QdrantClient) -> None:
+    """Возвращает алиас на предыдущую версию коллекции."""
+    live = resolve_alias(client, COLLECTION_NAME)
+    previous = previous_version(client, COLLECTION_NAME, live)
+    if previous is None:
+        raise ValueError(
+            f"No previous version of '{COLLECTION_NAME}' to roll back to (live: {live})"
+        )
+    switch_alias(client, COLLECTION_NAME, previous)
+    print(f"Алиас '{COLLECTION_NAME}' возвращён: '{live}' -> '{previous}'")
+
+
+def _report_store(store: Optional[EmbeddingStore]) -> None:
+    if store is not None:
+        print(
+            f"Кэш эмбеддингов: {store.hits} из кэша, {store.misses} посчитано моделью, "
+            f"всего {len(store)} векторов"
+        )
 
 
 def main():
-    print(f"Загрузка модели эмбеддингов {EMBEDDING_MODEL}...")
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    if INDEX_MODE not in INDEX_MODES:
+        raise ValueError(
+            f"Unsupported INDEX_MODE: {INDEX_MODE}. Supported: {', '.join(INDEX_MODES)}"
+        )
+    parser = argparse.ArgumentParser(description="Индексация корпуса статей")
+    parser.add_argument(
+        '--migrate-plain-collection',
+        action='store_true',
+        default=INDEX_MIGRATE_PLAIN_COLLECTION,
+        help="bluegreen: скопировать обычную коллекцию QDRANT_COLLECTION в версию "
+             "и заменить её алиасом",
+    )
+    args = parser.parse_args()
+
+    if INDEX_MODE == 'rollback':
+        # Модель для отката не нужна
+        if not wait_for_qdrant(QDRANT_URL):
+            print("Ошибка: Qdrant не доступен")
+            return
+        rollback(QdrantClient(url=QDRANT_URL))
+        return
+
+    print(f"Загрузка модели эмбеддингов {EMBEDDING_MODEL} ({EMBEDDING_BACKEND})...")
+    embeddings = create_encoder(EMBEDDING_MODEL, EMBEDDING_BACKEND, INDEX_ENCODE_WORKERS)
+    if not isinstance(embeddings, EncodePool):
+        run_indexing(embeddings, args.migrate_plain_collection)
+        return
+    print(f"Пул эмбеддинга: {embeddings.workers} процессов x {embeddings.threads} потоков torch")
+    try:
+        run_indexing(embeddings, args.migrate_plain_collection)
+    finally:
+        embeddings.close()
 
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    articles_path = os.path.join(current_dir, 'data', 'articles.json')
 
+def run_indexing(embeddings, migrate_plain: bool = False) -> None:
+    store = None
+    if EMBEDDING_STORE_ENABLED:
+        # onnx-int8 даёт немного другие векторы - у каждого бэкенда свой кэш
+        store = EmbeddingStore(EMBEDDING_STORE_PATH, f"{EMBEDDING_MODEL}@{EMBEDDING_BACKEND}")
+        print(f"Кэш эмбеддингов: {len(store)} векторов в '{store.path}'")
+        embeddings = CachedEmbeddings(embeddings, store)
+
+    articles_path = ARTICLES_PATH
     print(f"Читаем данные из: {articles_path}")
 
+    if VECTOR_STORE_BACKEND == 'local':
+        build_local_index(embeddings, articles_path)
+        _report_store(store)
+        return
+
     # Wait for Qdrant to be ready
     if not wait_for_qdrant(QDRANT_URL):
         print("Ошибка: Qdrant не доступен")
         return
 
-    # Check if already indexed
-    if check_collection_exists(QDRANT_URL, COLLECTION_NAME):
-        print("Индексация пропущена - данные уже загружены")
-        return
-
     try:
-        documents = load_articles_from_json(articles_path)
-        print(f"Загружено фрагментов: {len(documents)}")
+        print(f"Подключение к Qdrant ({QDRANT_URL}), режим {INDEX_MODE}...")
 
-        print(f"Подключение к Qdrant ({QDRANT_URL}) и загрузка векторов...")
+        client = QdrantClient(url=QDRANT_URL)
+        vector_size = len(embeddings.embed_query("dimension probe"))
+        if INDEX_MODE == 'bluegreen':
+            reindex_bluegreen(client, embeddings, articles_path, vector_size, migrate_plain)
+            _report_store(store)
+            print(f"Успех! Данные загружены в коллекцию '{COLLECTION_NAME}'.")
+            return
 
-        QdrantVectorStore.from_documents(
-            documents=documents,
-            embedding=embeddings,
-            url=QDRANT_URL,
-            collection_name=COLLECTION_NAME,
-            force_recreate=True
-        )
+        reindex_in_place(client, embeddings, articles_path, vector_size)
+        _report_store(store)
 
         print(f"Успех! Данные загружены в коллекцию '{COLLECTION_NAME}'.")
 
@@ -0,0 +1 @@
+"""Потоковая индексация корпуса статей в векторное хранилище (см. index.py)."""
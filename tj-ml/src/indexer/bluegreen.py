@@ -0,0 +1,230 @@
+"""
+Blue/green переиндексация через алиасы Qdrant.
+
+QDRANT_COLLECTION (tj) - алиас на версию tj_v<YYYYmmddHHMMSS>. Новая версия
+собирается рядом с живой, проверяется и подключается одной атомарной
+операцией над алиасами. Предыдущая версия остаётся для отката.
+
+Переход со старой схемы, где tj - обычная коллекция, выполняется только
+по явному запросу (migrate_plain_collection): данные сначала копируются
+в версию, чтобы было куда откатиться.
+"""
+import random
+import re
+import time
+from typing import List, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+
+class IndexValidationError(Exception):
+    """Новая версия коллекции не прошла проверку - алиас не переключаем."""
+
+
+class PlainCollectionError(Exception):
+    """На месте алиаса обычная коллекция, а миграция не разрешена."""
+
+
+def version_name(alias: str, after: Optional[str] = None) -> str:
+    """Имя новой версии по текущему времени; строго новее after, если он задан."""
+    name = f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}"
+    while after is not None and name <= after:
+        time.sleep(1)
+        name = f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}"
+    return name
+
+
+def resolve_alias(client: QdrantClient, alias: str) -> Optional[str]:
+    """Коллекция за алиасом или None, если такого алиаса нет."""
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+def list_versions(client: QdrantClient, alias: str) -> List[str]:
+    """Версии алиаса от старой к новой (имя содержит время сборки)."""
+    pattern = re.compile(rf"^{re.escape(alias)}_v\d{{14}}$")
+    return sorted(
+        collection.name
+        for collection in client.get_collections().collections
+        if pattern.match(collection.name)
+    )
+
+
+def is_plain_collection(client: QdrantClient, alias: str) -> bool:
+    """Имя alias занято обычной коллекцией, а не алиасом."""
+    return resolve_alias(client, alias) is None and client.collection_exists(alias)
+
+
+def copy_collection(
+    client: QdrantClient, source: str, target: str, batch_size: int = 256
+) -> int:
+    """Копирует точки source (векторы и payload) в новую коллекцию с теми же параметрами."""
+    config = client.get_collection(source).config
+    client.create_collection(
+        target,
+        vectors_config=config.params.vectors,
+        hnsw_config=models.HnswConfigDiff(**config.hnsw_config.model_dump()),
+        quantization_config=config.quantization_config,
+        on_disk_payload=config.params.on_disk_payload,
+    )
+    copied = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            source, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+        )
+        if points:
+            client.upsert(
+                target,
+                points=[
+                    models.PointStruct(id=point.id, vector=point.vector, payload=point.payload)
+                    for point in points
+                ],
+                wait=True,
+            )
+            copied += len(points)
+        if offset is None:
+            break
+    expected = client.count(source, exact=True).count
+    if client.count(target, exact=True).count != expected:
+        raise IndexValidationError(f"Copy of {source} into {target} is incomplete")
+    return copied
+
+
+def migrate_plain_collection(client: QdrantClient, alias: str) -> str:
+    """
+    Копирует обычную коллекцию alias в версию alias_v<время> и возвращает её имя.
+
+    Саму коллекцию не трогает: поиск идёт по ней, пока switch_alias не
+    заменит её алиасом, а копия становится целью отката.
+    """
+    target = version_name(alias)
+    copied = copy_collection(client, alias, target)
+    print(f"Коллекция '{alias}' скопирована в '{target}' ({copied} точек)")
+    return target
+
+
+def switch_alias(
+    client: QdrantClient, alias: str, collection: str, replace_collection: bool = False
+) -> None:
+    """
+    Перевешивает алиас на collection одним запросом - поиск не видит промежутка.
+
+    Если alias - обычная коллекция, она удаляется только с replace_collection
+    (после migrate_plain_collection). Между удалением и созданием алиаса
+    поиск несколько миллисекунд не находит коллекцию - это единственный
+    такой переход, дальше переключения атомарны.
+    """
+    operations = []
+    if resolve_alias(client, alias) is not None:
+        operations.append(
+            models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias))
+        )
+    elif client.collection_exists(alias):
+        if not replace_collection:
+            raise PlainCollectionError(
+                f"'{alias}' is a plain collection; migrate it first "
+                f"(INDEX_MIGRATE_PLAIN_COLLECTION=true or --migrate-plain-collection)"
+            )
+        print(f"Коллекция '{alias}' заменяется алиасом на '{collection}'")
+        client.delete_collection(alias)
+    operations.append(
+        models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=collection, alias_name=alias)
+        )
+    )
+    client.update_collection_aliases(change_aliases_operations=operations)
+
+
+def previous_version(client: QdrantClient, alias: str, live: Optional[str]) -> Optional[str]:
+    """Самая новая версия старше живой - цель отката."""
+    older = [name for name in list_versions(client, alias) if live is None or name < live]
+    return older[-1] if older else None
+
+
+def prune_versions(client: QdrantClient, alias: str, keep: int = 2) -> List[str]:
+    """
+    Удаляет старые версии: остаются живая и keep - 1 предыдущих.
+
+    Версии новее живой (недостроенные или после отката) тоже удаляются.
+    """
+    live = resolve_alias(client, alias)
+    versions = list_versions(client, alias)
+    if live not in versions:
+        return []
+    kept = set(versions[max(0, versions.index(live) - keep + 1):versions.index(live) + 1])
+    removed = [name for name in versions if name not in kept]
+    for name in removed:
+        client.delete_collection(name)
+    return removed
+
+
+def wait_indexed(client: QdrantClient, collection: str, timeout: float) -> None:
+    """Ждёт, пока оптимизатор достроит HNSW (статус green)."""
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection).status != models.CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise IndexValidationError(f"Collection {collection} is not indexed in {timeout:.0f}s")
+        time.sleep(1)
+
+
+def self_recall(
+    client: QdrantClient,
+    collection: str,
+    samples: int,
+    k: int,
+    search_params: models.SearchParams,
+    seed: int = 0,
+) -> float:
+    """
+    Доля случайных точек, которые находятся в top-k по собственному вектору.
+
+    Ловит битый граф HNSW, слишком агрессивную квантизацию и мусорные векторы.
+    """
+    points, _offset = client.scroll(collection, limit=max(samples * 20, 1000), with_vectors=True)
+    if not points:
+        return 0.0
+    sample = random.Random(seed).sample(points, min(samples, len(points)))
+    hits = 0
+    for point in sample:
+        response = client.query_points(
+            collection, query=point.vector, limit=k, search_params=search_params
+        )
+        hits += any(found.id == point.id for found in response.points)
+    return hits / len(sample)
+
+
+def validate_collection(
+    client: QdrantClient,
+    collection: str,
+    expected_points: int,
+    live_points: Optional[int],
+    min_recall: float,
+    max_shrink: float,
+    samples: int,
+    search_params: models.SearchParams,
+    timeout: float,
+) -> None:
+    """
+    Проверяет новую версию перед переключением алиаса.
+
+    - все фрагменты корпуса загружены (число точек == expected_points)
+    - версия не меньше живой больше чем на max_shrink (обрезанный корпус)
+    - self-recall@10 по samples случайным точкам не ниже min_recall
+    """
+    wait_indexed(client, collection, timeout)
+    points = client.count(collection, exact=True).count
+    if points != expected_points:
+        raise IndexValidationError(f"{collection}: {points} points, expected {expected_points}")
+    if live_points and points < live_points * (1 - max_shrink):
+        raise IndexValidationError(
+            f"{collection}: {points} points vs {live_points} in the live collection "
+            f"(shrink over {max_shrink:.0%})"
+        )
+    recall = self_recall(client, collection, samples, 10, search_params)
+    print(f"Проверка '{collection}': {points} точек, self-recall@10 = {recall:.3f}")
+    if recall < min_recall:
+        raise IndexValidationError(f"{collection}: self-recall@10 {recall:.3f} < {min_recall}")
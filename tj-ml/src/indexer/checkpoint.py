@@ -0,0 +1,52 @@
+"""Чекпоинт индексации: сколько записей корпуса уже лежит в коллекции."""
+import json
+import os
+from typing import Any, Dict
+
+
+class IndexCheckpoint:
+    """
+    Файл с числом записей корпуса (с начала файла), уже загруженных в коллекцию.
+
+    Чекпоинт действителен только для того же ключа: файл корпуса (размер
+    и mtime), коллекция, модель. Иначе индексатор начинает сначала.
+    """
+
+    def __init__(self, path: str, key: Dict[str, Any]):
+        self.path = path
+        self.key = key
+
+    def load(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+        except ValueError:
+            return 0
+        if payload.get("key") != self.key:
+            return 0
+        return int(payload.get("committed", 0))
+
+    def save(self, committed: int) -> None:
+        # Временный файл + os.replace: падение посреди записи не портит чекпоинт
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump({"key": self.key, "committed": committed}, handle, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def source_key(path: str, **extra: Any) -> Dict[str, Any]:
+    """Ключ чекпоинта: путь, размер и mtime файла корпуса плюс extra."""
+    stat = os.stat(path)
+    return {
+        "source": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        **extra,
+    }
@@ -0,0 +1,153 @@
+"""
+Постоянный кэш эмбеддингов фрагментов на диске для индексатора.
+
+Ключ - (модель, sha256 текста). Для каждой модели свой каталог:
+- vectors.f32 - float32 матрица без заголовка, читается через memory map
+- keys.bin - sha256 текста строки i матрицы (по 32 байта)
+- meta.json - модель и размерность
+
+Оба файла только дописываются: сначала вектор, потом ключ. Если процесс
+упал между ними, лишний хвост обрезается при следующем открытии.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+VECTORS_FILE = "vectors.f32"
+KEYS_FILE = "keys.bin"
+META_FILE = "meta.json"
+KEY_BYTES = 32
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """Дописываемая memmap матрица эмбеддингов с индексом по хэшу текста."""
+
+    def __init__(self, root: str, model_name: str):
+        self.model_name = model_name
+        self.path = os.path.join(root, re.sub(r"[^\w.-]+", "_", model_name))
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, VECTORS_FILE)
+        self._keys_path = os.path.join(self.path, KEYS_FILE)
+        self._meta_path = os.path.join(self.path, META_FILE)
+        self.dim: Optional[int] = None
+        self._rows: Dict[bytes, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, "r", encoding="utf-8") as handle:
+            meta = json.load(handle)
+        if meta.get("model") != self.model_name:
+            raise ValueError(
+                f"Embedding store {self.path} belongs to {meta.get('model')}, not {self.model_name}"
+            )
+        self.dim = int(meta["dim"])
+        keys = b""
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, "rb") as handle:
+                keys = handle.read()
+        vector_rows = 0
+        if os.path.exists(self._vectors_path):
+            vector_rows = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        rows = min(len(keys) // KEY_BYTES, vector_rows)
+        # Недописанная последняя строка после падения
+        self._truncate(self._keys_path, rows * KEY_BYTES)
+        self._truncate(self._vectors_path, rows * self.dim * 4)
+        for row in range(rows):
+            self._rows[keys[row * KEY_BYTES:(row + 1) * KEY_BYTES]] = row
+
+    @staticmethod
+    def _truncate(path: str, size: int) -> None:
+        if os.path.exists(path) and os.path.getsize(path) != size:
+            with open(path, "r+b") as handle:
+                handle.truncate(size)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _matrix_rows(self, needed: int) -> np.memmap:
+        # Файл растёт по мере append - перемапливаем, когда нужна новая строка
+        if self._matrix is None or self._matrix.shape[0] < needed:
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(len(self._rows), self.dim)
+            )
+        return self._matrix
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Векторы по текстам, None - если текста в кэше нет."""
+        rows = [self._rows.get(text_key(text)) for text in texts]
+        found = [row for row in rows if row is not None]
+        if not found:
+            return [None] * len(texts)
+        matrix = self._matrix_rows(max(found) + 1)
+        return [None if row is None else np.array(matrix[row]) for row in rows]
+
+    def add_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        pending = {}
+        for text, vector in zip(texts, vectors):
+            key = text_key(text)
+            if key not in self._rows:
+                pending[key] = vector
+        if not pending:
+            return
+        matrix = np.asarray(list(pending.values()), dtype=np.float32)
+        if self.dim is None:
+            self.dim = int(matrix.shape[1])
+            with open(self._meta_path, "w", encoding="utf-8") as handle:
+                json.dump({"model": self.model_name, "dim": self.dim}, handle)
+        if matrix.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim {matrix.shape[1]} != store dim {self.dim}")
+        with open(self._vectors_path, "ab") as handle:
+            handle.write(matrix.tobytes())
+        with open(self._keys_path, "ab") as handle:
+            handle.write(b"".join(pending))
+        for key in pending:
+            self._rows[key] = len(self._rows)
+
+
+class CachedEmbeddings:
+    """
+    Обёртка над моделью эмбеддингов: embed_documents сначала смотрит
+    в EmbeddingStore и считает моделью только промахи.
+
+    Можно звать из нескольких потоков: под замком только работа с кэшем,
+    сама модель считает параллельно.
+    """
+
+    def __init__(self, base, store: EmbeddingStore):
+        self.base = base
+        self.store = store
+        self._lock = threading.Lock()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            cached = self.store.get_many(texts)
+            missing = [i for i, vector in enumerate(cached) if vector is None]
+            self.store.hits += len(texts) - len(missing)
+            self.store.misses += len(missing)
+        if missing:
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            computed = self.base.embed_documents(unique)
+            with self._lock:
+                self.store.add_many(unique, computed)
+            by_text = dict(zip(unique, computed))
+            for i in missing:
+                cached[i] = np.asarray(by_text[texts[i]], dtype=np.float32)
+        return [vector.tolist() for vector in cached]
@@ -0,0 +1,108 @@
+"""
+Пул процессов для эмбеддинга фрагментов при индексации.
+
+Один процесс sentence-transformers упирается в несколько ядер: на малых
+батчах torch плохо параллелит матричные операции. Пул держит по копии
+модели в каждом процессе и cores // workers потоков torch на процесс,
+так что все ядра заняты, а потоки процессов не дерутся между собой.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from app.utils.cpu_utils import torch_threads_per_worker
+
+
+_model = None
+
+
+def _default_factory(model_name: str, backend: str) -> Any:
+    from app.services.embeddings import create_base_embeddings
+
+    return create_base_embeddings(model_name, backend)
+
+
+def _init_worker(
+    model_name: str, backend: str, threads: int, factory: Callable[[str, str], Any]
+) -> None:
+    # torch здесь уже загружен: spawn импортирует index.py как __mp_main__,
+    # а он - app.services.embeddings. Воркер только ограничивает число потоков
+    # через torch.set_num_threads; OMP_NUM_THREADS - для пулов, создаваемых позже
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    global _model
+    _model = factory(model_name, backend)
+
+
+def _embed_documents(texts: List[str]) -> List[List[float]]:
+    return _model.embed_documents(texts)
+
+
+def _embed_query(text: str) -> List[float]:
+    return _model.embed_query(text)
+
+
+class EncodePool:
+    """
+    Модель эмбеддингов поверх пула процессов (интерфейс как у Embeddings).
+
+    embed_documents блокирует вызывающий поток до ответа одного процесса,
+    поэтому параллельность даёт вызов из нескольких потоков - так делает
+    indexer.pipeline при embed_workers > 1.
+
+    factory(model_name, backend) создаёт модель в каждом процессе; это
+    функция уровня модуля, потому что spawn передаёт её по имени.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        backend: str,
+        workers: int,
+        threads: Optional[int] = None,
+        factory: Callable[[str, str], Any] = _default_factory,
+    ):
+        self.workers = workers
+        self.threads = threads or torch_threads_per_worker(workers)
+        # spawn, а не fork: форк процесса с уже запущенными потоками
+        # torch/OpenMP может зависнуть
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, backend, self.threads, factory),
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._executor.submit(_embed_documents, texts).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._executor.submit(_embed_query, text).result()
+
+    def warmup(self) -> None:
+        """Дожидается загрузки модели во всех процессах."""
+        futures = [self._executor.submit(_embed_query, "warmup") for _ in range(self.workers * 2)]
+        for future in futures:
+            future.result()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def create_encoder(
+    model_name: str,
+    backend: str,
+    workers: int,
+    factory: Callable[[str, str], Any] = _default_factory,
+) -> Any:
+    """Модель эмбеддингов индексатора: в этом процессе при workers <= 1, иначе EncodePool."""
+    if workers <= 1:
+        return factory(model_name, backend)
+    return EncodePool(model_name, backend, workers, factory=factory)
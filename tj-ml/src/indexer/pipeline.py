@@ -0,0 +1,241 @@
+"""
+Конвейер индексации: чтение -> эмбеддинг -> загрузка, стадии идут параллельно.
+
+Стадии связаны очередями ограниченной длины, поэтому в памяти одновременно
+не больше нескольких батчей, а медленная стадия притормаживает быстрые.
+Эмбеддинг и загрузка идут в несколько потоков, но в загрузку батчи
+уходят, а подтверждаются (on_commit) строго по порядку - это позволяет
+писать чекпоинт по номеру записи.
+"""
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from langchain_core.documents import Document
+
+
+_DONE = object()
+
+
+@dataclass
+class IndexBatch:
+    seq: int
+    ids: List[str]
+    hashes: List[str]
+    documents: List[Document]
+    # Сколько записей и байт корпуса прочитано к концу батча
+    end_record: int
+    end_bytes: int
+    vectors: Optional[List[List[float]]] = None
+
+
+class IndexProgress:
+    """Счётчики конвейера и периодический отчёт: скорость, доля корпуса, ETA."""
+
+    def __init__(self, total_bytes: int, report_seconds: float):
+        self.total_bytes = total_bytes
+        self.report_seconds = report_seconds
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.embedded = 0
+        self.uploaded = 0
+        self.committed_records = 0
+        self.committed_bytes = 0
+        self.embed_seconds = 0.0
+        self.upload_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_embed(self, count: int, seconds: float) -> None:
+        with self._lock:
+            self.embedded += count
+            self.embed_seconds += seconds
+
+    def add_upload(self, count: int, seconds: float) -> None:
+        with self._lock:
+            self.uploaded += count
+            self.upload_seconds += seconds
+
+    def commit(self, batch: IndexBatch) -> None:
+        self.committed_records = batch.end_record
+        self.committed_bytes = batch.end_bytes
+        now = time.monotonic()
+        if now - self.last_report >= self.report_seconds:
+            self.last_report = now
+            print(self.summary())
+
+    def summary(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        share = self.committed_bytes / self.total_bytes if self.total_bytes else 1.0
+        eta = elapsed * (1 - share) / share if share else float("inf")
+        return (
+            f"Записей: {self.committed_records} ({share:.0%} корпуса), "
+            f"загружено фрагментов: {self.uploaded}, {self.uploaded / elapsed:.1f} фрагм/с, "
+            f"эмбеддинг {self.embed_seconds:.0f}с / загрузка {self.upload_seconds:.0f}с, "
+            f"осталось ~{eta:.0f}с"
+        )
+
+    def final_summary(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (
+            f"Загружено фрагментов: {self.uploaded} за {elapsed:.1f}с "
+            f"({self.uploaded / elapsed:.1f} фрагм/с, "
+            f"эмбеддинг {self.embed_seconds:.0f}с / загрузка {self.upload_seconds:.0f}с)"
+        )
+
+    def to_dict(self) -> Dict[str, float]:
+        elapsed = time.monotonic() - self.started
+        return {
+            "records": self.committed_records,
+            "chunks": self.uploaded,
+            "seconds": elapsed,
+            "chunks_per_second": self.uploaded / elapsed if elapsed else 0.0,
+        }
+
+
+class _Reorder:
+    """Выпускает батчи строго по seq, сколько бы потоков их ни сдавало."""
+
+    def __init__(self, release: Callable[[IndexBatch], None]):
+        self._release = release
+        self._lock = threading.Lock()
+        self._pending: Dict[int, IndexBatch] = {}
+        self._next_seq = 0
+
+    def add(self, batch: IndexBatch) -> None:
+        with self._lock:
+            self._pending[batch.seq] = batch
+            while self._next_seq in self._pending:
+                self._release(self._pending.pop(self._next_seq))
+                self._next_seq += 1
+
+
+class _Stop(Exception):
+    """Другая стадия упала - текущая выходит без своей ошибки."""
+
+
+def _put(target: "queue.Queue", item, stop: threading.Event) -> None:
+    while True:
+        if stop.is_set():
+            raise _Stop()
+        try:
+            target.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(source: "queue.Queue", stop: threading.Event):
+    while True:
+        if stop.is_set():
+            raise _Stop()
+        try:
+            return source.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+
+def run_pipeline(
+    batches: Iterable[IndexBatch],
+    embed: Callable[[List[str]], List[List[float]]],
+    upload: Callable[[IndexBatch], None],
+    on_commit: Callable[[IndexBatch], None],
+    total_bytes: int,
+    upload_workers: int = 2,
+    embed_workers: int = 1,
+    queue_size: int = 4,
+    report_seconds: float = 5.0,
+) -> IndexProgress:
+    """
+    Прогоняет батчи через эмбеддинг (embed_workers потоков) и загрузку
+    (upload_workers потоков).
+
+    embed_workers > 1 имеет смысл, когда embed отдаёт работу в другие
+    процессы (indexer.encode_pool) и только ждёт ответа.
+
+    batches читается в вызывающем потоке. Первая ошибка любой стадии
+    останавливает конвейер и пробрасывается отсюда; батчи, которые уже
+    подтверждены через on_commit, повторно загружать не нужно.
+    """
+    progress = IndexProgress(total_bytes, report_seconds)
+    to_embed: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    to_upload: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def _committed(batch: IndexBatch) -> None:
+        on_commit(batch)
+        progress.commit(batch)
+
+    # Батчи, обогнавшие предыдущий, ждут его здесь - их не больше embed_workers
+    to_upload_ordered = _Reorder(lambda batch: _put(to_upload, batch, stop))
+    commits = _Reorder(_committed)
+    embed_done = threading.Barrier(embed_workers)
+
+    def _stage(func: Callable[[], None]) -> Callable[[], None]:
+        def _run() -> None:
+            try:
+                func()
+            except (_Stop, threading.BrokenBarrierError):
+                pass
+            except BaseException as exc:
+                errors.append(exc)
+                stop.set()
+                embed_done.abort()
+        return _run
+
+    def _embed_loop() -> None:
+        while True:
+            batch = _get(to_embed, stop)
+            if batch is _DONE:
+                # Когда все потоки эмбеддинга закончили, один из них закрывает загрузку
+                if embed_done.wait() == 0:
+                    for _ in range(upload_workers):
+                        _put(to_upload, _DONE, stop)
+                return
+            started = time.perf_counter()
+            batch.vectors = embed([doc.page_content for doc in batch.documents])
+            progress.add_embed(len(batch.documents), time.perf_counter() - started)
+            to_upload_ordered.add(batch)
+
+    def _upload_loop() -> None:
+        while True:
+            batch = _get(to_upload, stop)
+            if batch is _DONE:
+                return
+            started = time.perf_counter()
+            upload(batch)
+            progress.add_upload(len(batch.documents), time.perf_counter() - started)
+            commits.add(batch)
+
+    threads = [
+        threading.Thread(target=_stage(_embed_loop), name=f"index-embed-{i}", daemon=True)
+        for i in range(embed_workers)
+    ]
+    threads += [
+        threading.Thread(target=_stage(_upload_loop), name=f"index-upload-{i}", daemon=True)
+        for i in range(upload_workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for batch in batches:
+            _put(to_embed, batch, stop)
+        for _ in range(embed_workers):
+            _put(to_embed, _DONE, stop)
+    except _Stop:
+        pass
+    except BaseException:
+        stop.set()
+        embed_done.abort()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    print(progress.final_summary())
+    return progress
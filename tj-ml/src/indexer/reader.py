@@ -0,0 +1,71 @@
+"""Потоковое чтение корпуса: JSON массив или JSONL, по одной записи."""
+import codecs
+import json
+import os
+from typing import Any, Dict, Iterator, Tuple
+
+
+READ_CHUNK_BYTES = 1 << 16
+
+
+def iter_records(path: str) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    Отдаёт записи корпуса по одной вместе с числом прочитанных байт файла.
+
+    `.jsonl` читается построчно, `.json` должен быть массивом объектов
+    и разбирается кусками по READ_CHUNK_BYTES - файл целиком в память
+    не загружается. Для `.json` число байт точно до размера куска.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Файл {path} не найден")
+    if path.endswith(".jsonl"):
+        return _iter_jsonl(path)
+    return _iter_json_array(path)
+
+
+def _iter_jsonl(path: str) -> Iterator[Tuple[Dict[str, Any], int]]:
+    consumed = 0
+    with open(path, "rb") as handle:
+        for line in handle:
+            consumed += len(line)
+            line = line.strip()
+            if line:
+                yield json.loads(line), consumed
+
+
+def _iter_json_array(path: str) -> Iterator[Tuple[Dict[str, Any], int]]:
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer, pos, consumed = "", 0, 0
+    opened = eof = False
+    with open(path, "rb") as handle:
+        while True:
+            # Пробелы и запятые между элементами массива
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer):
+                if not opened:
+                    if buffer[pos] != "[":
+                        raise ValueError(f"{path}: ожидается JSON массив")
+                    opened = True
+                    pos += 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                try:
+                    record, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Элемент не дочитан - берём следующий кусок файла
+                    if eof:
+                        raise
+                else:
+                    yield record, consumed
+                    continue
+            elif eof:
+                raise ValueError(f"{path}: JSON массив оборван")
+
+            chunk = handle.read(READ_CHUNK_BYTES)
+            consumed += len(chunk)
+            eof = not chunk
+            buffer = buffer[pos:] + text.decode(chunk, final=eof)
+            pos = 0
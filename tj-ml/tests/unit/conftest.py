@@ -0,0 +1,12 @@
+import os
+import sys
+
+
+# Тесты импортируют модули сервиса так же, как он сам: из tj-ml/src
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# Офлайн: fake LLM и приблизительный подсчёт токенов без загрузки токенайзера
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("TOKENIZER_NAME", "none")
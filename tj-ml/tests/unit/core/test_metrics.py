@@ -0,0 +1,21 @@
+from prometheus_client import CollectorRegistry, generate_latest
+
+from app.core import metrics
+
+
+def _stats(size: int):
+    return lambda: {"semantic_cache": {"size": size, "hits": 0, "misses": 0}}
+
+
+def test_register_runtime_stats_twice(monkeypatch):
+    """Второй startup в том же процессе заменяет коллектор, а не падает на дубле."""
+    monkeypatch.setattr(metrics, "_runtime_collector", None)
+    monkeypatch.setattr(metrics, "_runtime_registry", None)
+    registry = CollectorRegistry()
+
+    metrics.register_runtime_stats(_stats(1), registry)
+    metrics.register_runtime_stats(_stats(7), registry)
+
+    text = generate_latest(registry).decode()
+    assert 'rag_cache_entries{cache="semantic_cache"} 7.0' in text
+    assert text.count("# TYPE rag_cache_entries gauge") == 1
@@ -0,0 +1,166 @@
+import re
+
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+import index
+from indexer import bluegreen
+
+from .test_incremental import _HashEmbeddings, _record, _write
+
+
+ALIAS = "tj"
+
+
+def _collection(client: QdrantClient, name: str, points: int = 3) -> str:
+    client.create_collection(
+        name, vectors_config=models.VectorParams(size=3, distance=models.Distance.COSINE)
+    )
+    if points:
+        client.upsert(
+            name,
+            points=[
+                models.PointStruct(
+                    id=i, vector=[1.0, float(i), float(i * i) + 1], payload={"n": i}
+                )
+                for i in range(points)
+            ],
+            wait=True,
+        )
+    return name
+
+
+def test_version_name():
+    """Имя версии - алиас и время сборки; after даёт строго более новое имя."""
+    name = bluegreen.version_name(ALIAS)
+
+    assert re.fullmatch(r"tj_v\d{14}", name)
+    assert bluegreen.version_name(ALIAS, after=name) > name
+
+
+def test_resolve_and_switch_alias():
+    """Алиас создаётся и перевешивается без удаления версий."""
+    client = QdrantClient(":memory:")
+    _collection(client, "tj_v20250101000000")
+    _collection(client, "tj_v20250102000000")
+
+    assert bluegreen.resolve_alias(client, ALIAS) is None
+    bluegreen.switch_alias(client, ALIAS, "tj_v20250101000000")
+    assert bluegreen.resolve_alias(client, ALIAS) == "tj_v20250101000000"
+
+    bluegreen.switch_alias(client, ALIAS, "tj_v20250102000000")
+
+    assert bluegreen.resolve_alias(client, ALIAS) == "tj_v20250102000000"
+    assert bluegreen.list_versions(client, ALIAS) == ["tj_v20250101000000", "tj_v20250102000000"]
+    assert bluegreen.previous_version(client, ALIAS, "tj_v20250102000000") == "tj_v20250101000000"
+
+
+def test_plain_collection_is_not_replaced_without_migration():
+    """Обычная коллекция на месте алиаса не удаляется без явного разрешения."""
+    client = QdrantClient(":memory:")
+    _collection(client, ALIAS)
+    _collection(client, "tj_v20250101000000")
+
+    with pytest.raises(bluegreen.PlainCollectionError):
+        bluegreen.switch_alias(client, ALIAS, "tj_v20250101000000")
+
+    assert bluegreen.is_plain_collection(client, ALIAS)
+    assert client.count(ALIAS, exact=True).count == 3
+
+
+def test_migrate_plain_collection_keeps_rollback_target():
+    """Миграция копирует данные в версию, которая остаётся целью отката."""
+    client = QdrantClient(":memory:")
+    _collection(client, ALIAS)
+
+    copy = bluegreen.migrate_plain_collection(client, ALIAS)
+    new = _collection(client, bluegreen.version_name(ALIAS, after=copy), points=4)
+    bluegreen.switch_alias(client, ALIAS, new, replace_collection=True)
+
+    assert bluegreen.resolve_alias(client, ALIAS) == new
+    assert client.count(copy, exact=True).count == 3
+    copied = client.retrieve(copy, ids=[2], with_payload=True)[0]
+    assert copied.payload == {"n": 2}
+    assert bluegreen.previous_version(client, ALIAS, new) == copy
+
+
+def test_prune_keeps_live_and_previous():
+    """Остаются живая и keep - 1 предыдущих, более новые недостроенные удаляются."""
+    client = QdrantClient(":memory:")
+    names = [_collection(client, f"tj_v2025010{day}000000", points=0) for day in range(1, 6)]
+    _collection(client, "tj_other", points=0)
+    bluegreen.switch_alias(client, ALIAS, names[3])
+
+    removed = bluegreen.prune_versions(client, ALIAS, keep=2)
+
+    assert removed == [names[0], names[1], names[4]]
+    assert bluegreen.list_versions(client, ALIAS) == [names[2], names[3]]
+    assert client.collection_exists("tj_other")
+
+
+def test_self_recall_and_validation():
+    """Точки находят сами себя; неполная версия не проходит проверку."""
+    client = QdrantClient(":memory:")
+    _collection(client, "tj_v20250101000000", points=20)
+    params = models.SearchParams(hnsw_ef=64)
+
+    assert bluegreen.self_recall(client, "tj_v20250101000000", 10, 10, params) == 1.0
+    bluegreen.validate_collection(
+        client, "tj_v20250101000000", expected_points=20, live_points=20,
+        min_recall=0.95, max_shrink=0.1, samples=10, search_params=params, timeout=5,
+    )
+    with pytest.raises(bluegreen.IndexValidationError, match="expected 25"):
+        bluegreen.validate_collection(
+            client, "tj_v20250101000000", expected_points=25, live_points=20,
+            min_recall=0.95, max_shrink=0.1, samples=10, search_params=params, timeout=5,
+        )
+    with pytest.raises(bluegreen.IndexValidationError, match="shrink"):
+        bluegreen.validate_collection(
+            client, "tj_v20250101000000", expected_points=20, live_points=40,
+            min_recall=0.95, max_shrink=0.1, samples=10, search_params=params, timeout=5,
+        )
+
+
+def test_reindex_migrates_plain_collection_only_when_allowed(monkeypatch, tmp_path):
+    """bluegreen поверх обычной коллекции: без флага отказ, с флагом копия и алиас."""
+    monkeypatch.setattr(index, "COLLECTION_NAME", ALIAS)
+    monkeypatch.setattr(index, "INDEX_VALIDATE_SAMPLES", 2)
+    client = QdrantClient(":memory:")
+    index.create_collection(client, ALIAS, 4)
+    articles = _write(tmp_path / "articles.json", [_record("Про вклады", "money")])
+    index.sync_collection(client, _HashEmbeddings(), ALIAS, articles)
+
+    with pytest.raises(bluegreen.PlainCollectionError):
+        index.reindex_bluegreen(client, _HashEmbeddings(), articles, 4)
+    assert bluegreen.list_versions(client, ALIAS) == []
+
+    index.reindex_bluegreen(client, _HashEmbeddings(), articles, 4, migrate_plain=True)
+
+    copy, live = bluegreen.list_versions(client, ALIAS)
+    assert bluegreen.resolve_alias(client, ALIAS) == live
+    assert client.count(copy, exact=True).count == 1
+    assert client.count(live, exact=True).count == 1
+
+
+def test_full_reindex_refuses_collection_behind_alias(monkeypatch, tmp_path):
+    """full за алиасом не удаляет версию вместе с алиасом, incremental обновляет её на месте."""
+    monkeypatch.setattr(index, "COLLECTION_NAME", ALIAS)
+    monkeypatch.setattr(index, "INDEX_CHECKPOINT_PATH", str(tmp_path / "checkpoint.json"))
+    client = QdrantClient(":memory:")
+    index.create_collection(client, "tj_v20250101000000", 4)
+    bluegreen.switch_alias(client, ALIAS, "tj_v20250101000000")
+    articles = _write(tmp_path / "articles.json", [_record("Про вклады", "money")])
+
+    monkeypatch.setattr(index, "INDEX_MODE", "full")
+    with pytest.raises(ValueError, match="INDEX_MODE=bluegreen"):
+        index.reindex_in_place(client, _HashEmbeddings(), articles, 4)
+    with pytest.raises(ValueError, match="vector size changed"):
+        index.reindex_in_place(client, _HashEmbeddings(), articles, 8)
+    assert bluegreen.resolve_alias(client, ALIAS) == "tj_v20250101000000"
+
+    monkeypatch.setattr(index, "INDEX_MODE", "incremental")
+    index.reindex_in_place(client, _HashEmbeddings(), articles, 4)
+
+    assert bluegreen.resolve_alias(client, ALIAS) == "tj_v20250101000000"
+    assert client.count(ALIAS, exact=True).count == 1
@@ -0,0 +1,44 @@
+import os
+
+from indexer.checkpoint import IndexCheckpoint, source_key
+
+
+def _corpus(tmp_path, text: str = "[]"):
+    path = tmp_path / "articles.json"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_resume_from_saved_position(tmp_path):
+    """Тот же корпус, коллекция и модель - продолжаем с сохранённой записи."""
+    corpus = _corpus(tmp_path)
+    path = str(tmp_path / "checkpoint.json")
+    IndexCheckpoint(path, source_key(corpus, collection="tj", model="e5")).save(120)
+
+    checkpoint = IndexCheckpoint(path, source_key(corpus, collection="tj", model="e5"))
+
+    assert checkpoint.load() == 120
+    checkpoint.clear()
+    assert checkpoint.load() == 0
+
+
+def test_other_key_starts_over(tmp_path):
+    """Другая коллекция, модель или изменённый файл корпуса сбрасывают чекпоинт."""
+    corpus = _corpus(tmp_path)
+    path = str(tmp_path / "checkpoint.json")
+    IndexCheckpoint(path, source_key(corpus, collection="tj", model="e5")).save(120)
+
+    assert IndexCheckpoint(path, source_key(corpus, collection="tj_v2", model="e5")).load() == 0
+    assert IndexCheckpoint(path, source_key(corpus, collection="tj", model="bge")).load() == 0
+
+    stat = os.stat(corpus)
+    os.utime(corpus, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert IndexCheckpoint(path, source_key(corpus, collection="tj", model="e5")).load() == 0
+
+
+def test_corrupted_file_starts_over(tmp_path):
+    corpus = _corpus(tmp_path)
+    path = tmp_path / "checkpoint.json"
+    path.write_text('{"key": ', encoding="utf-8")
+
+    assert IndexCheckpoint(str(path), source_key(corpus)).load() == 0
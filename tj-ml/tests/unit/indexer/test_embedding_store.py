@@ -0,0 +1,82 @@
+import os
+from typing import List
+
+import numpy as np
+import pytest
+
+from indexer.embedding_store import KEYS_FILE, VECTORS_FILE, CachedEmbeddings, EmbeddingStore
+
+
+MODEL = "intfloat/multilingual-e5-large@torch"
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        self.calls: List[List[str]] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def test_vectors_survive_reopen(tmp_path):
+    """Векторы читаются из файлов после повторного открытия, промах - None."""
+    store = EmbeddingStore(str(tmp_path), MODEL)
+    store.add_many(["a", "bb"], [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+
+    reopened = EmbeddingStore(str(tmp_path), MODEL)
+
+    assert len(reopened) == 2
+    vectors = reopened.get_many(["bb", "c", "a"])
+    assert vectors[1] is None
+    np.testing.assert_array_equal(vectors[0], [4.0, 5.0, 6.0])
+    np.testing.assert_array_equal(vectors[2], [1.0, 2.0, 3.0])
+
+
+def test_torn_tail_is_truncated_on_load(tmp_path):
+    """Вектор без ключа и недописанный ключ после падения отбрасываются."""
+    store = EmbeddingStore(str(tmp_path), MODEL)
+    store.add_many(["a", "bb"], [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    with open(os.path.join(store.path, VECTORS_FILE), "ab") as handle:
+        handle.write(np.asarray([7.0, 8.0, 9.0], dtype=np.float32).tobytes())
+    with open(os.path.join(store.path, KEYS_FILE), "ab") as handle:
+        handle.write(b"\x01" * 10)
+
+    reopened = EmbeddingStore(str(tmp_path), MODEL)
+
+    assert len(reopened) == 2
+    assert os.path.getsize(os.path.join(store.path, VECTORS_FILE)) == 2 * 3 * 4
+    assert os.path.getsize(os.path.join(store.path, KEYS_FILE)) == 2 * 32
+    reopened.add_many(["ccc"], [[7.0, 8.0, 9.0]])
+    np.testing.assert_array_equal(
+        EmbeddingStore(str(tmp_path), MODEL).get_many(["ccc"])[0], [7.0, 8.0, 9.0]
+    )
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    """Вектор другой размерности не дописывается в матрицу."""
+    store = EmbeddingStore(str(tmp_path), MODEL)
+    store.add_many(["a"], [[1.0, 2.0, 3.0]])
+
+    with pytest.raises(ValueError, match="dim"):
+        store.add_many(["b"], [[1.0, 2.0]])
+    assert len(store) == 1
+
+
+def test_cached_embeddings_counts_hits_and_misses(tmp_path):
+    """Модель считает только промахи (повторы внутри батча - один раз)."""
+    base = _CountingEmbeddings()
+    store = EmbeddingStore(str(tmp_path), MODEL)
+    embeddings = CachedEmbeddings(base, store)
+
+    first = embeddings.embed_documents(["a", "bb", "a"])
+    second = embeddings.embed_documents(["bb", "ccc"])
+
+    assert base.calls == [["a", "bb"], ["ccc"]]
+    assert first == [[1.0, 1.0, 0.5], [2.0, 1.0, 0.5], [1.0, 1.0, 0.5]]
+    assert second == [[2.0, 1.0, 0.5], [3.0, 1.0, 0.5]]
+    assert (store.hits, store.misses) == (1, 4)
+    assert len(store) == 3
@@ -0,0 +1,48 @@
+import os
+from typing import List
+
+from indexer.encode_pool import EncodePool, create_encoder
+
+
+class _FakeModel:
+    """Вектор - длина текста и pid процесса, в котором он посчитан."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[float(len(text)), float(os.getpid())] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def _fake_factory(model_name: str, backend: str) -> _FakeModel:
+    return _FakeModel(f"{model_name}@{backend}")
+
+
+def test_single_worker_runs_in_process():
+    """INDEX_ENCODE_WORKERS <= 1: модель в этом процессе, без пула."""
+    for workers in (0, 1):
+        encoder = create_encoder("e5", "torch", workers, factory=_fake_factory)
+
+        assert isinstance(encoder, _FakeModel)
+        assert encoder.model_name == "e5@torch"
+        assert encoder.embed_query("abc") == [3.0, float(os.getpid())]
+
+
+def test_small_pool_keeps_output_order():
+    """Пул из двух процессов отдаёт векторы в порядке текстов каждого вызова."""
+    encoder = create_encoder("e5", "torch", 2, factory=_fake_factory)
+    assert isinstance(encoder, EncodePool)
+    try:
+        encoder.warmup()
+        texts = ["x" * i for i in range(10)]
+        vectors = encoder.embed_documents(texts)
+        query = encoder.embed_query("x" * 42)
+    finally:
+        encoder.close()
+
+    assert [vector[0] for vector in vectors] == [float(i) for i in range(10)]
+    assert vectors[0][1] != float(os.getpid())
+    assert query[0] == 42.0
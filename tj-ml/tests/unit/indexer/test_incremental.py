@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import json
+from dataclasses import replace
+from typing import List
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http import models
+
+import index
+from app.core.config import get_settings
+from app.services import vector_store
+from app.services.local_index import read_local_meta
+
+
+class _HashEmbeddings:
+    """Детерминированный 4-мерный вектор из sha1 текста."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        digest = hashlib.sha1(text.encode("utf-8")).digest()
+        return [byte / 255 + 0.01 for byte in digest[:4]]
+
+
+def _record(text: str, category: str, chunk_id: int = 0) -> dict:
+    return {
+        "document": text,
+        "metadata": {
+            "source_url": "https://t-j.ru/deposit/",
+            "article_title": "Вклады",
+            "category": category,
+            "chunk_id": chunk_id,
+        },
+    }
+
+
+def _write(path, records) -> str:
+    path.write_text(json.dumps(records, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def _client(name: str = "tj") -> QdrantClient:
+    client = QdrantClient(":memory:")
+    index.create_collection(client, name, 4)
+    return client
+
+
+def test_article_in_several_categories_settles(tmp_path):
+    """Повтор фрагмента с другой категорией не перезагружается на каждом запуске."""
+    articles = _write(
+        tmp_path / "articles.json",
+        [
+            _record("Про вклады", "money"),
+            _record("Про вклады", "invest"),
+            _record("Ещё", "money", 1),
+        ],
+    )
+    client = _client()
+
+    first = index.sync_collection(client, _HashEmbeddings(), "tj", articles)
+    second = index.sync_collection(client, _HashEmbeddings(), "tj", articles)
+
+    assert first == {"points": 2, "uploaded": 2, "removed": 0}
+    assert second == {"points": 2, "uploaded": 0, "removed": 0}
+
+
+def test_changed_text_updates_revision(tmp_path):
+    """Правка текста без изменения числа точек обновляет метку в metadata коллекции."""
+    client = _client()
+    articles = _write(tmp_path / "articles.json", [_record("Старый текст", "money")])
+    index.sync_collection(client, _HashEmbeddings(), "tj", articles)
+    before = client.get_collection("tj").config.metadata[vector_store.INDEX_REVISION_KEY]
+
+    index.sync_collection(client, _HashEmbeddings(), "tj", articles)
+    assert client.get_collection("tj").config.metadata[vector_store.INDEX_REVISION_KEY] == before
+
+    _write(tmp_path / "articles.json", [_record("Новый текст", "money")])
+    stats = index.sync_collection(client, _HashEmbeddings(), "tj", articles)
+
+    assert stats == {"points": 1, "uploaded": 1, "removed": 0}
+    assert client.get_collection("tj").config.metadata[vector_store.INDEX_REVISION_KEY] > before
+
+
+def test_index_version_follows_revision(monkeypatch):
+    """Ключ версии индекса меняется вместе с меткой, даже если число точек то же."""
+    settings = replace(
+        get_settings(),
+        vector_store_backend="qdrant",
+        collection_name="tj",
+        index_version_ttl_seconds=0,
+    )
+    client = AsyncQdrantClient(":memory:")
+    monkeypatch.setattr(vector_store, "get_settings", lambda: settings)
+    monkeypatch.setattr(vector_store, "get_async_qdrant_client", lambda: client)
+    monkeypatch.setattr(vector_store, "_index_version", None)
+
+    async def _main():
+        await client.create_collection(
+            "tj", vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE)
+        )
+        await client.update_collection("tj", metadata={vector_store.INDEX_REVISION_KEY: 1.0})
+        first = await vector_store.aget_index_version()
+        await client.update_collection("tj", metadata={vector_store.INDEX_REVISION_KEY: 2.0})
+        second = await vector_store.aget_index_version()
+        return first, second
+
+    first, second = asyncio.run(_main())
+
+    assert first != second
+    assert first.split(":")[2] == second.split(":")[2]
+
+
+def test_local_index_rebuilds_on_corpus_change_and_full(monkeypatch, tmp_path):
+    """Локальный индекс пропускается только для того же корпуса и не в режиме full."""
+    path = str(tmp_path / "local_index")
+    monkeypatch.setattr(index, "LOCAL_INDEX_PATH", path)
+    monkeypatch.setattr(index, "INDEX_MODE", "incremental")
+    articles = _write(tmp_path / "articles.json", [_record("Про вклады", "money")])
+
+    index.build_local_index(_HashEmbeddings(), articles)
+    built = read_local_meta(path)
+    index.build_local_index(_HashEmbeddings(), articles)
+    assert read_local_meta(path) == built
+
+    _write(tmp_path / "articles.json", [_record("Про вклады", "money"), _record("Кэшбэк", "m", 1)])
+    index.build_local_index(_HashEmbeddings(), articles)
+    changed = read_local_meta(path)
+    assert changed["count"] == 2
+    assert changed["corpus_hash"] != built["corpus_hash"]
+
+    monkeypatch.setattr(index, "INDEX_MODE", "full")
+    index.build_local_index(_HashEmbeddings(), articles)
+    assert read_local_meta(path)["built_at"] > changed["built_at"]
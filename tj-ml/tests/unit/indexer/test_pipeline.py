@@ -0,0 +1,96 @@
+import threading
+import time
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+
+from indexer.pipeline import IndexBatch, run_pipeline
+
+
+def _batches(count: int) -> List[IndexBatch]:
+    return [
+        IndexBatch(
+            seq=seq,
+            ids=[f"id-{seq}"],
+            hashes=[f"hash-{seq}"],
+            documents=[Document(page_content=f"text {seq}")],
+            end_record=seq + 1,
+            end_bytes=(seq + 1) * 10,
+        )
+        for seq in range(count)
+    ]
+
+
+def _run(batches, embed, upload, commits: List[int] = None):
+    commits = [] if commits is None else commits
+    progress = run_pipeline(
+        batches,
+        embed=embed,
+        upload=upload,
+        on_commit=lambda batch: commits.append(batch.seq),
+        total_bytes=1000,
+        upload_workers=3,
+        embed_workers=3,
+    )
+    return progress, commits
+
+
+def test_out_of_order_completion_commits_in_order():
+    """Ранние батчи считаются дольше поздних, но подтверждаются строго по seq."""
+    uploaded: List[int] = []
+    lock = threading.Lock()
+
+    def _embed(texts):
+        seq = int(texts[0].split()[1])
+        time.sleep(0.02 * (3 - seq % 3))
+        return [[float(seq)] for _ in texts]
+
+    def _upload(batch):
+        time.sleep(0.01 * (3 - batch.seq % 3))
+        assert batch.vectors == [[float(batch.seq)]]
+        with lock:
+            uploaded.append(batch.seq)
+
+    progress, commits = _run(_batches(9), _embed, _upload)
+
+    assert commits == list(range(9))
+    assert sorted(uploaded) == list(range(9))
+    assert progress.uploaded == 9
+    assert progress.committed_records == 9
+
+
+def test_upload_failure_stops_pipeline_and_keeps_commits_contiguous():
+    """Ошибка загрузки пробрасывается, подтверждены только батчи до дыры."""
+    commits: List[int] = []
+
+    def _upload(batch):
+        if batch.seq == 3:
+            raise RuntimeError("qdrant is down")
+
+    with pytest.raises(RuntimeError, match="qdrant is down"):
+        _run(_batches(50), lambda texts: [[0.0] for _ in texts], _upload, commits)
+
+    assert commits == list(range(len(commits)))
+    assert len(commits) <= 3
+
+
+def test_embed_failure_propagates():
+    def _embed(texts):
+        raise ValueError("model crashed")
+
+    with pytest.raises(ValueError, match="model crashed"):
+        _run(_batches(5), _embed, lambda batch: None)
+
+
+def test_reader_failure_propagates_and_stops_workers():
+    """Ошибка чтения корпуса пробрасывается, потоки стадий завершаются."""
+    def _broken():
+        yield from _batches(2)
+        raise ValueError("corpus is truncated")
+
+    before = threading.active_count()
+    with pytest.raises(ValueError, match="corpus is truncated"):
+        _run(_broken(), lambda texts: [[0.0] for _ in texts], lambda batch: None)
+
+    assert threading.active_count() == before
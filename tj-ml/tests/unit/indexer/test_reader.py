@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from indexer import reader
+
+
+RECORDS = [
+    {"document": f"Фрагмент {i} — «ёлка» " * (i + 1), "metadata": {"chunk_id": i}}
+    for i in range(20)
+]
+
+
+def test_json_array_read_in_small_chunks(monkeypatch, tmp_path):
+    """Записи и многобайтные символы на границах кусков читаются целиком."""
+    monkeypatch.setattr(reader, "READ_CHUNK_BYTES", 7)
+    path = tmp_path / "articles.json"
+    path.write_text(json.dumps(RECORDS, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    items = list(reader.iter_records(str(path)))
+
+    assert [record for record, _consumed in items] == RECORDS
+    consumed = [value for _record, value in items]
+    assert consumed == sorted(consumed)
+    assert consumed[-1] <= path.stat().st_size
+
+
+def test_jsonl_reports_exact_offsets(tmp_path):
+    path = tmp_path / "articles.jsonl"
+    lines = [json.dumps(record, ensure_ascii=False) + "\n" for record in RECORDS[:3]]
+    path.write_text(lines[0] + "\n" + lines[1] + lines[2], encoding="utf-8")
+
+    items = list(reader.iter_records(str(path)))
+
+    assert [record for record, _consumed in items] == RECORDS[:3]
+    assert items[-1][1] == path.stat().st_size
+
+
+def test_truncated_array_raises(monkeypatch, tmp_path):
+    monkeypatch.setattr(reader, "READ_CHUNK_BYTES", 16)
+    path = tmp_path / "articles.json"
+    path.write_text(json.dumps(RECORDS[:3], ensure_ascii=False)[:-40], encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        list(reader.iter_records(str(path)))
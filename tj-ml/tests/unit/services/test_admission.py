@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+def test_queue_full_rejected():
+    """Сверх лимита и очереди запрос сразу получает отказ."""
+
+    async def _main():
+        controller = AdmissionController(name="p", max_concurrency=1, max_queue=1)
+        await controller.acquire()
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire()
+        controller.release(0.01)
+        await waiter
+        controller.release(0.01)
+        return controller, exc_info.value
+
+    controller, rejected = asyncio.run(_main())
+
+    assert rejected.reason == "queue is full"
+    assert controller.rejected_queue_full == 1
+    assert controller.admitted == 2
+    assert controller.stats()["active"] == 0
+
+
+def test_deadline_rejected_by_estimate():
+    """Если ожидаемое время в очереди больше остатка дедлайна - отказ без ожидания."""
+
+    async def _main():
+        controller = AdmissionController(name="p", max_concurrency=1, max_queue=10)
+        await controller.acquire()
+        controller.release(2.0)
+        await controller.acquire()
+        started = time.monotonic()
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire(deadline=time.monotonic() + 0.5)
+        return controller, exc_info.value, time.monotonic() - started
+
+    controller, rejected, waited = asyncio.run(_main())
+
+    assert "expected queue wait" in rejected.reason
+    assert rejected.retry_after == pytest.approx(2.0)
+    assert rejected.retry_after_header == "2"
+    assert waited < 0.1
+    assert controller.rejected_deadline == 1
+
+
+def test_deadline_expired_in_queue():
+    """Запрос, не дождавшийся слота до дедлайна, уходит из очереди с отказом."""
+
+    async def _main():
+        controller = AdmissionController(name="p", max_concurrency=1, max_queue=10)
+        await controller.acquire()
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire(deadline=time.monotonic() + 0.05)
+        return controller, exc_info.value
+
+    controller, rejected = asyncio.run(_main())
+
+    assert rejected.reason == "deadline expired in queue"
+    assert controller.queue_depth == 0
+
+
+def test_slot_handed_to_next_waiter_in_order():
+    """Освободившийся слот достаётся ожидающим по порядку FIFO."""
+
+    async def _main():
+        controller = AdmissionController(name="p", max_concurrency=1, max_queue=10)
+        await controller.acquire()
+        order = []
+
+        async def _wait(i):
+            await controller.acquire()
+            order.append(i)
+            controller.release(0.0)
+
+        waiters = [asyncio.ensure_future(_wait(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        controller.release(0.0)
+        await asyncio.gather(*waiters)
+        return controller, order
+
+    controller, order = asyncio.run(_main())
+
+    assert order == [0, 1, 2]
+    assert controller.stats()["active"] == 0
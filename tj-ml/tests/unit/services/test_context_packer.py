@@ -0,0 +1,71 @@
+import pytest
+from langchain_core.documents import Document
+
+from app.services import context_packer
+from app.services.context_packer import pack_context
+
+
+@pytest.fixture(autouse=True)
+def char_tokens(monkeypatch):
+    """Токен = символ: сумма по частям точно равна длине собранного контекста."""
+    monkeypatch.setattr(context_packer, "count_tokens", len)
+    monkeypatch.setattr(context_packer, "chunk_token_count", lambda metadata, text: len(text))
+    monkeypatch.setattr(context_packer, "truncate_to_tokens", lambda text, limit: text[:limit])
+
+
+def _doc(text: str, url: str) -> Document:
+    return Document(page_content=text, metadata={"source_url": url, "article_title": "T"})
+
+
+def test_duplicates_and_source_cap_are_counted_separately():
+    """Повтор текста и лишний фрагмент статьи попадают в разные счётчики."""
+    scored = [
+        (_doc("alpha", "a"), 0.9),
+        (_doc(" alpha ", "b"), 0.8),
+        (_doc("beta", "a"), 0.7),
+        (_doc("gamma", "a"), 0.6),
+    ]
+
+    packed = pack_context(scored, max_tokens=0, max_chunks_per_source=2)
+
+    assert [doc.page_content for doc in packed.docs] == ["alpha", "beta"]
+    assert packed.duplicates == 1
+    assert packed.source_capped == 1
+    stats = packed.usage_stats()
+    assert stats["context_chunks_duplicates"] == 1
+    assert stats["context_chunks_source_capped"] == 1
+
+
+def test_tokens_include_headers_and_separators():
+    """packed.tokens совпадает с размером итогового контекста."""
+    scored = [
+        (_doc("first chunk", "a"), 0.9),
+        (_doc("other article", "b"), 0.8),
+        (_doc("second chunk", "a"), 0.7),
+    ]
+
+    packed = pack_context(scored, max_tokens=0)
+
+    assert packed.tokens == len(packed.context)
+
+
+@pytest.mark.parametrize("max_tokens", [60, 80, 120, 200])
+def test_context_fits_budget(max_tokens):
+    """Контекст с заголовками и разделителями не выходит за max_tokens."""
+    scored = [(_doc(f"chunk {i} " * 5, f"url-{i % 3}"), 1.0 - i / 10) for i in range(6)]
+
+    packed = pack_context(scored, max_tokens=max_tokens, min_chunk_tokens=5)
+
+    assert len(packed.context) <= max_tokens
+    assert packed.tokens == len(packed.context)
+
+
+def test_small_remainder_is_dropped_not_truncated():
+    """Остаток бюджета меньше min_chunk_tokens - фрагмент пропускается."""
+    scored = [(_doc("x" * 40, "a"), 0.9), (_doc("y" * 40, "b"), 0.8)]
+
+    packed = pack_context(scored, max_tokens=100, min_chunk_tokens=30)
+
+    assert len(packed.docs) == 1
+    assert packed.dropped == 1
+    assert packed.truncated == 0
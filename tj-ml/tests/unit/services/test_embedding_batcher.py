@@ -0,0 +1,113 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.services.embeddings import EmbeddingBatcher
+
+
+class _RecordingEmbeddings(Embeddings):
+    """Вектор - длина текста; запоминает размеры батчей, может ждать сигнала."""
+
+    def __init__(self, release: threading.Event = None):
+        self.batches: List[int] = []
+        self.release = release
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.release is not None:
+            self.release.wait(timeout=5)
+        self.batches.append(len(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def _batcher(embeddings: Embeddings, executor: ThreadPoolExecutor, **kwargs) -> EmbeddingBatcher:
+    params = {"max_batch_size": 8, "max_wait_ms": 20, "max_in_flight": 1}
+    params.update(kwargs)
+    return EmbeddingBatcher(embeddings=embeddings, executor=executor, **params)
+
+
+def test_concurrent_requests_share_batch():
+    """Одновременные запросы считаются одним батчем, каждый получает свой вектор."""
+    embeddings = _RecordingEmbeddings()
+
+    async def _main():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = _batcher(embeddings, executor)
+            vectors = await asyncio.gather(*(batcher.embed("x" * i) for i in range(1, 6)))
+            await batcher.close()
+        return vectors
+
+    vectors = asyncio.run(_main())
+
+    assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert embeddings.batches == [5]
+
+
+def test_close_waits_in_flight_and_fails_queued():
+    """close() дожидается считающегося батча и отвечает ошибкой ждущим в очереди."""
+    release = threading.Event()
+    embeddings = _RecordingEmbeddings(release)
+
+    async def _main():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = _batcher(embeddings, executor, max_batch_size=1, max_wait_ms=0)
+            first = asyncio.ensure_future(batcher.embed("a"))
+            await asyncio.sleep(0.05)
+            # Слот батча занят первым запросом - второй остаётся в очереди
+            second = asyncio.ensure_future(batcher.embed("bb"))
+            await asyncio.sleep(0.05)
+            closing = asyncio.ensure_future(batcher.close())
+            await asyncio.sleep(0.05)
+            release.set()
+            await closing
+            assert not batcher._tasks
+            return await first, await asyncio.gather(second, return_exceptions=True)
+
+    first, (second,) = asyncio.run(_main())
+
+    assert first == [1.0]
+    assert isinstance(second, RuntimeError)
+
+
+def test_worker_restart_keeps_queue():
+    """После падения воркера запросы из очереди не теряются."""
+    embeddings = _RecordingEmbeddings()
+
+    async def _main():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = _batcher(embeddings, executor)
+            batcher._ensure_worker()
+            queue = batcher._queue
+            batcher._worker.cancel()
+            await asyncio.gather(batcher._worker, return_exceptions=True)
+            vector = await batcher.embed("abc")
+            assert batcher._queue is queue
+            await batcher.close()
+        return vector
+
+    assert asyncio.run(_main()) == [3.0]
+
+
+def test_batch_error_propagates():
+    """Ошибка модели отдаётся всем запросам батча."""
+
+    class _Broken(_RecordingEmbeddings):
+        def embed_documents(self, texts):
+            raise ValueError("boom")
+
+    async def _main():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = _batcher(_Broken(), executor)
+            try:
+                with pytest.raises(ValueError):
+                    await batcher.embed("a")
+            finally:
+                await batcher.close()
+
+    asyncio.run(_main())
@@ -0,0 +1,146 @@
+import asyncio
+import json
+from dataclasses import replace
+
+from langchain_core.documents import Document
+
+from app.core.config import get_settings
+from app.schemas.eval import EvalItemResult
+from app.services import eval_pipeline
+
+
+def _setup(monkeypatch, tmp_path, questions):
+    golden_path = tmp_path / "golden.json"
+    golden_path.write_text(
+        json.dumps([{"question": q, "answer": f"ответ {q}"} for q in questions]),
+        encoding="utf-8",
+    )
+    settings = replace(
+        get_settings(),
+        eval_golden_path=str(golden_path),
+        eval_runs_dir=str(tmp_path / "runs"),
+        eval_workers=2,
+    )
+    monkeypatch.setattr(eval_pipeline, "get_settings", lambda: settings)
+    return golden_path
+
+
+def _fake_evaluate(monkeypatch, calls, failing=()):
+    async def _evaluate(item, top_k):
+        calls.append(item.question)
+        if item.question in failing:
+            raise RuntimeError("LLM timeout")
+        return EvalItemResult(
+            question=item.question,
+            expected_answer=item.answer,
+            predicted_answer=item.answer,
+            exact_match=1.0,
+            f1=1.0,
+        )
+
+    monkeypatch.setattr(eval_pipeline, "_evaluate_answer", _evaluate)
+
+
+def test_resume_skips_logged_items(monkeypatch, tmp_path):
+    """Повторный запуск досчитывает только упавшие вопросы."""
+    _setup(monkeypatch, tmp_path, ["a", "b", "c"])
+    calls = []
+    _fake_evaluate(monkeypatch, calls, failing={"b"})
+    run_id = eval_pipeline.create_run()
+
+    asyncio.run(eval_pipeline.run_evaluation(run_id))
+
+    run_data = eval_pipeline.read_run(run_id)
+    assert run_data["status"] == "failed"
+    assert run_data["progress"]["done"] == 2
+    assert run_data["progress"]["failed"] == 1
+    assert sorted(eval_pipeline.read_items(run_id)) == [0, 2]
+
+    calls.clear()
+    _fake_evaluate(monkeypatch, calls)
+    eval_pipeline.resume_run(run_id)
+    asyncio.run(eval_pipeline.run_evaluation(run_id))
+
+    run_data = eval_pipeline.read_run(run_id)
+    assert calls == ["b"]
+    assert run_data["status"] == "completed"
+    assert run_data["progress"]["done"] == 3
+    assert [item["question"] for item in run_data["items"]] == ["a", "b", "c"]
+
+
+def test_resume_refuses_changed_golden_set(monkeypatch, tmp_path):
+    """Golden set поменялся после старта - прогон не продолжается."""
+    golden_path = _setup(monkeypatch, tmp_path, ["a", "b"])
+    calls = []
+    _fake_evaluate(monkeypatch, calls, failing={"b"})
+    run_id = eval_pipeline.create_run()
+    asyncio.run(eval_pipeline.run_evaluation(run_id))
+
+    golden_path.write_text(
+        json.dumps([{"question": "a", "answer": "новый ответ"}, {"question": "b", "answer": "b"}]),
+        encoding="utf-8",
+    )
+    calls.clear()
+    eval_pipeline.resume_run(run_id)
+    asyncio.run(eval_pipeline.run_evaluation(run_id))
+
+    run_data = eval_pipeline.read_run(run_id)
+    assert calls == []
+    assert run_data["status"] == "failed"
+    assert "Golden set changed" in run_data["error"]
+
+
+def test_context_match_by_inclusion_and_word_overlap():
+    """Фрагмент совпадает с эталоном по вхождению или по доле общих слов."""
+    reference = "Вклад можно открыть в приложении за пару минут"
+
+    assert eval_pipeline._context_match(reference, f"Коротко.  {reference.upper()}. Дальше ставки")
+    assert eval_pipeline._context_match(reference, "Вклад можно открыть в приложении банка")
+    assert not eval_pipeline._context_match(reference, "Кэшбэк начисляется раз в месяц")
+    assert not eval_pipeline._context_match("", "Вклад можно открыть")
+
+
+def test_retrieval_metrics_from_ranks(monkeypatch, tmp_path):
+    """recall@k и MRR по позиции эталона; вопросы без reference_context пропускаются."""
+    _setup(monkeypatch, tmp_path, [])
+    golden = [
+        {"question": "first", "answer": "-", "reference_context": "вклад открывают в приложении"},
+        {"question": "second", "answer": "-", "reference_context": "кэшбэк приходит раз в месяц"},
+        {"question": "miss", "answer": "-", "reference_context": "налоговый вычет за лечение"},
+        {"question": "no reference", "answer": "-"},
+    ]
+    golden_path = tmp_path / "golden.json"
+    golden_path.write_text(json.dumps(golden, ensure_ascii=False), encoding="utf-8")
+    chunks = {
+        "first": ["Вклад открывают в приложении за минуту", "Про кэшбэк", "Про ипотеку"],
+        "second": ["Про ипотеку", "Кэшбэк приходит раз в месяц", "Про вклады"],
+        "miss": ["Про ипотеку", "Про кэшбэк", "Про вклады"],
+    }
+    searched = []
+
+    async def _embed(question, use_cache=True):
+        return [float(list(chunks).index(question))]
+
+    async def _search(vector, k):
+        question = list(chunks)[int(vector[0])]
+        searched.append(question)
+        return [
+            (Document(page_content=text, metadata={"source_url": f"https://t-j.ru/{i}/"}), 0.9)
+            for i, text in enumerate(chunks[question][:k])
+        ]
+
+    monkeypatch.setattr(eval_pipeline, "aembed_query", _embed)
+    monkeypatch.setattr(eval_pipeline, "asearch_by_vector", _search)
+    run_id = eval_pipeline.create_run(mode="retrieval", top_k=3)
+
+    asyncio.run(eval_pipeline.run_evaluation(run_id))
+
+    run_data = eval_pipeline.read_run(run_id)
+    assert run_data["status"] == "completed"
+    assert sorted(searched) == ["first", "miss", "second"]
+    assert [item["rank"] for item in run_data["items"]] == [1, 2, None]
+    assert [item["reciprocal_rank"] for item in run_data["items"]] == [1.0, 0.5, 0.0]
+    metrics = run_data["metrics"]
+    assert metrics["count"] == 3
+    assert metrics["recall@3"] == 2 / 3
+    assert metrics["mrr"] == 0.5
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.services.fake_llm import NOT_FOUND_ANSWER, FakeChatModel, FakeLLMError, fake_answer
+
+
+PROMPT = (
+    "Контекст:\n"
+    "Фрагмент 1:\nВклад можно открыть в приложении за пару минут. Дальше про ставки.\n"
+    "Источник: Как открыть вклад\nURL: https://t-j.ru/deposit/\n\n"
+    "Фрагмент 2:\nКэшбэк начисляется раз в месяц по итогам расчётного периода.\n"
+    "Источник: Кэшбэк\nURL: https://t-j.ru/cashback/\n\n"
+    "Вопрос: как открыть вклад?"
+)
+
+
+def _model(**kwargs) -> FakeChatModel:
+    params = {"ttft_ms": 0.0, "ttft_sigma": 0.0, "tokens_per_second": 0.0}
+    params.update(kwargs)
+    return FakeChatModel(**params)
+
+
+def test_answer_depends_only_on_prompt():
+    """Ответ собирается из первых предложений фрагментов и списка источников."""
+    answer = fake_answer(PROMPT)
+
+    assert answer == (
+        "Вклад можно открыть в приложении за пару минут. "
+        "Кэшбэк начисляется раз в месяц по итогам расчётного периода.\n\n"
+        "Источники:\n"
+        "- [Как открыть вклад](https://t-j.ru/deposit/)\n"
+        "- [Кэшбэк](https://t-j.ru/cashback/)"
+    )
+    assert fake_answer("Вопрос без контекста") == NOT_FOUND_ANSWER
+
+
+def test_stream_is_deterministic_with_usage_last():
+    """Стрим склеивается в тот же ответ, usage_metadata приходит последним чанком."""
+    model = _model()
+
+    async def _collect():
+        return [chunk async for chunk in model.astream([HumanMessage(content=PROMPT)])]
+
+    chunks = asyncio.run(_collect())
+    again = asyncio.run(_collect())
+
+    text = "".join(chunk.content for chunk in chunks)
+    assert text == fake_answer(PROMPT)
+    assert [chunk.content for chunk in again] == [chunk.content for chunk in chunks]
+    assert chunks[-1].content == ""
+    usage = chunks[-1].usage_metadata
+    assert usage["input_tokens"] > 0 and usage["output_tokens"] > 0
+    assert usage["total_tokens"] == usage["input_tokens"] + usage["output_tokens"]
+    assert all(not chunk.usage_metadata for chunk in chunks[:-1])
+
+
+def test_invoke_matches_stream_and_error_rate():
+    """invoke отдаёт тот же текст; error_rate=1 всегда падает."""
+    message = _model().invoke([HumanMessage(content=PROMPT)])
+
+    assert message.content == fake_answer(PROMPT)
+    assert message.usage_metadata["output_tokens"] > 0
+    with pytest.raises(FakeLLMError):
+        _model(error_rate=1.0).invoke([HumanMessage(content=PROMPT)])
@@ -0,0 +1,189 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.prompt_values import StringPromptValue
+
+from app.services.admission import AdmissionController
+from app.services.fake_llm import FakeChatModel
+from app.services.llm_router import LLMRouter, LLMTarget, LLMUnavailableError, ProviderHealth
+
+
+PROMPT = StringPromptValue(text="Как оформить вычет?")
+
+
+def _target(
+    name: str,
+    ttft_ms: float = 1.0,
+    error_rate: float = 0.0,
+    min_requests: int = 2,
+    open_seconds: float = 60.0,
+) -> LLMTarget:
+    return LLMTarget(
+        provider=name,
+        model="fake",
+        llm=FakeChatModel(
+            model_name=name,
+            ttft_ms=ttft_ms,
+            ttft_sigma=0.0,
+            tokens_per_second=0.0,
+            error_rate=error_rate,
+        ),
+        health=ProviderHealth(
+            window=10,
+            failure_threshold=0.5,
+            min_requests=min_requests,
+            open_seconds=open_seconds,
+        ),
+        admission=AdmissionController(name=name, max_concurrency=4, max_queue=4),
+    )
+
+
+def _router(targets, hedge_enabled=False, hedge_min_delay=0.05, first_token_timeout=5.0):
+    return LLMRouter(
+        targets=targets,
+        hedge_enabled=hedge_enabled,
+        hedge_min_delay=hedge_min_delay,
+        first_token_timeout=first_token_timeout,
+    )
+
+
+def test_failover_on_provider_error():
+    """Ошибка основного провайдера до первого токена - ответ от следующего."""
+    primary, backup = _target("primary", error_rate=1.0), _target("backup")
+    router = _router([primary, backup])
+
+    answer = asyncio.run(router.ainvoke(PROMPT))
+
+    assert answer
+    assert router.failovers == 1
+    assert primary.health.failures == 1
+    assert backup.health.stats()["requests"] == 1
+    assert primary.admission.stats()["active"] == 0
+
+
+def test_failover_on_first_token_timeout():
+    """Провайдер, не выдавший первый токен за first_token_timeout, заменяется следующим."""
+    slow, backup = _target("slow", ttft_ms=5000), _target("backup")
+    router = _router([slow, backup], first_token_timeout=0.1)
+
+    started = time.monotonic()
+    answer = asyncio.run(router.ainvoke(PROMPT))
+
+    assert answer
+    assert time.monotonic() - started < 2
+    assert router.failovers == 1
+    assert slow.health.failures == 1
+
+
+def test_all_providers_failed():
+    """Если упали все провайдеры, наружу уходит LLMUnavailableError."""
+    router = _router([_target("a", error_rate=1.0), _target("b", error_rate=1.0)])
+
+    try:
+        asyncio.run(router.ainvoke(PROMPT))
+    except LLMUnavailableError as exc:
+        assert "a/fake" in str(exc) and "b/fake" in str(exc)
+    else:
+        raise AssertionError("LLMUnavailableError expected")
+
+
+def test_hedge_wins_over_slow_primary():
+    """С hedging медленный провайдер дублируется, побеждает первый токен, проигравший отменён."""
+    slow, fast = _target("slow", ttft_ms=2000), _target("fast", ttft_ms=1.0)
+    router = _router([slow, fast], hedge_enabled=True, hedge_min_delay=0.05)
+
+    started = time.monotonic()
+    answer = asyncio.run(router.ainvoke(PROMPT))
+
+    assert answer
+    assert time.monotonic() - started < 1
+    assert router.hedges == 1
+    assert router.hedge_wins == 1
+    assert slow.health.failures == 0
+    assert slow.admission.stats()["active"] == 0
+
+
+def test_open_circuit_skips_provider_until_probe():
+    """После серии ошибок circuit открывается, через open_seconds пропускает пробный запрос."""
+    flaky = _target("flaky", error_rate=1.0, min_requests=2, open_seconds=0.2)
+    backup = _target("backup")
+    router = _router([flaky, backup])
+
+    async def _main():
+        for _ in range(2):
+            await router.ainvoke(PROMPT)
+        assert flaky.health.state == "open"
+        await router.ainvoke(PROMPT)
+        assert flaky.health.requests == 2
+
+        await asyncio.sleep(0.25)
+        assert flaky.health.state == "half_open"
+        await router.ainvoke(PROMPT)
+        # Пробный запрос снова упал - circuit опять открыт
+        assert flaky.health.requests == 3
+        assert flaky.health.state == "open"
+
+    asyncio.run(_main())
+    assert backup.health.stats()["requests"] == 4
+
+
+def test_cancelled_caller_releases_admission_slot():
+    """Отмена вызывающего до первого токена освобождает слот провайдера."""
+    slow = _target("slow", ttft_ms=300)
+    router = _router([slow])
+
+    async def _main():
+        try:
+            await asyncio.wait_for(router.ainvoke(PROMPT), timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("TimeoutError expected")
+
+    asyncio.run(_main())
+    assert slow.admission.stats()["active"] == 0
+    assert slow.health.failures == 0
+
+
+def test_early_stop_of_stream_releases_admission_slot():
+    """Вызывающий перестал читать astream после первого токена - слот освобождается."""
+    target = _target("primary")
+    target.llm.tokens_per_second = 10.0
+    router = _router([target])
+
+    async def _main():
+        stream = router.astream(PROMPT)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(_main())
+    assert target.admission.stats()["active"] == 0
+    assert target.health.failures == 0
+
+
+class _StallAfterHeadersModel(FakeChatModel):
+    """Сразу отдаёт пустой чанк с ролью, как ChatOpenAI, а токенов не присылает."""
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield ChatGenerationChunk(message=AIMessageChunk(content=""))
+        await asyncio.sleep(5)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="поздно"))
+
+
+def test_empty_role_chunk_is_not_first_token():
+    """Пустой чанк до первого токена не считается ответом: зависший провайдер заменяется."""
+    stalled, backup = _target("stalled"), _target("backup")
+    stalled.llm = _StallAfterHeadersModel(model_name="stalled")
+    router = _router([stalled, backup], first_token_timeout=0.1)
+
+    started = time.monotonic()
+    answer = asyncio.run(router.ainvoke(PROMPT))
+
+    assert answer and "поздно" not in answer
+    assert time.monotonic() - started < 2
+    assert router.failovers == 1
+    assert stalled.health.failures == 1
+    assert stalled.admission.stats()["active"] == 0
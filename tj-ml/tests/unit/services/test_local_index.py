@@ -0,0 +1,55 @@
+from dataclasses import replace
+
+from langchain_core.documents import Document
+
+from app.core.config import get_settings
+from app.services import vector_store
+from app.services.local_index import LocalVectorIndex, write_local_index
+
+
+MODEL = "test-model"
+
+
+def _docs(*texts):
+    return [Document(page_content=text, metadata={"n": i}) for i, text in enumerate(texts)]
+
+
+def test_empty_corpus_writes_searchable_index(tmp_path):
+    """Пустой корпус даёт индекс (0, dim), поиск по нему пустой."""
+    path = str(tmp_path / "index")
+
+    meta = write_local_index(path, [], [], MODEL, dim=3)
+    index = LocalVectorIndex(path)
+
+    assert (meta["count"], meta["dim"]) == (0, 3)
+    assert index.vectors.shape == (0, 3)
+    assert index.search([1.0, 0.0, 0.0]) == []
+
+
+def test_search_orders_by_cosine(tmp_path):
+    """Ближайшие по косинусу фрагменты идут первыми."""
+    path = str(tmp_path / "index")
+    write_local_index(path, _docs("a", "b", "c"), [[1, 0], [0, 1], [1, 1]], MODEL)
+
+    results = LocalVectorIndex(path).search([2.0, 0.1], k=2)
+
+    assert [doc.page_content for doc, _score in results] == ["a", "c"]
+
+
+def test_rebuilt_index_is_reloaded(monkeypatch, tmp_path):
+    """get_local_index открывает индекс заново, когда индексатор подменил каталог."""
+    path = str(tmp_path / "index")
+    settings = replace(get_settings(), local_index_path=path, embedding_model_name=MODEL)
+    monkeypatch.setattr(vector_store, "get_settings", lambda: settings)
+    monkeypatch.setattr(vector_store, "_local_index", None)
+    monkeypatch.setattr(vector_store, "_local_index_stamp", None)
+
+    write_local_index(path, _docs("a"), [[1, 0]], MODEL)
+    first = vector_store.get_local_index()
+    assert vector_store.get_local_index() is first
+
+    write_local_index(path, _docs("a", "b"), [[1, 0], [0, 1]], MODEL)
+    second = vector_store.get_local_index()
+
+    assert second is not first
+    assert second.points_count == 2
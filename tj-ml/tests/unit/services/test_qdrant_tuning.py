@@ -0,0 +1,84 @@
+from dataclasses import replace
+
+import pytest
+from qdrant_client.http import models
+
+from app.core.config import get_settings
+from app.services.qdrant_tuning import QDRANT_PRESETS, QdrantTuning, tuning_from_settings
+
+
+def _kwargs(preset: str):
+    return QDRANT_PRESETS[preset].collection_kwargs(1024)
+
+
+def test_default_preset():
+    """fp32 векторы и граф в RAM, без квантизации."""
+    kwargs = _kwargs("default")
+
+    assert kwargs["vectors_config"] == models.VectorParams(
+        size=1024, distance=models.Distance.COSINE, on_disk=False
+    )
+    assert kwargs["hnsw_config"] == models.HnswConfigDiff(m=16, ef_construct=100, on_disk=False)
+    assert kwargs["quantization_config"] is None
+    assert kwargs["on_disk_payload"] is False
+    assert QDRANT_PRESETS["default"].search_params() == models.SearchParams(hnsw_ef=128)
+
+
+def test_accuracy_preset():
+    """Плотнее граф и больше ef на запросе."""
+    kwargs = _kwargs("accuracy")
+
+    assert kwargs["hnsw_config"] == models.HnswConfigDiff(m=32, ef_construct=256, on_disk=False)
+    assert kwargs["quantization_config"] is None
+    assert QDRANT_PRESETS["accuracy"].search_params() == models.SearchParams(hnsw_ef=256)
+
+
+def test_memory_preset():
+    """int8 в RAM, исходные векторы и payload на диске, rescore с oversampling."""
+    kwargs = _kwargs("memory")
+
+    assert kwargs["vectors_config"].on_disk is True
+    assert kwargs["hnsw_config"].on_disk is False
+    assert kwargs["on_disk_payload"] is True
+    assert kwargs["quantization_config"] == models.ScalarQuantization(
+        scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+        )
+    )
+    assert QDRANT_PRESETS["memory"].search_params() == models.SearchParams(
+        hnsw_ef=128,
+        quantization=models.QuantizationSearchParams(rescore=True, oversampling=1.5),
+    )
+
+
+def test_disk_preset():
+    """Бинарная квантизация в RAM, векторы, граф и payload на диске."""
+    kwargs = _kwargs("disk")
+
+    assert kwargs["vectors_config"].on_disk is True
+    assert kwargs["hnsw_config"].on_disk is True
+    assert kwargs["on_disk_payload"] is True
+    assert kwargs["quantization_config"] == models.BinaryQuantization(
+        binary=models.BinaryQuantizationConfig(always_ram=True)
+    )
+    assert QDRANT_PRESETS["disk"].search_params() == models.SearchParams(
+        hnsw_ef=128,
+        quantization=models.QuantizationSearchParams(rescore=True, oversampling=3.0),
+    )
+
+
+def test_settings_override_preset():
+    """Заданные QDRANT_* поправляют пресет, остальное берётся из него."""
+    settings = replace(
+        get_settings(), qdrant_preset="memory", qdrant_hnsw_ef=64, qdrant_rescore=False
+    )
+
+    tuning = tuning_from_settings(settings)
+
+    assert tuning == replace(QDRANT_PRESETS["memory"], hnsw_ef=64, rescore=False)
+    assert tuning.search_params().quantization.rescore is False
+
+
+def test_unknown_quantization_rejected():
+    with pytest.raises(ValueError):
+        QdrantTuning(quantization="pq")
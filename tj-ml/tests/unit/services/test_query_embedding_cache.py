@@ -0,0 +1,44 @@
+from typing import Any, Dict, List
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from app.services.embeddings import CachedQueryEmbeddings
+
+
+def _fake_model(monkeypatch, calls: List) -> HuggingFaceEmbeddings:
+    """HuggingFaceEmbeddings без sentence-transformers: вектор зависит от текста и prompt."""
+
+    def _embed(self, texts: List[str], encode_kwargs: Dict[str, Any]) -> List[List[float]]:
+        calls.append((list(texts), dict(encode_kwargs)))
+        prompt = encode_kwargs.get("prompt", "")
+        return [[float(len(prompt + text)), float(sum(map(ord, text)))] for text in texts]
+
+    monkeypatch.setattr(HuggingFaceEmbeddings, "_embed", _embed)
+    return HuggingFaceEmbeddings.model_construct(
+        query_encode_kwargs={"prompt": "query: "}, encode_kwargs={}
+    )
+
+
+def test_miss_embeds_original_text_as_query(monkeypatch):
+    """Промах считается по исходному тексту с query_encode_kwargs, как embed_query."""
+    calls = []
+    base = _fake_model(monkeypatch, calls)
+    cache = CachedQueryEmbeddings(base, max_size=8)
+
+    vector = cache.embed_query("Как  Открыть Вклад?")
+
+    assert calls == [(["Как  Открыть Вклад?"], {"prompt": "query: "})]
+    assert vector == base.embed_query("Как  Открыть Вклад?")
+
+
+def test_normalized_text_shares_entry(monkeypatch):
+    """Запросы, отличающиеся регистром и пробелами, попадают в одну запись."""
+    calls = []
+    cache = CachedQueryEmbeddings(_fake_model(monkeypatch, calls), max_size=8)
+
+    first, second = cache.embed_queries(["Как открыть вклад", "как  ОТКРЫТЬ вклад"])
+    third = cache.embed_query("КАК открыть вклад")
+
+    assert first == second == third
+    assert calls == [(["Как открыть вклад"], {"prompt": "query: "})]
+    assert cache.stats()["hits"] == 1
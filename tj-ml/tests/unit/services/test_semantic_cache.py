@@ -0,0 +1,130 @@
+import time
+
+from app.services.semantic_cache import CachedAnswer, SemanticCache
+
+
+VERSION = "v1"
+
+
+def _answer(question: str, top_k: int = 3, created_at: float = None) -> CachedAnswer:
+    return CachedAnswer(
+        question=question,
+        top_k=top_k,
+        answer=f"ответ на {question}",
+        context="",
+        docs=[],
+        token_usage={},
+        created_at=time.time() if created_at is None else created_at,
+    )
+
+
+def _cache(**kwargs) -> SemanticCache:
+    params = {"threshold": 0.9, "max_size": 4, "ttl_seconds": 60}
+    params.update(kwargs)
+    return SemanticCache(**params)
+
+
+def test_hit_above_threshold():
+    """Близкий вопрос с тем же top_k возвращает сохранённый ответ."""
+    cache = _cache()
+    cache.store([1.0, 0.0], VERSION, _answer("a"))
+
+    entry = cache.lookup([0.99, 0.05], 3, VERSION)
+
+    assert entry is not None and entry.question == "a"
+    assert cache.hits == 1
+
+
+def test_miss_below_threshold_and_other_top_k():
+    """Далёкий вопрос и вопрос с другим top_k идут мимо кэша."""
+    cache = _cache()
+    cache.store([1.0, 0.0], VERSION, _answer("a"))
+
+    assert cache.lookup([0.7, 0.7], 3, VERSION) is None
+    assert cache.lookup([1.0, 0.0], 5, VERSION) is None
+    assert cache.misses == 2
+
+
+def test_expired_entry_does_not_shadow_fresh_one():
+    """Устаревшая запись ближе к запросу не мешает найти свежую."""
+    cache = _cache()
+    cache.store([1.0, 0.0], VERSION, _answer("old", created_at=time.time() - 120))
+    cache.store([0.95, 0.31], VERSION, _answer("fresh"))
+
+    entry = cache.lookup([1.0, 0.0], 3, VERSION)
+
+    assert entry is not None and entry.question == "fresh"
+    assert cache.expirations == 1
+    assert len(cache) == 1
+
+
+def test_expired_entries_free_capacity():
+    """Устаревшие записи освобождают место раньше, чем вытесняется LRU."""
+    cache = _cache(max_size=2)
+    cache.store([1.0, 0.0], VERSION, _answer("old", created_at=time.time() - 120))
+    cache.store([0.0, 1.0], VERSION, _answer("live"))
+
+    cache.store([0.7, 0.7], VERSION, _answer("new"))
+
+    assert cache.evictions == 0
+    assert cache.lookup([0.0, 1.0], 3, VERSION).question == "live"
+
+
+def test_lru_eviction():
+    """При переполнении вытесняется давно не использованная запись."""
+    cache = _cache(max_size=2)
+    cache.store([1.0, 0.0], VERSION, _answer("a"))
+    cache.store([0.0, 1.0], VERSION, _answer("b"))
+    cache.lookup([1.0, 0.0], 3, VERSION)
+
+    cache.store([0.7, -0.7], VERSION, _answer("c"))
+
+    assert cache.evictions == 1
+    assert cache.lookup([0.0, 1.0], 3, VERSION) is None
+    assert cache.lookup([1.0, 0.0], 3, VERSION).question == "a"
+
+
+def test_version_change_invalidates():
+    """Смена версии индекса сбрасывает кэш."""
+    cache = _cache()
+    cache.store([1.0, 0.0], VERSION, _answer("a"))
+
+    assert cache.lookup([1.0, 0.0], 3, "v2") is None
+    assert cache.invalidations == 1
+    assert len(cache) == 0
+
+
+def test_save_merges_workers(tmp_path):
+    """Два воркера с общим файлом не затирают записи друг друга."""
+    path = str(tmp_path / "cache.npz")
+    first = _cache(persist_path=path)
+    second = _cache(persist_path=path)
+    first.store([1.0, 0.0], VERSION, _answer("a"))
+    second.store([0.0, 1.0], VERSION, _answer("b"))
+
+    first.save()
+    second.save()
+    restored = _cache(persist_path=path)
+    restored.load()
+
+    assert len(restored) == 2
+    assert restored.lookup([1.0, 0.0], 3, VERSION).question == "a"
+    assert restored.lookup([0.0, 1.0], 3, VERSION).question == "b"
+
+
+def test_save_drops_other_version_and_expired(tmp_path):
+    """В файл не попадают записи старой версии индекса и устаревшие по TTL."""
+    path = str(tmp_path / "cache.npz")
+    stale = _cache(persist_path=path)
+    stale.store([1.0, 0.0], "v0", _answer("old-version"))
+    stale.save()
+    current = _cache(persist_path=path)
+    current.store([0.0, 1.0], VERSION, _answer("expired", created_at=time.time() - 120))
+    current.store([0.7, 0.7], VERSION, _answer("live"))
+
+    current.save()
+    restored = _cache(persist_path=path)
+    restored.load()
+
+    assert len(restored) == 1
+    assert restored.lookup([0.7, 0.7], 3, VERSION).question == "live"
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from dataclasses import replace
+
+from app.core.config import get_settings
+from app.services import warmup
+
+
+def test_failed_phase_is_retried_with_backoff(monkeypatch):
+    """Упавшая фаза повторяется, пройденные фазы второй раз не запускаются."""
+    calls = {"embeddings": 0, "vector_store": 0}
+    tokenizer_threads = []
+
+    def _embeddings():
+        calls["embeddings"] += 1
+
+    def _vector_store():
+        calls["vector_store"] += 1
+        if calls["vector_store"] < 3:
+            raise FileNotFoundError("local index is not built yet")
+
+    def _tokenizer():
+        tokenizer_threads.append(threading.get_ident())
+
+    async def _noop():
+        return None
+
+    settings = replace(
+        get_settings(),
+        semantic_cache_enabled=False,
+        warmup_retry_seconds=0.01,
+        warmup_retry_max_seconds=0.02,
+    )
+    monkeypatch.setattr(warmup, "get_settings", lambda: settings)
+    monkeypatch.setattr(warmup, "_state", warmup.WarmupState())
+    monkeypatch.setattr(warmup, "get_embeddings", _embeddings)
+    monkeypatch.setattr(warmup, "init_vector_store", _vector_store)
+    monkeypatch.setattr(warmup, "get_tokenizer", _tokenizer)
+    # Лог "Service is ready" читает сигнатуру роутера
+    monkeypatch.setattr(
+        warmup, "get_llm_router", lambda: type("Router", (), {"signature": "fake/fake"})()
+    )
+    monkeypatch.setattr(warmup, "aget_index_version", _noop)
+    monkeypatch.setattr(warmup, "_warm_queries", _noop)
+
+    async def _main():
+        errors = set()
+        task = asyncio.ensure_future(warmup.run_warmup())
+        while not task.done():
+            if warmup.get_warmup_state().error:
+                errors.add(warmup.get_warmup_state().error)
+            await asyncio.sleep(0.001)
+        await task
+        return errors
+
+    errors = asyncio.run(_main())
+
+    assert errors == {"vector_store: local index is not built yet"}
+    state = warmup.get_warmup_state()
+    assert state.ready
+    assert state.error is None
+    assert state.failures == 2
+    assert calls == {"embeddings": 1, "vector_store": 3}
+    # Токенайзер загружается при прогреве в отдельном потоке, а не на первом запросе
+    assert "tokenizer" in state.phases
+    assert tokenizer_threads and tokenizer_threads[0] != threading.get_ident()
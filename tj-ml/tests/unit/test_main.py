@@ -0,0 +1,146 @@
+import json
+
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+
+from app import main
+from app.services import rag_chain
+from app.services.warmup import WarmupState
+
+from .services.test_llm_router import _router, _target
+
+
+def test_rag_endpoints_wait_for_warmup(monkeypatch):
+    """Пока прогрев не закончен, RAG отвечает 503 с Retry-After и не трогает модель."""
+    monkeypatch.setattr(main, "get_warmup_state", lambda: WarmupState())
+
+    async def _fail(*args, **kwargs):
+        raise AssertionError("RAG must not run before warm-up")
+
+    monkeypatch.setattr(main, "query_rag", _fail)
+    client = TestClient(main.app)
+
+    for path, body in (
+        ("/rag/query", {"question": "Как открыть вклад?"}),
+        ("/rag/batch", {"questions": ["Как открыть вклад?"]}),
+        ("/rag/stream", {"question": "Как открыть вклад?"}),
+    ):
+        response = client.post(path, json=body)
+        assert response.status_code == 503, path
+        assert int(response.headers["Retry-After"]) >= 1
+        assert "warming up" in response.json()["detail"]
+
+
+def _ready(monkeypatch):
+    state = WarmupState()
+    state.status = "ready"
+    monkeypatch.setattr(main, "get_warmup_state", lambda: state)
+
+
+def _doc(title: str) -> Document:
+    return Document(
+        page_content=f"{title} - это подробно разобрано в статье Т-Ж, вот главное.",
+        metadata={"source_url": f"https://t-j.ru/{title}/", "article_title": title},
+    )
+
+
+def _sse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event_line, data_line = block.split("\n", 1)
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+class _BatchRouter:
+    """Роутер-заглушка: вопрос со словом "сломан" падает на LLM."""
+
+    signature = "fake/fake"
+
+    async def ainvoke(self, prompt, callbacks=None):
+        if "сломан" in prompt.to_string().lower():
+            raise RuntimeError("LLM timeout")
+        return "Ответ по статье.\n\nИсточники:\n- [вклад](https://t-j.ru/вклад/)"
+
+
+def test_rag_batch_isolates_failed_item(monkeypatch):
+    """Ошибка одного вопроса не валит пакет, поиск один на пакет, usage суммируется."""
+    _ready(monkeypatch)
+    searches = []
+
+    async def _embed_queries(questions):
+        return [[float(i), 1.0] for i, _question in enumerate(questions)]
+
+    async def _search_batch(vectors, k):
+        searches.append(list(vectors))
+        return [[(_doc("вклад"), 0.9)] for _vector in vectors]
+
+    monkeypatch.setattr(rag_chain, "aembed_queries", _embed_queries)
+    monkeypatch.setattr(rag_chain, "asearch_batch_by_vectors", _search_batch)
+    monkeypatch.setattr(rag_chain, "get_llm_router", lambda: _BatchRouter())
+    questions = ["Как открыть вклад?", "Сломанный вопрос", "Где вклад выгоднее?"]
+
+    response = TestClient(main.app).post(
+        "/rag/batch", json={"questions": questions, "use_cache": False}
+    )
+
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert [item["question"] for item in items] == questions
+    assert items[1]["error"] == "LLM timeout"
+    assert items[1]["answer"] is None
+    assert all(items[i]["answer"].startswith("Ответ по статье") for i in (0, 2))
+    assert len(searches) == 1 and len(searches[0]) == 3
+    total = response.json()["token_usage"]
+    for key in ("query_tokens", "context_tokens", "context_chunks"):
+        assert total[key] == items[0]["token_usage"][key] + items[2]["token_usage"][key]
+    assert total["context_chunks"] == 2
+
+
+def _stream_pipeline(monkeypatch, router):
+    async def _embed_query(question):
+        return [1.0, 0.0]
+
+    async def _search(vector, k):
+        return [(_doc("вклад"), 0.9), (_doc("кэшбэк"), 0.8)]
+
+    monkeypatch.setattr(rag_chain, "aembed_query", _embed_query)
+    monkeypatch.setattr(rag_chain, "asearch_by_vector", _search)
+    monkeypatch.setattr(rag_chain, "get_llm_router", lambda: router)
+
+
+def test_rag_stream_event_order(monkeypatch):
+    """SSE: сначала источники, затем токены ответа, в конце done со статистикой."""
+    _ready(monkeypatch)
+    _stream_pipeline(monkeypatch, _router([_target("fake")]))
+
+    response = TestClient(main.app).post(
+        "/rag/stream", json={"question": "Как открыть вклад?", "use_cache": False}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(response.text)
+    names = [name for name, _data in events]
+    assert names[0] == "sources"
+    assert names[-1] == "done"
+    assert set(names[1:-1]) == {"token"} and len(names) > 3
+    assert [source["metadata"]["article_title"] for source in events[0][1]["sources"]] == [
+        "вклад", "кэшбэк",
+    ]
+    assert "".join(data["text"] for name, data in events if name == "token")
+    assert events[-1][1]["token_usage"]["context_chunks"] == 2
+
+
+def test_rag_stream_reports_error_event(monkeypatch):
+    """Ошибка LLM после отправки заголовков приходит событием error после sources."""
+    _ready(monkeypatch)
+    _stream_pipeline(monkeypatch, _router([_target("broken", error_rate=1.0)]))
+
+    response = TestClient(main.app).post(
+        "/rag/stream", json={"question": "Как открыть вклад?", "use_cache": False}
+    )
+
+    events = _sse_events(response.text)
+    assert [name for name, _data in events] == ["sources", "error"]
+    assert "All LLM providers failed" in events[1][1]["detail"]
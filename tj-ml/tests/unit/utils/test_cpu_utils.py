@@ -0,0 +1,12 @@
+from app.utils import cpu_utils
+
+
+def test_threads_split_between_workers(monkeypatch):
+    """Ядра делятся поровну между процессами, TORCH_THREADS задаёт число явно."""
+    monkeypatch.delenv("TORCH_THREADS", raising=False)
+    monkeypatch.setattr(cpu_utils, "available_cores", lambda: 8)
+
+    assert cpu_utils.torch_threads_per_worker(2) == 4
+    assert cpu_utils.torch_threads_per_worker(16) == 1
+    monkeypatch.setenv("TORCH_THREADS", "3")
+    assert cpu_utils.torch_threads_per_worker(2) == 3
@@ -0,0 +1,30 @@
+from dataclasses import replace
+
+import pytest
+
+from app.core.config import get_settings
+from app.utils.token_utils import resolve_tokenizer_name
+
+
+@pytest.mark.parametrize(
+    "provider, providers, tokenizer, expected",
+    [
+        ("openrouter", [], "", "google/gemma-3-27b-it"),
+        ("fake", ["openrouter=org/llama-3:free", "gigachat"], "", "org/llama-3"),
+        ("openrouter", ["fake", "openrouter"], "", ""),
+        ("gigachat", [], "", ""),
+        ("openrouter", [], "none", ""),
+        ("gigachat", [], "org/tokenizer", "org/tokenizer"),
+    ],
+)
+def test_tokenizer_follows_primary_router_target(provider, providers, tokenizer, expected):
+    """Токенайзер выбирается по первой цели роутера, TOKENIZER_NAME важнее."""
+    settings = replace(
+        get_settings(),
+        llm_provider=provider,
+        llm_providers=providers,
+        tokenizer_name=tokenizer,
+        openrouter_model="google/gemma-3-27b-it:free",
+    )
+
+    assert resolve_tokenizer_name(settings) == expected